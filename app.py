@@ -1,10 +1,16 @@
 #Chat related
 
-from pipeline import RAGService
+from pipeline import RAGService, RemoteRAGService
 import logging
 from errors import *
 from ui.app_body import app_body
 from ui.custom_styles import *
+from utils.llama_chatbot import build_llm
+from utils.precompute import get_precompute_job
+from pipeline.tracing import start_metrics_server
+import pipeline.operations  # registers backend gauges with the metrics endpoint
+from utils.profiler import profile_component, profile_rerun
+from utils.user import is_logged_in
 import os
 from dotenv import load_dotenv
 
@@ -15,7 +21,12 @@ from dotenv import load_dotenv
 def init_RAGService():
     # Streamlit doesn't support .env
     try:
-        rag_service = RAGService(llama_cloud_api_key=st.secrets['LLAMA_CLOUD_API_KEY'])
+        # A shared retrieval service keeps backend memory and LlamaCloud traffic flat as UI replicas scale
+        rag_service_url = st.secrets.get('RAG_SERVICE_URL', None) or os.getenv('PROOF_RAG_SERVICE_URL')
+        if rag_service_url:
+            rag_service = RemoteRAGService(service_url=rag_service_url)
+        else:
+            rag_service = RAGService(llama_cloud_api_key=st.secrets['LLAMA_CLOUD_API_KEY'])
         st.session_state["llama"] = rag_service
     except Exception as e:
         logging.error(f"Failed to initialize rag_service: {str(e)}")
@@ -29,6 +40,13 @@ def init_RAGService():
     except Exception as e:
         raise CriticalInitializationError(f"Failed to initialize rag_service: {str(e)}")
 
+    try:
+        openai_api_key = st.secrets["OPENAI_API_KEY"]
+        get_precompute_job(llm_factory=lambda: build_llm(openai_api_key)).start(rag_service)
+    except Exception as e:
+        # Common queries still work live without the background job
+        logging.error(f"Failed to start precompute job: {str(e)}")
+
 
     st.session_state.refresh_state = False
     st.rerun()
@@ -43,6 +61,11 @@ def set_log_level():
     logging.getLogger("httpx").setLevel(logging.WARNING)
 
 def main():
+    # Component timings per rerun, only when PROOF_PROFILE_RERUNS=1 or ?profile=1
+    with profile_rerun():
+        run_app()
+
+def run_app():
     #Refresh state used for changes to llamacloud objects org, project, indices
     #Set to true for first run of app
 
@@ -56,17 +79,21 @@ def main():
 
     set_log_level()
 
+    # Prometheus-style /metrics for this process, only when PROOF_METRICS_PORT is set
+    start_metrics_server()
+
     #State that will trigger reset of the llamacloud client and chat engine
     if 'refresh_state' not in st.session_state:
         st.session_state['refresh_state'] = True
 
 
     #HTML for control over streamlit components
-    alternate_chat_side_style()
-    container_shadow_styles()
+    with profile_component("styles"):
+        alternate_chat_side_style()
+        container_shadow_styles()
 
     try:
-        if not st.user.is_logged_in:
+        if not is_logged_in():
 
             app_body()
 
@@ -77,7 +104,8 @@ def main():
 
             #Init or reset llamacloud and chat engine instances (incl llamacloud and openai calls)
             if st.session_state.refresh_state:
-                init_RAGService()
+                with profile_component("init_rag_service"):
+                    init_RAGService()
 
     except CriticalInitializationError as e:
         st.warning(f"The controller could not be initialized\n\n Error code: {e} \n\nPlease try again later.")
@@ -7,7 +7,10 @@ from .errors import (
     APIError,
     LlamaCloudClientInitError,
     LlamaOperationFailedError,
-    RetrieverFailedError
+    RetrieverFailedError,
+    DeadlineExceededError,
+    CircuitOpenError,
+    CassetteMissError
 )
 
 __all__ = [
@@ -19,5 +22,8 @@ __all__ = [
     'APIError',
     'LlamaCloudClientInitError',
     'LlamaOperationFailedError',
-    'RetrieverFailedError'
+    'RetrieverFailedError',
+    'DeadlineExceededError',
+    'CircuitOpenError',
+    'CassetteMissError'
 ]
\ No newline at end of file
@@ -23,4 +23,13 @@ class LlamaOperationFailedError(APIError):
     pass
 
 class RetrieverFailedError(APIError):
-    pass
\ No newline at end of file
+    pass
+
+class DeadlineExceededError(APIError):
+    pass
+
+class CircuitOpenError(APIError):
+    pass
+
+class CassetteMissError(APIError):
+    pass
@@ -0,0 +1,100 @@
+#MCP server exposing the same RAG backend as the Streamlit app
+#Run with: uv run mcp_server.py (stdio) or `mcp dev mcp_server.py`
+
+from typing import Optional
+import logging
+
+from mcp.server.fastmcp import FastMCP, Context
+
+from utils.context_manager import app_lifespan
+from utils.tool_limits import bounded_tool
+
+logger = logging.getLogger(__name__)
+
+# Per-result content is trimmed so a single tool call can't return whole board books
+MAX_CHUNK_CHARS = 1500
+
+mcp = FastMCP("Proof", lifespan=app_lifespan)
+
+
+def _resolve_pipeline_id(ctx: Context, index_name: Optional[str]):
+    indices = ctx.request_context.lifespan_context.allama.indices or {}
+    if index_name is None:
+        return None
+    if index_name not in indices:
+        raise ValueError(f"Unknown store '{index_name}'. Available stores: {', '.join(indices)}")
+    return indices[index_name]
+
+
+@mcp.tool()
+@bounded_tool()
+async def retrieve(ctx: Context, query: str) -> str:
+    """Retrieve the most relevant passages across all board document stores for a question"""
+    allama = ctx.request_context.lifespan_context.allama
+    nodes_with_scores = await allama.composite_retrieval(query_text=query)
+    if not nodes_with_scores:
+        return f"No passages found for '{query}'"
+
+    parts = [f"Retrieved {len(nodes_with_scores)} passages for '{query}':\n\n"]
+    for i, node_with_score in enumerate(nodes_with_scores, 1):
+        metadata = node_with_score.node.metadata or {}
+        text = node_with_score.node.get_content()
+        if len(text) > MAX_CHUNK_CHARS:
+            text = text[:MAX_CHUNK_CHARS] + "..."
+        parts.append(f"--- Passage {i} (Score: {node_with_score.score or 0:.3f}) ---\n")
+        parts.append(f"File: {metadata.get('file_name', 'Unknown')}\n")
+        parts.append(f"{text}\n\n")
+    return "".join(parts)
+
+
+@mcp.tool()
+@bounded_tool()
+async def search_index(ctx: Context, query: str, index_name: str) -> str:
+    """Search a single document store by name"""
+    try:
+        pipeline_id = _resolve_pipeline_id(ctx, index_name)
+    except ValueError as e:
+        return str(e)
+    allama = ctx.request_context.lifespan_context.allama
+    return await allama.search_index(pipeline_id=pipeline_id, query=query, max_content_chars=MAX_CHUNK_CHARS)
+
+
+@mcp.tool()
+@bounded_tool()
+async def list_files(ctx: Context, index_name: Optional[str] = None) -> str:
+    """List document files, either for one store or for the whole organization"""
+    allama = ctx.request_context.lifespan_context.allama
+    try:
+        pipeline_id = _resolve_pipeline_id(ctx, index_name)
+    except ValueError as e:
+        return str(e)
+
+    if pipeline_id is None:
+        files = await allama.list_available_llama_files()
+    else:
+        files = await allama.list_pipeline_files(pipeline_id=pipeline_id)
+
+    if not isinstance(files, dict):
+        return files or "No files found"
+    return "\n".join(f"- {contents['path']}" for contents in files.values())
+
+
+@mcp.tool()
+@bounded_tool()
+async def pipeline_status(ctx: Context) -> str:
+    """Show the ingestion status of every document store"""
+    allama = ctx.request_context.lifespan_context.allama
+    return await allama.check_all_pipeline_statuses()
+
+
+@mcp.tool()
+@bounded_tool()
+async def list_stores(ctx: Context) -> str:
+    """List the available document stores"""
+    indices = ctx.request_context.lifespan_context.allama.indices or {}
+    return "\n".join(f"- {name}" for name in indices) or "No stores found"
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    mcp.run()
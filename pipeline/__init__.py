@@ -1,3 +1,5 @@
 from pipeline.pipeline import RAGService
+from pipeline.async_pipeline import AsyncRAGService
+from pipeline.remote import RemoteRAGService
 
-__all__ = ['RAGService']
\ No newline at end of file
+__all__ = ['RAGService', 'AsyncRAGService', 'RemoteRAGService']
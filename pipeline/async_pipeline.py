@@ -0,0 +1,354 @@
+from llama_cloud.client import AsyncLlamaCloud
+from llama_index.indices.managed.llama_cloud import LlamaCloudCompositeRetriever
+from llama_cloud import CompositeRetrievalMode
+from typing import Optional, Dict
+import asyncio
+import logging
+import os
+from errors import *
+from pipeline.pipeline import RAGService, FALSE_HIT_OVERLAP, RERANK_TOP_N, RETRIEVAL_MODE, llama_cloud_base_url
+from pipeline.semantic_cache import get_semantic_cache, node_overlap
+from pipeline.single_flight import get_async_single_flight, normalize_text
+from pipeline.rate_limit import RateLimitedClient, get_rate_limiter
+from pipeline.resilience import acall_with_policy
+from pipeline.budget import budget_allows, remaining_budget
+from pipeline.tracing import span
+from pipeline.summaries import DocumentSummaryStore
+from pipeline.record_replay import cassette_async_http_client, cassette_http_client
+import httpx
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HTTP_LIMITS = httpx.Limits(max_connections=50, max_keepalive_connections=20)
+
+
+class AsyncRAGService:
+    """
+    Async counterpart of RAGService for event-loop hosts such as FastMCP tool handlers
+    All LlamaCloud traffic shares one httpx.AsyncClient so concurrent tool calls reuse connections
+    Build with `await AsyncRAGService.create(api_key)` or `AsyncRAGService.from_sync(rag_service)`
+    """
+    def __init__(self, llama_cloud_api_key, httpx_client: Optional[httpx.AsyncClient] = None,
+                 base_url: Optional[str] = None):
+        self.api_key = llama_cloud_api_key
+        self.base_url = llama_cloud_base_url(base_url)
+        self.http_client = (httpx_client
+                            or cassette_async_http_client(timeout=60, limits=DEFAULT_HTTP_LIMITS)
+                            or httpx.AsyncClient(timeout=60, limits=DEFAULT_HTTP_LIMITS))
+        self.client = RateLimitedClient(AsyncLlamaCloud(token=self.api_key, base_url=self.base_url,
+                                                        httpx_client=self.http_client),
+                                        get_rate_limiter("llamacloud"),
+                                        is_async=True)
+        self.composite_retriever_name = RAGService.COMPOSITE_RETRIEVER_NAME
+        self.composite_image_retriever_name = RAGService.COMPOSITE_IMAGE_RETRIEVER_NAME
+        self.composite_retriever = None
+        self.composite_image_retriever = None
+        self._degraded_retrievers = {}
+        self.file_id_name_dict = None
+        self._organization_id = None
+        self._project_id = None
+        self._indices = None
+        self._index_version = None
+        self.summary_store = DocumentSummaryStore()
+
+    @classmethod
+    async def create(cls, llama_cloud_api_key, httpx_client: Optional[httpx.AsyncClient] = None,
+                     base_url: Optional[str] = None):
+        service = cls(llama_cloud_api_key, httpx_client=httpx_client, base_url=base_url)
+
+        try:
+            org_object = await service.client.organizations.get_default_organization()
+            service._organization_id = org_object.id
+        except Exception as e:
+            logging.error(f"Failed to get organization ID during init: {e}")
+            raise OrgNotFoundError(f"Failed to get organization ID during init") from e
+
+        try:
+            projects = await service.client.projects.list_projects(organization_id=service.organization_id)
+            if not projects:
+                raise ProjectNotFoundError("No projects found")
+            service._project_id = projects[0].id
+        except Exception as e:
+            logging.error(f"Failed to get project ID during init: {e}")
+            raise ProjectNotFoundError(f"Failed to get project ID during init") from e
+
+        try:
+            service._indices, _ = await asyncio.gather(service.list_llama_indices(), service.refresh_file_catalog())
+        except Exception as e:
+            logging.error(f"Failed to get indices during init: {e}")
+            raise IndexRetrievalError(f"Failed to get indices during init") from e
+
+        try:
+            # Retriever construction is synchronous in llama_index so it runs off the event loop
+            service.composite_retriever, service.composite_image_retriever = await asyncio.gather(
+                asyncio.to_thread(service._build_retriever, service.composite_retriever_name),
+                asyncio.to_thread(service._build_retriever, service.composite_image_retriever_name),
+            )
+        except Exception as e:
+            logging.error(f"Failed to get composite retriever during init: {e}")
+            raise RetrieverFailedError(f"Failed to get composite retriever during init") from e
+
+        await asyncio.to_thread(RAGService._build_degraded_retrievers, service)
+        return service
+
+    @classmethod
+    def from_sync(cls, rag_service: RAGService, httpx_client: Optional[httpx.AsyncClient] = None):
+        """
+        Reuses an initialized RAGService's ids and file catalog without repeating the init round-trips
+        The retrievers are rebuilt: the sync ones have no async client, so their aretrieve would open its own
+        """
+        service = cls(rag_service.api_key, httpx_client=httpx_client, base_url=rag_service.base_url)
+        service._organization_id = rag_service.organization_id
+        service._project_id = rag_service.project_id
+        service._indices = rag_service.indices
+        service._index_version = rag_service.index_version
+        service.file_id_name_dict = rag_service.file_id_name_dict
+        service.summary_store = rag_service.summary_store
+        try:
+            if rag_service.composite_retriever is not None:
+                service.composite_retriever = service._build_retriever(service.composite_retriever_name)
+            if rag_service.composite_image_retriever is not None:
+                service.composite_image_retriever = service._build_retriever(service.composite_image_retriever_name)
+        except Exception as e:
+            logging.error(f"Failed to get composite retriever from sync service: {e}")
+            raise RetrieverFailedError(f"Failed to get composite retriever from sync service") from e
+        RAGService._build_degraded_retrievers(service)
+        return service
+
+    def _build_retriever(self, name):
+        # Sync initialization already created and populated the composite retrievers
+        return LlamaCloudCompositeRetriever(
+            name=name,
+            project_id=self.project_id,
+            organization_id=self.organization_id,
+            api_key=self.api_key,
+            create_if_not_exists=True,
+            mode=CompositeRetrievalMode(RETRIEVAL_MODE),
+            rerank_top_n=RERANK_TOP_N,
+            base_url=self.base_url,
+            # The constructor's lookup is a sync call; retrievals go through the shared async client
+            httpx_client=cassette_http_client(timeout=60),
+            async_httpx_client=self.http_client,
+        )
+
+    async def aclose(self):
+        await self.http_client.aclose()
+
+    @property
+    def organization_id(self):
+        return self._organization_id
+
+    @property
+    def project_id(self):
+        return self._project_id
+
+    @property
+    def indices(self):
+        return self._indices
+
+    @property
+    def index_version(self):
+        return self._index_version
+
+    @property
+    def answer_scope(self) -> tuple:
+        return RAGService.answer_scope.fget(self)
+
+    async def list_llama_indices(self) -> Dict:
+        """List existing LlamaCloud indices/pipelines"""
+        if self._project_id is None:
+            raise MissingValueError("No llama_project_id in list_llama_indices")
+        try:
+            pipelines = await self.client.pipelines.search_pipelines(project_id=self._project_id)
+        except Exception as e:
+            raise LlamaOperationFailedError(f"LIST_LLAMA_INDICES: Failed to list pipelines: {str(e)}")
+        return {pipeline.name: pipeline.id for pipeline in pipelines or []}
+
+    async def refresh_file_catalog(self):
+        files = await self.client.files.list_files(organization_id=self.organization_id)
+        name_to_id_dict = {}
+        for file in files:
+            name_to_id_dict[file.name] = file.id
+            name_to_id_dict[file.id] = file.name
+        self.file_id_name_dict = name_to_id_dict
+        self._index_version = RAGService._compute_index_version(files)
+        return self._index_version
+
+    async def list_available_llama_files(self, raw_response=False):
+        try:
+            files = await self.client.files.list_files(organization_id=self.organization_id)
+            if raw_response:
+                return files
+            return RAGService._format_file_response(files)
+        except Exception as e:
+            logging.error(e)
+            return f"Failed to list available Llama files: {e}"
+
+    async def list_pipeline_files(self, pipeline_id: str, raw_response=False):
+        try:
+            files = await self.client.pipelines.list_pipeline_files(pipeline_id=pipeline_id)
+            if raw_response:
+                return files
+            return RAGService._format_file_response(files)
+        except Exception as e:
+            logging.error(e)
+            return f"Failed to list available pipeline files: {e}"
+
+    async def search_index(self, pipeline_id: str, query: str = "", max_content_chars: Optional[int] = None):
+        try:
+            with span("search_index", labels={"pipeline": pipeline_id}):
+                result = await self.client.pipelines.run_search(pipeline_id=pipeline_id, query=query)
+            return RAGService._format_search_result(query, result, max_content_chars=max_content_chars)
+        except Exception as e:
+            logging.error(e)
+            return f"Failed to search index: {e}"
+
+    async def check_pipeline_status(self, pipeline_id: str):
+        """Check the status of a pipeline's latest job"""
+        response = await self.client.pipelines.get_pipeline_status(pipeline_id=pipeline_id)
+        return f"Pipeline {pipeline_id}: {response.status.value} (Job: {response.job_id})"
+
+    async def check_all_pipeline_statuses(self, raw_response=False):
+        """Check status of all pipelines in a project concurrently"""
+        pipelines = await self.client.pipelines.search_pipelines(project_id=self.project_id)
+        statuses = await asyncio.gather(
+            *(self.client.pipelines.get_pipeline_status(pipeline_id=pipeline.id) for pipeline in pipelines),
+            return_exceptions=True
+        )
+
+        results = []
+        for pipeline, status in zip(pipelines, statuses):
+            if isinstance(status, Exception):
+                results.append(f"{pipeline.name}: ERROR")
+            elif raw_response:
+                results.append(f"{pipeline.name}: {status}")
+            else:
+                results.append(f"{pipeline.name}: {status.status.value}")
+        return "\n".join(results)
+
+    async def get_file_content_url(self, file_id: str, expires_in_seconds: int = 3600):
+        """Get a presigned URL to download the file content"""
+        try:
+            presigned_url = await get_async_single_flight("file_url").do(
+                (self.organization_id, file_id, expires_in_seconds),
+                lambda: acall_with_policy("file_url", lambda: self.client.files.read_file_content(
+                    id=file_id,
+                    expires_at_seconds=expires_in_seconds,
+                    organization_id=self.organization_id
+                ))
+            )
+            return presigned_url.url
+        except Exception as e:
+            logger.error(f"GET_FILE_CONTENT_URL: Error using file_id {file_id} to get content url: {e}")
+
+    async def list_file_screenshots(self, file_id: str):
+        """List all page screenshots available for a file"""
+        return await self.client.files.list_file_page_screenshots(id=file_id, organization_id=self.organization_id)
+
+    async def get_file_screenshot(self, file_id: str, page_index: int):
+        """Get a specific page screenshot as raw bytes; concurrent requests for the same page share one call"""
+        return await get_async_single_flight("screenshot").do(
+            (self.organization_id, file_id, page_index),
+            lambda: acall_with_policy("screenshot",
+                                      lambda: self._fetch_file_screenshot(file_id=file_id, page_index=page_index))
+        )
+
+    async def _fetch_file_screenshot(self, file_id: str, page_index: int):
+        # The LlamaCloud client tries to parse image data as JSON so the bytes are fetched directly
+        async with get_rate_limiter("llamacloud").aslot():
+            response = await self.http_client.get(
+                f"{self.base_url}/api/v1/files/{file_id}/page_screenshots/{page_index}",
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "X-Organization-Id": self.organization_id
+                }
+            )
+            response.raise_for_status()
+        return response.content
+
+    async def upload_file(self, file_path: str, project_id: Optional[str] = None, external_file_id: Optional[str] = None):
+        """Upload a local file to LlamaCloud"""
+        try:
+            with open(file_path, 'rb') as file_to_upload:
+                uploaded_file = await self.client.files.upload_file(
+                    project_id=project_id,
+                    organization_id=self.organization_id,
+                    upload_file=file_to_upload,
+                    external_file_id=external_file_id
+                )
+            return f"Uploaded {os.path.basename(file_path)} to LlamaCloud. File ID: {uploaded_file.id}"
+        except Exception as e:
+            raise LlamaOperationFailedError(f"Failed to upload file: {e}") from e
+
+    def _degraded_retriever(self, retriever):
+        return RAGService._degraded_retriever(self, retriever)
+
+    async def _retrieve_coalesced(self, retriever, query_text: str, degraded: bool = False):
+        key = (self.organization_id, retriever.name, degraded, normalize_text(query_text))
+        return await get_async_single_flight("retrieve").do(
+            key, lambda: acall_with_policy("retrieve", lambda: self._retrieve_limited(retriever, query_text),
+                                           deadline_seconds=remaining_budget())
+        )
+
+    @staticmethod
+    async def _retrieve_limited(retriever, query_text: str):
+        async with get_rate_limiter("llamacloud").aslot():
+            return await retriever.aretrieve(query_text)
+
+    async def _cached_retrieval(self, retriever, query_text: str, store: Optional[str] = None):
+        """Same semantic cache and scope as RAGService so sync and async callers share results"""
+        cache = get_semantic_cache("retrieval")
+        scope = (self.organization_id, self.index_version, store, retriever.name)
+
+        cached = cache.lookup(scope, query_text)
+        if cached is not None:
+            nodes_with_scores, cached_query, similarity = cached
+            if not cache.should_sample(similarity) or not budget_allows("full_retrieval"):
+                return nodes_with_scores
+            fresh_nodes = await self._retrieve_coalesced(retriever, query_text)
+            cache.record_sample(query_text, cached_query, similarity,
+                                is_false_hit=node_overlap(nodes_with_scores, fresh_nodes) < FALSE_HIT_OVERLAP)
+            cache.put(scope, query_text, fresh_nodes)
+            return fresh_nodes
+
+        if not budget_allows("full_retrieval"):
+            return await self._retrieve_coalesced(self._degraded_retriever(retriever), query_text, degraded=True)
+
+        nodes_with_scores = await self._retrieve_coalesced(retriever, query_text)
+        if nodes_with_scores:
+            cache.put(scope, query_text, nodes_with_scores)
+        return nodes_with_scores
+
+    def _fallback_retrieval(self, retriever, query_text: str, store: Optional[str] = None):
+        # Same cached-then-local fallback as RAGService; both lookups are local so no await is needed
+        return RAGService._fallback_retrieval(self, retriever, query_text, store=store)
+
+    async def composite_retrieval(self, query_text: str, store: Optional[str] = None):
+        if query_text is None:
+            raise MissingValueError("Query text is missing")
+        with span("retrieval", labels={"retriever": self.composite_retriever_name, "store": store or "all"},
+                  store=store, index_count=len(self.indices or {})):
+            try:
+                return await self._cached_retrieval(self.composite_retriever, query_text, store=store)
+            except Exception as e:
+                logging.warning(f"Composite retrieval failed: {e}")
+                return self._fallback_retrieval(self.composite_retriever, query_text, store=store)
+
+    async def multi_modal_composite_retrieval(self, query_text: str, store: Optional[str] = None):
+        if query_text is None:
+            raise MissingValueError("Query text is missing")
+        if not budget_allows("images"):
+            return await self.composite_retrieval(query_text, store=store)
+        with span("retrieval", labels={"retriever": self.composite_image_retriever_name, "store": store or "all"},
+                  store=store, index_count=len(self.indices or {})):
+            try:
+                return await self._cached_retrieval(self.composite_image_retriever, query_text, store=store)
+            except Exception as e:
+                logging.warning(f"Multi modal composite retrieval failed: {e}")
+                return self._fallback_retrieval(self.composite_image_retriever, query_text, store=store)
+
+    def summary_retrieval(self, query_text: str, top_k: int = 5):
+        # Local JSON lookup; no network round-trip to await
+        if query_text is None:
+            raise MissingValueError("Query text is missing")
+        return self.summary_store.retrieve(query_text, top_k=top_k)
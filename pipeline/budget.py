@@ -0,0 +1,82 @@
+from contextlib import contextmanager
+from typing import List, Optional
+import contextvars
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+QUESTION_BUDGET_SECONDS = float(os.getenv("PROOF_QUESTION_BUDGET_SECONDS", "15"))
+REFERENCES_BUDGET_SECONDS = float(os.getenv("PROOF_REFERENCES_BUDGET_SECONDS", "10"))
+
+# Optional work only starts when at least this much of the budget is left
+STAGE_RESERVES = {
+    "condense": float(os.getenv("PROOF_RESERVE_CONDENSE", "10")),
+    "full_retrieval": float(os.getenv("PROOF_RESERVE_FULL_RETRIEVAL", "7")),
+    "images": float(os.getenv("PROOF_RESERVE_IMAGES", "5")),
+    "file_urls": float(os.getenv("PROOF_RESERVE_FILE_URLS", "2")),
+}
+
+STAGE_DESCRIPTIONS = {
+    "condense": "question rewriting",
+    "full_retrieval": "searching every index",
+    "images": "image references",
+    "file_urls": "file links",
+}
+
+
+class QuestionBudget:
+    """End-to-end latency budget for one question; stages ask it before doing optional work"""
+    def __init__(self, total_seconds: float = QUESTION_BUDGET_SECONDS, started_at: Optional[float] = None):
+        self.total_seconds = total_seconds
+        self.started_at = time.monotonic() if started_at is None else started_at
+        self.shed: List[str] = []
+
+    def remaining(self) -> float:
+        return max(0.0, self.total_seconds - (time.monotonic() - self.started_at))
+
+    def allows(self, stage: str) -> bool:
+        """False (and the stage is recorded as shed) when too little budget is left for it"""
+        if self.remaining() >= STAGE_RESERVES[stage]:
+            return True
+        if stage not in self.shed:
+            logger.info(f"BUDGET: Shedding {stage} with {self.remaining():.1f}s left")
+            self.shed.append(stage)
+        return False
+
+    @property
+    def degraded(self) -> bool:
+        return bool(self.shed)
+
+    def describe(self) -> str:
+        return ", ".join(STAGE_DESCRIPTIONS.get(stage, stage) for stage in self.shed)
+
+
+_current_budget = contextvars.ContextVar("proof_question_budget", default=None)
+
+
+@contextmanager
+def question_budget(total_seconds: float = QUESTION_BUDGET_SECONDS, started_at: Optional[float] = None):
+    """Sets the budget for backend calls made in this context"""
+    budget = QuestionBudget(total_seconds=total_seconds, started_at=started_at)
+    token = _current_budget.set(budget)
+    try:
+        yield budget
+    finally:
+        _current_budget.reset(token)
+
+
+def current_budget() -> Optional[QuestionBudget]:
+    return _current_budget.get()
+
+
+def budget_allows(stage: str) -> bool:
+    """Work outside a budgeted question (background jobs, MCP tools) is never shed"""
+    budget = current_budget()
+    return budget is None or budget.allows(stage)
+
+
+def remaining_budget() -> Optional[float]:
+    budget = current_budget()
+    return None if budget is None else budget.remaining()
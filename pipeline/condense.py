@@ -0,0 +1,65 @@
+from typing import Iterable, Optional
+import os
+import re
+
+from pipeline.semantic_cache import query_tokens
+
+# Retrieve first questions and preset common queries as asked; 0 sends every question with history to the LLM
+CONDENSE_FAST_PATH = os.getenv("PROOF_CONDENSE_FAST_PATH", "1") == "1"
+# Also skip the LLM for follow-ups the word heuristic below judges standalone; off until validated on labelled follow-ups
+CONDENSE_HEURISTIC = os.getenv("PROOF_CONDENSE_HEURISTIC", "0") == "1"
+# Fewer content words than this is usually an ellipsis ("and for 2023?") that needs the earlier turns
+MIN_STANDALONE_TERMS = 3
+
+# Words that point back at something said in an earlier turn
+REFERRING_WORDS = {
+    "it", "its", "itself", "they", "them", "their", "theirs", "he", "him", "his", "she", "her", "hers",
+    "this", "that", "these", "those", "there", "above", "previous", "previously", "earlier", "former", "latter",
+    "same", "also", "again", "more", "else", "other", "another", "instead", "further", "elaborate", "expand",
+    "one", "ones", "which", "both", "either", "neither", "each",
+}
+# Imperatives that usually continue the previous answer ("Break down the costs by department")
+CONTINUATION_VERBS = {
+    "break", "summarize", "summarise", "compare", "list", "explain", "describe", "detail", "outline", "show",
+    "give", "continue", "clarify", "rephrase", "simplify", "shorten", "highlight", "walk",
+}
+# Definite noun phrases about the whole organisation that don't point back at an earlier answer
+GLOBAL_REFERENTS = {"board", "company", "organisation", "organization", "group", "directors"}
+FOLLOW_UP_OPENERS = ("and", "but", "or", "so", "then", "what about", "how about", "why not")
+# "this year" or "that quarter" name a period, not an earlier answer
+_PERIOD_PHRASE = re.compile(r"\b(this|that|these|those)\s+(year|quarter|month|week|meeting|period)s?\b")
+_DEFINITE_NOUN = re.compile(r"\bthe\s+([a-z]+)")
+# A year, a quarter or a capitalised name after the first word pins the question to something specific
+_ANCHOR = re.compile(r"\b(19|20)\d{2}\b|\b[QH][1-4]\b|(?<=\s)[A-Z][A-Za-z]+")
+
+
+def normalize_question(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def is_anchored(question: str) -> bool:
+    return bool(_ANCHOR.search(question.strip()))
+
+
+def fast_path_reason(has_history: bool, question: str, standalone_questions: Iterable[str] = (),
+                     heuristic: bool = CONDENSE_HEURISTIC) -> Optional[str]:
+    """Why the question can skip the condense LLM call, or None when it may need the earlier turns"""
+    if not has_history:
+        return "first_turn"
+    normalized = normalize_question(question)
+    if normalized in {normalize_question(standalone) for standalone in standalone_questions}:
+        return "common_query"
+    if not heuristic:
+        return None
+    words = re.findall(r"[a-z0-9']+", _PERIOD_PHRASE.sub(" ", normalized))
+    if not words or REFERRING_WORDS & set(words):
+        return None
+    if any(normalized.startswith(f"{opener} ") for opener in FOLLOW_UP_OPENERS):
+        return None
+    if len(query_tokens(normalized)) < MIN_STANDALONE_TERMS:
+        return None
+    # "the deal" or "Break down the costs" lean on the previous answer unless a period or name pins them down
+    definite_nouns = set(_DEFINITE_NOUN.findall(normalized)) - GLOBAL_REFERENTS
+    if (definite_nouns or words[0] in CONTINUATION_VERBS) and not is_anchored(question):
+        return None
+    return "self_contained"
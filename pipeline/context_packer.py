@@ -0,0 +1,139 @@
+from llama_index.core.bridge.pydantic import Field
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.schema import NodeWithScore, QueryBundle
+from llama_index.core.utils import get_tokenizer
+from typing import List, Optional
+import logging
+import os
+import re
+
+from pipeline.semantic_cache import query_tokens
+from pipeline.tracing import TOKEN_BUCKETS, get_metrics_registry, span
+
+logger = logging.getLogger(__name__)
+
+# Tokens of retrieved text the answer prompt may carry; 0 passes retrieval results through unchanged
+CONTEXT_TOKEN_BUDGET = int(os.getenv("PROOF_CONTEXT_TOKEN_BUDGET", "3000"))
+# Chunks shorter than this are kept whole; trimming them saves little and loses context
+MIN_TRIM_TOKENS = 120
+# Lead kept from a chunk that matched semantically but shares no terms with the query
+UNMATCHED_LEAD_TOKENS = 120
+# A chunk cut to fit the budget must keep at least this much to be worth including
+MIN_FRAGMENT_TOKENS = 40
+ELISION = " … "
+
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?;:])\s+|\n+")
+
+
+def split_sentences(text: str, max_words: int = 60) -> List[str]:
+    """Sentences and lines; unpunctuated runs, common in extracted PDF tables, are cut every max_words"""
+    sentences = []
+    for sentence in _SENTENCE_BOUNDARY.split(text):
+        words = sentence.split() if sentence else []
+        sentences.extend(" ".join(words[start:start + max_words]) for start in range(0, len(words), max_words))
+    return sentences
+
+
+def _normalized(text: str) -> str:
+    return " ".join(re.findall(r"[a-z0-9]+", text.lower()))
+
+
+def count_tokens(text: str) -> int:
+    return len(get_tokenizer()(text))
+
+
+class TokenBudgetPacker(BaseNodePostprocessor):
+    """
+    Packs retrieved chunks into a token budget for the answer prompt
+    Highest scores first: overlapping chunks are deduplicated, long chunks trimmed to the sentences around query terms
+    """
+    token_budget: int = Field(default=CONTEXT_TOKEN_BUDGET)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "TokenBudgetPacker"
+
+    @staticmethod
+    def _relevant_sentences(sentences: List[str], terms: set) -> List[Optional[str]]:
+        """Sentences mentioning a query term plus their neighbours; None marks an elided run"""
+        matched = {index for index, sentence in enumerate(sentences) if terms & set(query_tokens(sentence))}
+        if not matched:
+            kept, tokens = [], 0
+            for sentence in sentences:
+                if tokens >= UNMATCHED_LEAD_TOKENS:
+                    break
+                kept.append(sentence)
+                tokens += count_tokens(sentence)
+            return kept + ([None] if len(kept) < len(sentences) else [])
+        keep = {neighbour for index in matched for neighbour in (index - 1, index, index + 1)
+                if 0 <= neighbour < len(sentences)}
+        result = []
+        for index, sentence in enumerate(sentences):
+            if index in keep:
+                result.append(sentence)
+            elif not result or result[-1] is not None:
+                result.append(None)
+        return result
+
+    @staticmethod
+    def _join(sentences: List[Optional[str]]) -> str:
+        text = " ".join(ELISION if sentence is None else sentence for sentence in sentences)
+        return re.sub(r"\s*…\s*(…\s*)*", ELISION, text).strip()
+
+    def _postprocess_nodes(self, nodes: List[NodeWithScore],
+                           query_bundle: Optional[QueryBundle] = None) -> List[NodeWithScore]:
+        if self.token_budget <= 0 or not nodes:
+            return nodes
+        terms = set(query_tokens(query_bundle.query_str)) if query_bundle is not None else set()
+        ordered = sorted(nodes, key=lambda node: node.score or 0.0, reverse=True)
+        raw_tokens = sum(count_tokens(node.node.get_content()) for node in ordered)
+
+        with span("context.pack", node_count=len(nodes), token_budget=self.token_budget) as pack_span:
+            packed, seen_texts, seen_sentences, used = [], set(), set(), 0
+            for node_with_score in ordered:
+                text = node_with_score.node.get_content()
+                normalized_text = _normalized(text)
+                if not normalized_text or normalized_text in seen_texts:
+                    continue
+                seen_texts.add(normalized_text)
+
+                # Overlapping neighbour chunks repeat sentences already packed from a higher-scored chunk
+                sentences = [sentence for sentence in split_sentences(text)
+                             if _normalized(sentence) not in seen_sentences]
+                if not sentences:
+                    continue
+                if count_tokens(" ".join(sentences)) > MIN_TRIM_TOKENS and terms:
+                    sentences = self._relevant_sentences(sentences, terms)
+
+                remaining = self.token_budget - used
+                kept, tokens = [], 0
+                for sentence in sentences:
+                    sentence_tokens = count_tokens(sentence) if sentence is not None else 1
+                    if tokens + sentence_tokens > remaining:
+                        break
+                    kept.append(sentence)
+                    tokens += sentence_tokens
+                if tokens < min(MIN_FRAGMENT_TOKENS, count_tokens(" ".join(s for s in sentences if s))):
+                    break
+
+                seen_sentences.update(_normalized(sentence) for sentence in kept if sentence is not None)
+                node = node_with_score.node.model_copy()
+                node.set_content(self._join(kept))
+                packed.append(NodeWithScore(node=node, score=node_with_score.score))
+                used += tokens
+                if used >= self.token_budget - MIN_FRAGMENT_TOKENS:
+                    break
+
+            packed_tokens = sum(count_tokens(node.node.get_content()) for node in packed)
+            if pack_span is not None:
+                pack_span.set_attribute("raw_tokens", raw_tokens)
+                pack_span.set_attribute("packed_tokens", packed_tokens)
+                pack_span.set_attribute("packed_nodes", len(packed))
+
+        registry = get_metrics_registry()
+        registry.observe("proof_context_tokens", raw_tokens, buckets=TOKEN_BUCKETS, kind="retrieved")
+        registry.observe("proof_context_tokens", packed_tokens, buckets=TOKEN_BUCKETS, kind="packed")
+        registry.increment("proof_context_tokens_saved_total", max(raw_tokens - packed_tokens, 0))
+        logger.info(f"CONTEXT_PACKER: {len(nodes)} nodes, {raw_tokens} tokens -> {len(packed)} nodes, "
+                    f"{packed_tokens} tokens ({raw_tokens - packed_tokens} saved)")
+        return packed
@@ -0,0 +1,161 @@
+from concurrent.futures import ThreadPoolExecutor
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.llms import ChatMessage, MessageRole
+from llama_index.core.memory import ChatMemoryBuffer
+from typing import Any, List, Optional
+import logging
+import os
+import threading
+
+from pipeline.rate_limit import Priority, request_priority
+from pipeline.tracing import TOKEN_BUCKETS, get_metrics_registry, set_attribute, span
+
+logger = logging.getLogger(__name__)
+
+# Latest turns (question and answer) always sent verbatim; older ones are folded into the rolling summary
+MEMORY_RECENT_TURNS = int(os.getenv("PROOF_MEMORY_RECENT_TURNS", "3"))
+MEMORY_TOKEN_LIMIT = int(os.getenv("PROOF_MEMORY_TOKEN_LIMIT", "3900"))
+SUMMARY_MAX_WORDS = 250
+SUMMARY_HEADER = "Summary of the earlier conversation:\n"
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a conversation between a company Director and an assistant "
+    "that answers questions about the company's Board documents.\n"
+    "Current summary:\n{summary}\n\n"
+    "New turns to fold in:\n{transcript}\n\n"
+    "Write the updated summary in at most {max_words} words. Keep the questions asked, the facts, figures and "
+    "document filenames given in answers, and anything the Director may refer back to. Drop pleasantries. "
+    "Return only the summary."
+)
+
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv("PROOF_MEMORY_SUMMARY_WORKERS", "2")),
+                               thread_name_prefix="memory-summary")
+
+
+def _transcript(messages: List[ChatMessage]) -> str:
+    return "\n".join(f"{message.role.value}: {message.content}" for message in messages)
+
+
+class RollingSummaryMemory(ChatMemoryBuffer):
+    """
+    Chat memory that sends the latest turns verbatim after a rolling summary of everything older
+    The summary is updated in a background thread after each answer, so no question waits on it
+    """
+    recent_turns: int = MEMORY_RECENT_TURNS
+    _summarizer_llm: Any = PrivateAttr(default=None)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+    _summary: str = PrivateAttr(default="")
+    # Stored messages already folded into the summary
+    _folded: int = PrivateAttr(default=0)
+    # Bumped by set and reset so a summary of replaced history is discarded
+    _generation: int = PrivateAttr(default=0)
+    _folding: bool = PrivateAttr(default=False)
+
+    def __init__(self, summarizer_llm=None, **data: Any):
+        data.setdefault("token_limit", MEMORY_TOKEN_LIMIT)
+        super().__init__(**data)
+        self._summarizer_llm = summarizer_llm
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "RollingSummaryMemory"
+
+    @property
+    def summary(self) -> str:
+        with self._lock:
+            return self._summary
+
+    def _fold_end(self, messages: List[ChatMessage]) -> int:
+        """Index of the first message kept verbatim: the start of the oldest recent turn"""
+        turn_starts = [index for index, message in enumerate(messages) if message.role == MessageRole.USER]
+        if len(turn_starts) <= self.recent_turns:
+            return 0
+        return turn_starts[-self.recent_turns] if self.recent_turns > 0 else len(messages)
+
+    def get(self, input: Optional[str] = None, initial_token_count: int = 0, **kwargs: Any) -> List[ChatMessage]:
+        messages = self.get_all()
+        with self._lock:
+            summary, folded = self._summary, self._folded
+        prefix = [ChatMessage(role=MessageRole.SYSTEM, content=SUMMARY_HEADER + summary)] if summary else []
+
+        # Turns not yet folded stay verbatim, cut oldest first to the token limit as ChatMemoryBuffer does
+        budget = self.token_limit - initial_token_count - self._token_count_for_messages(prefix)
+        tail = messages[folded:]
+        while tail and self._token_count_for_messages(tail) > budget:
+            tail = tail[1:]
+            while tail and tail[0].role in (MessageRole.ASSISTANT, MessageRole.TOOL):
+                tail = tail[1:]
+
+        history = prefix + tail
+        tokens = self._token_count_for_messages(history)
+        set_attribute("memory_tokens", tokens)
+        set_attribute("memory_summarized_messages", folded)
+        get_metrics_registry().observe("proof_memory_tokens", tokens, buckets=TOKEN_BUCKETS)
+        return history
+
+    def put(self, message: ChatMessage) -> None:
+        super().put(message)
+        if message.role == MessageRole.ASSISTANT:
+            self._schedule_fold()
+
+    async def aput(self, message: ChatMessage) -> None:
+        await super().aput(message)
+        if message.role == MessageRole.ASSISTANT:
+            self._schedule_fold()
+
+    def set(self, messages: List[ChatMessage]) -> None:
+        """Also accepts the output of get(), so trimming with set(get()) keeps the summary"""
+        summary = ""
+        if messages and messages[0].role == MessageRole.SYSTEM and str(messages[0].content).startswith(SUMMARY_HEADER):
+            summary = str(messages[0].content)[len(SUMMARY_HEADER):]
+            messages = messages[1:]
+        with self._lock:
+            super().set(messages)
+            self._summary, self._folded = summary, 0
+            self._generation += 1
+        # A restored long history is summarized before its next question if the summarizer keeps up
+        self._schedule_fold()
+
+    def reset(self) -> None:
+        with self._lock:
+            super().reset()
+            self._summary, self._folded = "", 0
+            self._generation += 1
+
+    def _schedule_fold(self):
+        if self._summarizer_llm is None:
+            return
+        with self._lock:
+            if self._folding:
+                return
+            messages = self.get_all()
+            end = self._fold_end(messages)
+            if end <= self._folded:
+                return
+            self._folding = True
+            job = (self._summary, messages[self._folded:end], end, self._generation)
+        _executor.submit(self._fold, *job)
+
+    def _fold(self, summary: str, messages: List[ChatMessage], end: int, generation: int):
+        updated = None
+        try:
+            with request_priority(Priority.BACKGROUND), \
+                    span("memory.summarize", folded_messages=len(messages)) as summarize_span:
+                prompt = SUMMARY_PROMPT.format(summary=summary or "(none yet)", transcript=_transcript(messages),
+                                               max_words=SUMMARY_MAX_WORDS)
+                updated = str(self._summarizer_llm.complete(prompt).text).strip()
+                if summarize_span is not None:
+                    summarize_span.set_attribute("summary_tokens", len(self.tokenizer_fn(updated)))
+            get_metrics_registry().increment("proof_memory_summaries_total", outcome="ok")
+        except Exception as e:
+            # The unfolded turns stay verbatim and are cut to the token limit until a later fold succeeds
+            get_metrics_registry().increment("proof_memory_summaries_total", outcome="error")
+            logger.warning(f"MEMORY: Failed to fold {len(messages)} messages into the summary: {e}")
+        finally:
+            with self._lock:
+                if updated and generation == self._generation:
+                    self._summary, self._folded = updated, end
+                self._folding = False
+        if updated and generation == self._generation:
+            # Turns answered while this fold ran may be due as well
+            self._schedule_fold()
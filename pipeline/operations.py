@@ -0,0 +1,83 @@
+from typing import Optional
+import time
+
+from pipeline.rate_limit import rate_limiter_stats
+from pipeline.resilience import resilience_stats
+from pipeline.semantic_cache import semantic_cache_stats
+from pipeline.single_flight import single_flight_stats
+from pipeline.tracing import get_metrics_registry
+
+# Windows offered by the operations dashboard, in seconds
+WINDOWS = {"5m": 300, "1h": 3600, "24h": 86400}
+
+
+def _latency_rows(metric: str, window_seconds: Optional[float]) -> list:
+    since = time.time() - window_seconds if window_seconds else None
+    rows = []
+    for labels, histogram in sorted(get_metrics_registry().histograms_named(metric).items()):
+        p50 = histogram.percentile(50, since=since)
+        if p50 is None:
+            continue
+        row = dict(labels)
+        row.update({
+            "count": histogram.count if since is None else histogram.window_count(since),
+            "p50_ms": round(1000 * p50, 1),
+            "p95_ms": round(1000 * histogram.percentile(95, since=since), 1),
+            "p99_ms": round(1000 * histogram.percentile(99, since=since), 1),
+        })
+        rows.append(row)
+    return rows
+
+
+# LLM usage, and retrieved vs packed answer context from the context packer
+TOKEN_METRICS = {"proof_llm_tokens": "llm", "proof_context_tokens": "context", "proof_memory_tokens": "memory"}
+
+
+def token_usage(window_seconds: float) -> list:
+    since = time.time() - window_seconds
+    rows = []
+    for metric, usage in TOKEN_METRICS.items():
+        for labels, histogram in sorted(get_metrics_registry().histograms_named(metric).items()):
+            row = {"usage": usage, **dict(labels)}
+            row.update({"calls": histogram.window_count(since), "tokens": int(histogram.window_sum(since))})
+            rows.append(row)
+    return rows
+
+
+def operations_snapshot(window_seconds: Optional[float] = None) -> dict:
+    """Everything the operations dashboard shows, read from in-process stats only (no backend calls)"""
+    return {
+        "stages": _latency_rows("proof_stage_seconds", window_seconds),
+        "retrieval": _latency_rows("proof_retrieval_seconds", window_seconds),
+        "search_index": _latency_rows("proof_search_index_seconds", window_seconds),
+        "condense": _latency_rows("proof_condense_seconds", window_seconds),
+        "components": _latency_rows("proof_component_seconds", window_seconds),
+        "caches": [{key: value for key, value in stats.items() if key != "recent_samples"}
+                   for stats in semantic_cache_stats()],
+        "single_flight": single_flight_stats(),
+        "limiters": rate_limiter_stats(),
+        "circuits": resilience_stats(),
+        "tokens": {name: token_usage(seconds) for name, seconds in WINDOWS.items()},
+    }
+
+
+def _collect_gauges() -> dict:
+    gauges = {}
+    for stats in semantic_cache_stats():
+        labels = (("cache", stats["name"]),)
+        gauges[("proof_cache_hit_rate", labels)] = stats["hit_rate"]
+        gauges[("proof_cache_entries", labels)] = stats["size"]
+    for stats in single_flight_stats():
+        labels = (("flight", stats["name"]),)
+        gauges[("proof_single_flight_in_flight", labels)] = stats["in_flight"]
+        gauges[("proof_single_flight_coalesced", labels)] = stats["coalesced"]
+    for stats in rate_limiter_stats():
+        gauges[("proof_backend_in_flight", (("backend", stats["name"]),))] = stats["in_flight"]
+        for priority, queued in stats["queued"].items():
+            gauges[("proof_backend_queued", (("backend", stats["name"]), ("priority", priority)))] = queued
+    for operation, stats in resilience_stats().items():
+        gauges[("proof_circuit_open", (("operation", operation),))] = int(stats["circuit"] != "closed")
+    return gauges
+
+
+get_metrics_registry().register_collector("operations", _collect_gauges)
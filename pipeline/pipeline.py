@@ -8,23 +8,68 @@ import tempfile
 import os
 from typing import Optional, List, Dict
 import json
+import hashlib
 import logging
 from errors import *
+from pipeline.summaries import DocumentSummaryStore
+from pipeline.semantic_cache import get_semantic_cache, node_overlap
+from pipeline.single_flight import get_single_flight, normalize_text
+from pipeline.rate_limit import RateLimitedClient, get_rate_limiter
+from pipeline.resilience import call_with_policy
+from pipeline.budget import budget_allows, remaining_budget
+from pipeline.tracing import set_attribute, span
+from pipeline.record_replay import cassette_http_client
+from contextlib import nullcontext
 import httpx
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_BASE_URL = "https://api.cloud.llamaindex.ai"
+
+
+def llama_cloud_base_url(base_url: Optional[str] = None) -> str:
+    """Explicit argument, then LLAMA_CLOUD_BASE_URL (also read by llama_index), then the hosted API"""
+    return (base_url or os.getenv("LLAMA_CLOUD_BASE_URL") or DEFAULT_BASE_URL).rstrip("/")
+
+# A sampled cache hit whose nodes overlap fresh results less than this is counted as a false hit
+FALSE_HIT_OVERLAP = 0.5
+
+# When the backend is unhealthy a looser cached match beats no answer at all
+FALLBACK_CACHE_SIMILARITY = 0.5
+
+# Retrieval settings; tune them with tools/retrieval_sweep.py over the golden questions
+RERANK_TOP_N = int(os.getenv("PROOF_RERANK_TOP_N", "5"))
+RETRIEVAL_MODE = os.getenv("PROOF_RETRIEVAL_MODE", "full").lower()
+SIMILARITY_TOP_K = int(os.getenv("PROOF_SIMILARITY_TOP_K", "5"))
+# Candidates each index contributes to the global rerank; unset keeps the index's own setting
+INDEX_TOP_K = int(os.getenv("PROOF_INDEX_TOP_K", "0")) or None
+
+# Degraded retrieval lets LlamaCloud route to the most relevant indices and reranks fewer nodes
+DEGRADED_RERANK_TOP_N = int(os.getenv("PROOF_DEGRADED_RERANK_TOP_N", "3"))
+
 class RAGService:
-    def __init__(self, llama_cloud_api_key):
+    COMPOSITE_RETRIEVER_NAME = "Composite Retriever"
+    COMPOSITE_IMAGE_RETRIEVER_NAME = "Composite Image Retriever"
+
+    def __init__(self, llama_cloud_api_key, base_url: Optional[str] = None, httpx_client: Optional[httpx.Client] = None):
         try:
             self.api_key = llama_cloud_api_key
-            self.client = LlamaCloud(token=self.api_key)
+            # A local fake server or a recorded cassette can stand in for LlamaCloud
+            self.base_url = llama_cloud_base_url(base_url)
+            self.http_client = httpx_client or cassette_http_client(timeout=60)
+            # Every session's client shares one process-wide rate limiter and concurrency budget
+            self.client = RateLimitedClient(LlamaCloud(token=self.api_key, base_url=self.base_url,
+                                                       httpx_client=self.http_client),
+                                            get_rate_limiter("llamacloud"))
             self.file_id_name_dict = None
-            self.composite_retriever_name = "Composite Retriever"
-            self.composite_image_retriever_name = "Composite Image Retriever"
+            self._index_version = None
+            self.composite_retriever_name = self.COMPOSITE_RETRIEVER_NAME
+            self.composite_image_retriever_name = self.COMPOSITE_IMAGE_RETRIEVER_NAME
             self.existing_retriever_names_list = None
             self.composite_retriever = None
             self.composite_image_retriever = None
+            self._degraded_retrievers = {}
+            self.summary_store = DocumentSummaryStore()
 
         except Exception as e:
             logging.error(f"Failed to initialize LlamaCloud client: {str(e)}")
@@ -45,7 +90,7 @@ class RAGService:
             raise ProjectNotFoundError(f"Failed to get project ID during init") from e
 
         try:
-            self.file_id_name_dict = self.list_filename_to_id_dict()
+            self.refresh_file_catalog()
         except Exception as e:
             logging.error(f"Failed to list filename dict during init: {e}")
             raise e
@@ -77,12 +122,14 @@ class RAGService:
             logging.error(f"Failed to get composite retriever during init: {e}")
             raise RetrieverFailedError(f"Failed to get composite retriever during init") from e
 
+        self._build_degraded_retrievers()
+
     def _list_retriever_names(self):
         existing_retriever_names = [retriever.name for retriever in self.list_retrievers(raw_response=True)]
 
         return existing_retriever_names
 
-    def run_retriever_sync(self):
+    def run_retriever_sync(self, summarize_llm=None):
         logger.info(f"Running retriever sync")
         try:
             self._sync_indices_with_retriever(self.composite_retriever)
@@ -94,6 +141,57 @@ class RAGService:
         except Exception as e:
             logging.error(f"Failed to sync image composite retriever: {e}")
             raise RetrieverFailedError(f"Failed to sync image composite retriever: {e}")
+        try:
+            self.refresh_file_catalog()
+        except Exception as e:
+            logging.error(f"Failed to refresh file catalog after sync: {e}")
+        if summarize_llm is not None:
+            try:
+                self.build_document_summaries(summarize_llm)
+            except Exception as e:
+                # Summaries are an optimization; a failed build leaves the previous summaries in place
+                logging.error(f"Failed to build document summaries: {e}")
+
+    def _list_pipeline_documents(self, pipeline_id: str, page_size: int = 100):
+        """Pages through all parsed documents of a pipeline"""
+        documents = []
+        skip = 0
+        while True:
+            page = self.client.pipelines.list_pipeline_documents(pipeline_id=pipeline_id, skip=skip, limit=page_size)
+            documents.extend(page)
+            if len(page) < page_size:
+                return documents
+            skip += page_size
+
+    def build_document_summaries(self, summarize_llm):
+        """Rebuilds per-file, per-meeting and per-committee summaries for files whose content changed"""
+        documents = {}
+        for pipeline_name, pipeline_id in self.indices.items():
+            try:
+                pipeline_documents = self._list_pipeline_documents(pipeline_id=pipeline_id)
+            except Exception as e:
+                raise LlamaOperationFailedError(f"Failed to list documents for pipeline {pipeline_name}: {e}")
+
+            for document in pipeline_documents:
+                metadata = document.metadata or {}
+                file_name = metadata.get('file_name', None)
+                file_id = metadata.get('file_id', None) or self.file_id_name_dict.get(file_name, None)
+                if file_id is None:
+                    continue
+                entry = documents.setdefault(file_id, {'name': file_name or file_id,
+                                                       'pipeline': pipeline_name,
+                                                       'parts': []})
+                entry['parts'].append(document.text or "")
+
+        for entry in documents.values():
+            entry['text'] = "\n".join(entry.pop('parts'))
+
+        return self.summary_store.build(documents, summarize=lambda prompt: summarize_llm.complete(prompt).text)
+
+    def summary_retrieval(self, query_text: str, top_k: int = 5):
+        if query_text is None:
+            raise MissingValueError("Query text is missing")
+        return self.summary_store.retrieve(query_text, top_k=top_k)
 
 
     def _sync_indices_with_retriever(self, composite_retriever):
@@ -124,7 +222,8 @@ class RAGService:
                     retrieve_image_nodes = False
 
                 pipeline_specific_retrieval_params = PresetRetrievalParams(
-                    retrieve_image_nodes=retrieve_image_nodes,)
+                    retrieve_image_nodes=retrieve_image_nodes,
+                    **({"dense_similarity_top_k": INDEX_TOP_K} if INDEX_TOP_K else {}))
 
                 composite_retriever.add_index(index=index, preset_retrieval_parameters=pipeline_specific_retrieval_params)
                 logger.info(f"Added index {description} to pipeline")
@@ -146,8 +245,10 @@ class RAGService:
                 create_if_not_exists=True,
                 # CompositeRetrievalMode.FULL will query each index individually and globally rerank results at the end
                 # CompositeRetrievalMode.ROUTED an agent determines which sub-indices are most relevant to the provided query (based on the sub-index's name & description you've provided)
-                mode=CompositeRetrievalMode.FULL,
-                rerank_top_n=5,
+                mode=CompositeRetrievalMode(RETRIEVAL_MODE),
+                rerank_top_n=RERANK_TOP_N,
+                base_url=self.base_url,
+                httpx_client=self.http_client,
             )
 
             if name in self.existing_retriever_names_list:
@@ -168,7 +269,9 @@ class RAGService:
                 name=name,
                 project_id=self.project_id,
                 api_key=self.api_key,
-                organization_id=self.organization_id
+                organization_id=self.organization_id,
+                base_url=self.base_url,
+                httpx_client=self.http_client
             )
             index_object_list.append(index)
 
@@ -198,6 +301,17 @@ class RAGService:
     def indices(self):
         return self._indices
 
+    @property
+    def index_version(self):
+        """Changes whenever a file is added, removed or updated; used to scope precomputed results"""
+        return self._index_version
+
+    @property
+    def answer_scope(self) -> tuple:
+        """Everything retrieval depends on; sessions with the same scope get the same context for a question"""
+        return (self.organization_id, self.project_id, self.index_version, self.composite_retriever_name,
+                RETRIEVAL_MODE, RERANK_TOP_N, self.summary_store.revision)
+
     def _get_first_project_id(self):
         try:
             project_ids = self.list_llama_projects()
@@ -336,7 +450,8 @@ class RAGService:
         except Exception as e:
             return f"Failed to add data sources to pipeline: {e}"
 
-    def _format_file_response(self, files):
+    @staticmethod
+    def _format_file_response(files):
         try:
             result = ""
             files_dict = {}
@@ -381,31 +496,54 @@ class RAGService:
             logging.error(e)
             return f"Failed to list available pipeline files: {e}"
 
-    def list_filename_to_id_dict(self):
-        files = self.client.files.list_files(organization_id=self.organization_id)
+    def list_filename_to_id_dict(self, files=None):
+        if files is None:
+            files = self.client.files.list_files(organization_id=self.organization_id)
         name_to_id_dict = {}
         for file in files:
             name_to_id_dict[file.name] = file.id
             name_to_id_dict[file.id] = file.name
         return name_to_id_dict
 
+    @staticmethod
+    def _compute_index_version(files):
+        fingerprint = sorted(
+            f"{file.id}:{getattr(file, 'updated_at', None)}:{getattr(file, 'file_size', None)}" for file in files
+        )
+        return hashlib.sha256("|".join(fingerprint).encode("utf-8")).hexdigest()[:16]
 
-    def search_index(self, pipeline_id: str, query: str = ""):
-        try:
-            result = self.client.pipelines.run_search(pipeline_id=pipeline_id, query=query)
+    def refresh_file_catalog(self):
+        """Refreshes the filename lookup and index version from a single file listing"""
+        files = self.client.files.list_files(organization_id=self.organization_id)
+        self.file_id_name_dict = self.list_filename_to_id_dict(files=files)
+        self._index_version = self._compute_index_version(files)
+        return self._index_version
 
-            response_text = f"Search results for '{query}':\n\n"
 
-            for i, node in enumerate(result.retrieval_nodes, 1):
-                response_text += f"Result {i} (Score: {node.score:.3f}):\n"
-                response_text += f"Source: {node.node.extra_info.get('file_name', 'Unknown')}\n"
-                response_text += f"Content: {node.node.text}\n\n"
+    def search_index(self, pipeline_id: str, query: str = "", max_content_chars: Optional[int] = None):
+        try:
+            with span("search_index", labels={"pipeline": pipeline_id}):
+                result = self.client.pipelines.run_search(pipeline_id=pipeline_id, query=query)
 
-            return response_text
+            return self._format_search_result(query, result, max_content_chars=max_content_chars)
         except Exception as e:
             logging.error(e)
             return f"Failed to search index: {e}"
 
+    @staticmethod
+    def _format_search_result(query: str, result, max_content_chars: Optional[int] = None):
+        parts = [f"Search results for '{query}':\n\n"]
+
+        for i, node in enumerate(result.retrieval_nodes, 1):
+            content = node.node.text
+            if max_content_chars is not None and len(content) > max_content_chars:
+                content = content[:max_content_chars] + "..."
+            parts.append(f"Result {i} (Score: {node.score:.3f}):\n")
+            parts.append(f"Source: {node.node.extra_info.get('file_name', 'Unknown')}\n")
+            parts.append(f"Content: {content}\n\n")
+
+        return "".join(parts)
+
     def sync_pipeline(self, pipeline_id:str):
         try:
             response = self.client.pipelines.sync_pipeline(pipeline_id=pipeline_id)
@@ -507,7 +645,8 @@ class RAGService:
                               mode: str = "routing",
                               rerank_top_n: Optional[int] = None,
                               top_k_per_pipeline: int = 10,
-                              project_id: Optional[str] = None):
+                              project_id: Optional[str] = None,
+                              raw_response: bool = False):
         """Retrieve directly without creating a persistent retriever"""
 
         # CompositeRetrievalMode is already an enum, just use it directly
@@ -535,9 +674,12 @@ class RAGService:
             pipelines=pipelines
         )
 
+        if raw_response:
+            return result
         return self._format_composite_retrieval_result(result)
 
-    def _format_composite_retrieval_result(self, result):
+    @staticmethod
+    def _format_composite_retrieval_result(result):
         """Format the retrieval result as simple chunks for RAG"""
         nodes = result.nodes if hasattr(result, 'nodes') else []
 
@@ -630,7 +772,14 @@ class RAGService:
         return screenshots
 
     def get_file_screenshot(self, file_id: str, page_index: int):
-        """Get a specific page screenshot from a file"""
+        """Get a specific page screenshot from a file; concurrent requests for the same page share one call"""
+        return get_single_flight("screenshot").do(
+            (self.organization_id, file_id, page_index),
+            lambda: call_with_policy("screenshot",
+                                     lambda: self._fetch_file_screenshot(file_id=file_id, page_index=page_index))
+        )
+
+    def _fetch_file_screenshot(self, file_id: str, page_index: int):
         try:
             # Try the normal API call
             screenshot_data = self.client.files.get_file_page_screenshot(
@@ -645,9 +794,10 @@ class RAGService:
 
             # Use httpx directly to make the request
 
-            url = f"https://api.cloud.llamaindex.ai/api/v1/files/{file_id}/page_screenshots/{page_index}"
+            url = f"{self.base_url}/api/v1/files/{file_id}/page_screenshots/{page_index}"
 
-            with httpx.Client() as client:
+            http_client = nullcontext(self.http_client) if self.http_client is not None else httpx.Client()
+            with http_client as client, get_rate_limiter("llamacloud").slot():
                 response = client.get(
                     url,
                     headers={
@@ -657,22 +807,21 @@ class RAGService:
                 )
                 response.raise_for_status()
 
-                # Get the raw bytes
                 image_bytes = response.content
-
-                # Log some debug info
-                print(f"Image size: {len(image_bytes)} bytes")
-                print(f"First 10 bytes: {image_bytes[:10].hex()}")
-
+                logger.debug(f"Fetched screenshot {file_id}/{page_index}: {len(image_bytes)} bytes")
                 return image_bytes
 
     def get_file_content_url(self, file_id: str, expires_in_seconds: int = 3600):
         """Get a presigned URL to download the file content"""
         try:
-            presigned_url = self.client.files.read_file_content(
-                id=file_id,
-                expires_at_seconds=expires_in_seconds,
-                organization_id=self.organization_id
+            # Directors opening the same reference at once share one presigning call
+            presigned_url = get_single_flight("file_url").do(
+                (self.organization_id, file_id, expires_in_seconds),
+                lambda: call_with_policy("file_url", lambda: self.client.files.read_file_content(
+                    id=file_id,
+                    expires_at_seconds=expires_in_seconds,
+                    organization_id=self.organization_id
+                ))
             )
 
             return presigned_url.url
@@ -800,6 +949,7 @@ class RAGService:
             "individual_files": []
         }
 
+        ds_id_map = None
         for file in files:
             file_info = {
                 "id": file.id,
@@ -809,8 +959,9 @@ class RAGService:
             }
 
             if file.data_source_id:
-                # This is from a data source
-                ds_id_map = self.get_data_sources_id_map(raw_mode=True)
+                # This is from a data source; one listing serves every file instead of a request per file
+                if ds_id_map is None:
+                    ds_id_map = self.get_data_sources_id_map(raw_mode=True)
                 ds_name = ds_id_map.get(file.data_source_id)
 
 
@@ -869,13 +1020,15 @@ class RAGService:
             name=pipeline_name,
             project_id=self.project_id,
             organization_id=self.organization_id,
-            api_key=self.api_key
+            api_key=self.api_key,
+            base_url=self.base_url,
+            httpx_client=self.http_client
         )
 
         # Try with images first
         try:
             retriever = multimodal_index.as_retriever(
-                similarity_top_k=5,
+                similarity_top_k=SIMILARITY_TOP_K,
                 retrieve_image_nodes=True
             )
             nodes_with_scores = retriever.retrieve(query_text)
@@ -885,7 +1038,7 @@ class RAGService:
             # Fallback to text-only retrieval
             try:
                 retriever = multimodal_index.as_retriever(
-                    similarity_top_k=5,
+                    similarity_top_k=SIMILARITY_TOP_K,
                     retrieve_image_nodes=False
                 )
                 nodes_with_scores = retriever.retrieve(query_text)
@@ -894,27 +1047,145 @@ class RAGService:
                 logging.error(f"MULTI_MODAL_RETRIEVAL error: {e2}")
                 raise e2
 
-    def composite_retrieval(self, query_text: str):
+    def _new_degraded_retriever(self, name: str):
+        """Same LlamaCloud retriever queried in ROUTING mode with a smaller rerank"""
+        return LlamaCloudCompositeRetriever(
+            name=name,
+            project_id=self.project_id,
+            organization_id=self.organization_id,
+            api_key=self.api_key,
+            mode=CompositeRetrievalMode.ROUTING,
+            rerank_top_n=DEGRADED_RERANK_TOP_N,
+            base_url=self.base_url,
+            # AsyncRAGService shares this builder but holds an async client
+            httpx_client=(self.http_client if isinstance(self.http_client, httpx.Client)
+                          else cassette_http_client(timeout=60)),
+            async_httpx_client=self.http_client if isinstance(self.http_client, httpx.AsyncClient) else None,
+        )
+
+    def _build_degraded_retrievers(self):
+        """Built with the composite retrievers so the low-budget path never makes setup calls"""
+        for retriever in (self.composite_retriever, self.composite_image_retriever):
+            if retriever is None:
+                continue
+            try:
+                self._degraded_retrievers[retriever.name] = RAGService._new_degraded_retriever(self, retriever.name)
+            except Exception as e:
+                logging.warning(f"Failed to build degraded retriever for {retriever.name}, "
+                                f"low-budget questions will use the full one: {e}")
+
+    def _degraded_retriever(self, retriever):
+        return self._degraded_retrievers.get(retriever.name, retriever)
+
+    def _retrieve_coalesced(self, retriever, query_text: str, degraded: bool = False):
+        """Concurrent identical retrievals, e.g. a common query clicked by many directors, share one call"""
+        key = (self.organization_id, retriever.name, degraded, normalize_text(query_text))
+        return get_single_flight("retrieve").do(
+            key, lambda: call_with_policy("retrieve", lambda: self._retrieve_limited(retriever, query_text),
+                                          deadline_seconds=remaining_budget())
+        )
+
+    @staticmethod
+    def _retrieve_limited(retriever, query_text: str):
+        # Retrievers hold their own LlamaCloud clients so the limiter is applied around the call
+        with get_rate_limiter("llamacloud").slot():
+            return retriever.retrieve(query_text)
+
+    def _cached_retrieval(self, retriever, query_text: str, store: Optional[str] = None):
+        """Serves near-duplicate questions from the shared semantic cache, scoped by index version and store"""
+        cache = get_semantic_cache("retrieval")
+        scope = (self.organization_id, self.index_version, store, retriever.name)
+
+        cached = cache.lookup(scope, query_text)
+        if cached is not None:
+            nodes_with_scores, cached_query, similarity = cached
+            if not cache.should_sample(similarity) or not budget_allows("full_retrieval"):
+                logger.info(f"Semantic cache hit for '{query_text}' via '{cached_query}' ({similarity:.2f})")
+                set_attribute("cache_hit", True)
+                return nodes_with_scores
+            fresh_nodes = self._retrieve_coalesced(retriever, query_text)
+            cache.record_sample(query_text, cached_query, similarity,
+                                is_false_hit=node_overlap(nodes_with_scores, fresh_nodes) < FALSE_HIT_OVERLAP)
+            cache.put(scope, query_text, fresh_nodes)
+            return fresh_nodes
+
+        set_attribute("cache_hit", False)
+        if not budget_allows("full_retrieval"):
+            set_attribute("degraded", True)
+            set_attribute("mode", "routing")
+            set_attribute("rerank_top_n", DEGRADED_RERANK_TOP_N)
+            # Thinner results are served but never cached in place of full ones
+            return self._retrieve_coalesced(self._degraded_retriever(retriever), query_text, degraded=True)
+
+        nodes_with_scores = self._retrieve_coalesced(retriever, query_text)
+        if nodes_with_scores:
+            cache.put(scope, query_text, nodes_with_scores)
+        return nodes_with_scores
+
+    @staticmethod
+    def _trace_nodes(nodes_with_scores, snippet_chars: int = 500):
+        """Compact node record for traces and the slow-query log; snippets let replays stand in for LlamaCloud"""
+        return [{
+            "id": node_with_score.node.node_id,
+            "score": node_with_score.score,
+            "file_name": node_with_score.node.metadata.get("file_name"),
+            "file_id": node_with_score.node.metadata.get("file_id"),
+            "text": node_with_score.node.get_content()[:snippet_chars],
+        } for node_with_score in nodes_with_scores or []]
+
+    def _fallback_retrieval(self, retriever, query_text: str, store: Optional[str] = None):
+        """Cached or local results for when retrieval failed, timed out or the circuit is open"""
+        scope = (self.organization_id, self.index_version, store, retriever.name)
+        cached = get_semantic_cache("retrieval").lookup(scope, query_text, threshold=FALLBACK_CACHE_SIMILARITY)
+        set_attribute("fallback", True)
+        if cached is not None:
+            logger.warning(f"Serving cached fallback for '{query_text}' via '{cached[1]}' ({cached[2]:.2f})")
+            return cached[0]
+        if retriever is self.composite_retriever:
+            summary_nodes = self.summary_retrieval(query_text)
+            if summary_nodes:
+                logger.warning(f"Serving local summary fallback for '{query_text}'")
+                return summary_nodes
+        return None
+
+    def composite_retrieval(self, query_text: str, store: Optional[str] = None):
         if query_text is None:
             raise MissingValueError("Query text is missing")
 
-        # Try with images first
-        try:
-            nodes_with_scores = self.composite_retriever.retrieve(query_text)
+        with span("retrieval", labels={"retriever": self.composite_retriever_name, "store": store or "all"},
+                  store=store, index_count=len(self.indices or {}), mode=RETRIEVAL_MODE,
+                  rerank_top_n=RERANK_TOP_N) as retrieval_span:
+            try:
+                nodes_with_scores = self._cached_retrieval(self.composite_retriever, query_text, store=store)
+            except Exception as e:
+                logging.warning(f"Composite retrieval failed: {e}")
+                nodes_with_scores = self._fallback_retrieval(self.composite_retriever, query_text, store=store)
+            if retrieval_span is not None:
+                retrieval_span.set_attribute("node_count", len(nodes_with_scores or []))
+                retrieval_span.set_attribute("node_ids", [node.node.node_id for node in nodes_with_scores or []])
+                # Snippets stay off the trace log and are only written if the question turns out slow
+                retrieval_span.set_payload("nodes", self._trace_nodes(nodes_with_scores))
             return nodes_with_scores
-        except Exception as e:
-            logging.warning(f"Composite retrieval failed: {e}")
-            return None
 
-    def multi_modal_composite_retrieval(self, query_text: str):
+    def multi_modal_composite_retrieval(self, query_text: str, store: Optional[str] = None):
         if query_text is None:
             raise MissingValueError("Query text is missing")
 
+        if not budget_allows("images"):
+            return self.composite_retrieval(query_text, store=store)
+
         # Try with images first
-        try:
-            nodes_with_scores = self.composite_image_retriever.retrieve(query_text)
+        with span("retrieval", labels={"retriever": self.composite_image_retriever_name, "store": store or "all"},
+                  store=store, index_count=len(self.indices or {}), mode=RETRIEVAL_MODE,
+                  rerank_top_n=RERANK_TOP_N) as retrieval_span:
+            try:
+                nodes_with_scores = self._cached_retrieval(self.composite_image_retriever, query_text, store=store)
+            except Exception as e:
+                logging.warning(f"Multi modal composite retrieval failed: {e}")
+                nodes_with_scores = self._fallback_retrieval(self.composite_image_retriever, query_text, store=store)
+            if retrieval_span is not None:
+                retrieval_span.set_attribute("node_count", len(nodes_with_scores or []))
+                retrieval_span.set_attribute("node_ids", [node.node.node_id for node in nodes_with_scores or []])
+                # Snippets stay off the trace log and are only written if the question turns out slow
+                retrieval_span.set_payload("nodes", self._trace_nodes(nodes_with_scores))
             return nodes_with_scores
-        except Exception as e:
-            logging.warning(f"Multi modal composite retrieval failed: {e}")
-            # Fallback to text-only retrieval
-            return None
\ No newline at end of file
@@ -0,0 +1,341 @@
+from collections import deque
+from contextlib import contextmanager, asynccontextmanager
+from enum import IntEnum
+from llama_index.core.utils import get_tokenizer
+from llama_index.llms.openai import OpenAI
+from typing import Optional
+import asyncio
+import contextvars
+import functools
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+
+from pipeline.tracing import TOKEN_BUCKETS, get_metrics_registry
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0  # chat answers
+    REFERENCES = 1   # reference panel retrieval, presigned urls, images
+    BACKGROUND = 2   # document sync, summaries, precompute
+
+
+_current_priority = contextvars.ContextVar("proof_request_priority", default=Priority.INTERACTIVE)
+
+
+@contextmanager
+def request_priority(priority: Priority):
+    """Sets the priority class for backend calls made in this context"""
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+def current_priority() -> Priority:
+    return _current_priority.get()
+
+
+def retry_after_seconds(e: Exception) -> Optional[float]:
+    """Returns a backoff for 429 responses from LlamaCloud, OpenAI or raw httpx calls, else None"""
+    status_code = getattr(e, "status_code", None)
+    response = getattr(e, "response", None)
+    if status_code is None and response is not None:
+        status_code = getattr(response, "status_code", None)
+    if status_code != 429:
+        return None
+    try:
+        return float(response.headers.get("retry-after", 1.0))
+    except Exception:
+        return 1.0
+
+
+class TokenBucketLimiter:
+    """
+    Process-wide token bucket with a concurrency budget and strict priority ordering
+    Waiters are served lowest Priority value first, FIFO within a class
+    A 429 drains the bucket and pauses everyone for the server's retry-after instead of each caller retrying blindly
+    """
+    def __init__(self, name: str, rate_per_second: float, burst: int, max_concurrency: int):
+        self.name = name
+        self.rate_per_second = rate_per_second
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self._cond = threading.Condition()
+        self._tokens = float(burst)
+        self._last_refill = time.monotonic()
+        self._paused_until = 0.0
+        self._waiters = []
+        self._sequence = itertools.count()
+        self.in_flight = 0
+        self.throttled = 0
+        self._waits = {priority: deque(maxlen=500) for priority in Priority}
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate_per_second)
+        self._last_refill = now
+
+    def acquire(self, priority: Optional[Priority] = None, cancelled: Optional[threading.Event] = None) -> bool:
+        """Blocks for a slot; returns False without one if cancelled is set while waiting"""
+        priority = current_priority() if priority is None else priority
+        entry = (int(priority), next(self._sequence))
+        start = time.monotonic()
+        with self._cond:
+            heapq.heappush(self._waiters, entry)
+            while True:
+                if cancelled is not None and cancelled.is_set():
+                    self._waiters.remove(entry)
+                    heapq.heapify(self._waiters)
+                    self._cond.notify_all()
+                    return False
+                now = time.monotonic()
+                self._refill(now)
+                if (self._waiters[0] == entry and self._tokens >= 1
+                        and self.in_flight < self.max_concurrency and now >= self._paused_until):
+                    heapq.heappop(self._waiters)
+                    self._tokens -= 1
+                    self.in_flight += 1
+                    self._cond.notify_all()
+                    break
+                wait = max(self._paused_until - now, (1 - self._tokens) / self.rate_per_second, 0.005)
+                self._cond.wait(timeout=wait)
+        self._waits[priority].append(time.monotonic() - start)
+        return True
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def penalize(self, retry_after: float):
+        with self._cond:
+            self.throttled += 1
+            self._tokens = 0
+            self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+        logger.warning(f"RATE_LIMIT[{self.name}]: Backend returned 429, pausing for {retry_after:.1f}s")
+
+    @contextmanager
+    def slot(self, priority: Optional[Priority] = None):
+        self.acquire(priority)
+        try:
+            yield
+        except Exception as e:
+            retry_after = retry_after_seconds(e)
+            if retry_after is not None:
+                self.penalize(retry_after)
+            raise
+        finally:
+            self.release()
+
+    def _cancel_wait(self, cancelled: threading.Event):
+        with self._cond:
+            cancelled.set()
+            self._cond.notify_all()
+
+    def _release_if_acquired(self, waiter: asyncio.Future):
+        if not waiter.cancelled() and waiter.exception() is None and waiter.result():
+            self.release()
+
+    async def aacquire(self, priority: Optional[Priority] = None):
+        # Blocking waits happen in a worker thread so the event loop keeps serving
+        cancelled = threading.Event()
+        waiter = asyncio.ensure_future(
+            asyncio.to_thread(self.acquire, current_priority() if priority is None else priority, cancelled))
+        try:
+            await asyncio.shield(waiter)
+        except asyncio.CancelledError:
+            # A timed-out tool call or a losing hedge: the worker leaves the queue, or hands back a slot it just took
+            self._cancel_wait(cancelled)
+            waiter.add_done_callback(self._release_if_acquired)
+            raise
+
+    @asynccontextmanager
+    async def aslot(self, priority: Optional[Priority] = None):
+        await self.aacquire(priority)
+        try:
+            yield
+        except Exception as e:
+            retry_after = retry_after_seconds(e)
+            if retry_after is not None:
+                self.penalize(retry_after)
+            raise
+        finally:
+            self.release()
+
+    def stats(self) -> dict:
+        with self._cond:
+            queued = {priority.name.lower(): 0 for priority in Priority}
+            for priority, _ in self._waiters:
+                queued[Priority(priority).name.lower()] += 1
+            waits = {}
+            for priority, samples in self._waits.items():
+                ordered = sorted(samples)
+                waits[priority.name.lower()] = {
+                    "count": len(ordered),
+                    "avg_ms": 1000 * sum(ordered) / len(ordered) if ordered else 0.0,
+                    "p95_ms": 1000 * ordered[int(0.95 * (len(ordered) - 1))] if ordered else 0.0,
+                }
+            return {
+                "name": self.name,
+                "in_flight": self.in_flight,
+                "queued": queued,
+                "queue_depth": len(self._waiters),
+                "throttled": self.throttled,
+                "wait": waits,
+            }
+
+
+LIMITER_SETTINGS = {
+    "llamacloud": {
+        "rate_per_second": float(os.getenv("PROOF_LLAMACLOUD_RPS", "10")),
+        "burst": int(os.getenv("PROOF_LLAMACLOUD_BURST", "20")),
+        "max_concurrency": int(os.getenv("PROOF_LLAMACLOUD_CONCURRENCY", "8")),
+    },
+    "openai": {
+        "rate_per_second": float(os.getenv("PROOF_OPENAI_RPS", "5")),
+        "burst": int(os.getenv("PROOF_OPENAI_BURST", "10")),
+        "max_concurrency": int(os.getenv("PROOF_OPENAI_CONCURRENCY", "8")),
+    },
+}
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(name: str) -> TokenBucketLimiter:
+    with _limiters_lock:
+        if name not in _limiters:
+            _limiters[name] = TokenBucketLimiter(name=name, **LIMITER_SETTINGS[name])
+        return _limiters[name]
+
+
+def rate_limiter_stats() -> list:
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return [limiter.stats() for limiter in limiters]
+
+
+class _RateLimitedNamespace:
+    def __init__(self, namespace, limiter: TokenBucketLimiter, is_async: bool):
+        self._namespace = namespace
+        self._limiter = limiter
+        self._is_async = is_async
+
+    def __getattr__(self, item):
+        attribute = getattr(self._namespace, item)
+        if not callable(attribute):
+            return attribute
+        limiter = self._limiter
+
+        if self._is_async:
+            @functools.wraps(attribute)
+            async def async_call(*args, **kwargs):
+                async with limiter.aslot():
+                    return await attribute(*args, **kwargs)
+            return async_call
+
+        @functools.wraps(attribute)
+        def call(*args, **kwargs):
+            with limiter.slot():
+                return attribute(*args, **kwargs)
+        return call
+
+
+class RateLimitedClient:
+    """Wraps a LlamaCloud or AsyncLlamaCloud client so every resource call (client.files.x(...)) takes a limiter slot"""
+    def __init__(self, client, limiter: TokenBucketLimiter, is_async: bool = False):
+        self._client = client
+        self._limiter = limiter
+        self._is_async = is_async
+
+    def __getattr__(self, item):
+        return _RateLimitedNamespace(getattr(self._client, item), self._limiter, self._is_async)
+
+
+def _messages_text(messages) -> str:
+    return "\n".join(str(message.content or "") for message in messages)
+
+
+def _response_text(response) -> str:
+    message = getattr(response, "message", None)
+    return str(message.content or "") if message is not None else str(getattr(response, "text", "") or "")
+
+
+def record_token_usage(model: str, prompt_text: str, response):
+    """Uses the token counts OpenAI reported when present (non-streaming calls), else a tokenizer estimate"""
+    if response is None:
+        return
+    try:
+        counts = getattr(response, "additional_kwargs", None) or {}
+        prompt_tokens = counts.get("prompt_tokens") or len(get_tokenizer()(prompt_text))
+        completion_tokens = counts.get("completion_tokens") or len(get_tokenizer()(_response_text(response)))
+        registry = get_metrics_registry()
+        registry.observe("proof_llm_tokens", prompt_tokens, buckets=TOKEN_BUCKETS, model=model, kind="prompt")
+        registry.observe("proof_llm_tokens", completion_tokens, buckets=TOKEN_BUCKETS, model=model, kind="completion")
+    except Exception as e:
+        logger.warning(f"TOKEN_USAGE: Failed to record usage: {e}")
+
+
+class RateLimitedOpenAI(OpenAI):
+    """OpenAI LLM whose requests share the process-wide OpenAI limiter and report token usage"""
+
+    def chat(self, messages, **kwargs):
+        with get_rate_limiter("openai").slot():
+            response = super().chat(messages, **kwargs)
+        record_token_usage(self.model, _messages_text(messages), response)
+        return response
+
+    def complete(self, prompt, formatted=False, **kwargs):
+        with get_rate_limiter("openai").slot():
+            response = super().complete(prompt, formatted=formatted, **kwargs)
+        record_token_usage(self.model, prompt, response)
+        return response
+
+    def _limited_stream(self, start_stream, prompt_text: str):
+        # The concurrency slot is taken on first iteration and held until the stream is consumed or closed
+        limiter = get_rate_limiter("openai")
+        model = self.model
+
+        def generator():
+            last_chunk = None
+            limiter.acquire()
+            try:
+                for chunk in start_stream():
+                    last_chunk = chunk
+                    yield chunk
+                # Streamed chunks carry the accumulated text, so the last one holds the full completion
+                record_token_usage(model, prompt_text, last_chunk)
+            except Exception as e:
+                retry_after = retry_after_seconds(e)
+                if retry_after is not None:
+                    limiter.penalize(retry_after)
+                raise
+            finally:
+                limiter.release()
+        return generator()
+
+    def stream_chat(self, messages, **kwargs):
+        return self._limited_stream(lambda: super(RateLimitedOpenAI, self).stream_chat(messages, **kwargs),
+                                    _messages_text(messages))
+
+    def stream_complete(self, prompt, formatted=False, **kwargs):
+        return self._limited_stream(
+            lambda: super(RateLimitedOpenAI, self).stream_complete(prompt, formatted=formatted, **kwargs), prompt)
+
+    async def achat(self, messages, **kwargs):
+        async with get_rate_limiter("openai").aslot():
+            response = await super().achat(messages, **kwargs)
+        record_token_usage(self.model, _messages_text(messages), response)
+        return response
+
+    async def acomplete(self, prompt, formatted=False, **kwargs):
+        async with get_rate_limiter("openai").aslot():
+            response = await super().acomplete(prompt, formatted=formatted, **kwargs)
+        record_token_usage(self.model, prompt, response)
+        return response
@@ -0,0 +1,194 @@
+#Record/replay httpx transport for LlamaCloud traffic: capture a real session once, replay it offline and deterministically
+#Enable with PROOF_LLAMACLOUD_CASSETTE=path/to/session.jsonl and PROOF_LLAMACLOUD_CASSETTE_MODE=record|replay
+
+from collections import defaultdict
+from pathlib import Path
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode
+import base64
+import hashlib
+import json
+import logging
+import os
+import threading
+
+import httpx
+
+from errors import CassetteMissError
+
+logger = logging.getLogger(__name__)
+
+CASSETTE_MODES = ("record", "replay")
+# Credentials never reach a cassette
+REDACTED_HEADERS = {"authorization", "cookie", "set-cookie", "x-api-key"}
+# Bodies are stored decoded, so the transfer headers no longer apply
+DROPPED_RESPONSE_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection"}
+
+
+def _body_digest(request: httpx.Request) -> str:
+    body = request.content
+    try:
+        # Key order in JSON bodies is not significant
+        body = json.dumps(json.loads(body), sort_keys=True).encode("utf-8")
+    except (ValueError, UnicodeDecodeError):
+        pass
+    return hashlib.sha256(body).hexdigest()[:16] if body else "-"
+
+
+def request_key(request: httpx.Request) -> str:
+    """Method, path, sorted query and body digest; the host is left out so a cassette replays against any base URL"""
+    query = urlencode(sorted(parse_qsl(request.url.query.decode("utf-8"), keep_blank_values=True)))
+    return f"{request.method} {request.url.path}?{query} {_body_digest(request)}"
+
+
+class Cassette:
+    """Recorded interactions, one JSON object per line; identical requests are answered in recorded order"""
+    def __init__(self, path, mode: str):
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f"Cassette mode must be one of {CASSETTE_MODES}, got '{mode}'")
+        self.path = Path(path)
+        self.mode = mode
+        self._lock = threading.Lock()
+        self._interactions = defaultdict(list)
+        self._served = defaultdict(int)
+        self.recorded = 0
+        self.replayed = 0
+        self.misses = 0
+        if mode == "replay":
+            self._load()
+
+    def _load(self):
+        if not self.path.exists():
+            raise FileNotFoundError(f"No cassette at {self.path}; record one with PROOF_LLAMACLOUD_CASSETTE_MODE=record")
+        with open(self.path, "r") as f:
+            for line in f:
+                if line.strip():
+                    interaction = json.loads(line)
+                    self._interactions[interaction["key"]].append(interaction)
+        logger.info(f"CASSETTE: Loaded {sum(len(v) for v in self._interactions.values())} interactions from {self.path}")
+
+    def record(self, key: str, request: httpx.Request, response: httpx.Response):
+        content = response.content
+        try:
+            body, encoding = content.decode("utf-8"), "text"
+        except UnicodeDecodeError:
+            body, encoding = base64.b64encode(content).decode("ascii"), "base64"
+        interaction = {
+            "key": key,
+            "method": request.method,
+            "path": request.url.path,
+            "query": request.url.query.decode("utf-8"),
+            "status_code": response.status_code,
+            "headers": {name: value for name, value in response.headers.items()
+                        if name.lower() not in REDACTED_HEADERS | DROPPED_RESPONSE_HEADERS},
+            "body": body,
+            "encoding": encoding,
+        }
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a") as f:
+                f.write(json.dumps(interaction) + "\n")
+            self._interactions[key].append(interaction)
+            self.recorded += 1
+
+    def play(self, key: str, request: httpx.Request) -> httpx.Response:
+        with self._lock:
+            interactions = self._interactions.get(key)
+            if not interactions:
+                self.misses += 1
+                raise CassetteMissError(f"No recorded response for {key} in {self.path}")
+            # Repeats past the end of the recording get the last response again
+            interaction = interactions[min(self._served[key], len(interactions) - 1)]
+            self._served[key] += 1
+            self.replayed += 1
+        content = (base64.b64decode(interaction["body"]) if interaction["encoding"] == "base64"
+                   else interaction["body"].encode("utf-8"))
+        return httpx.Response(interaction["status_code"], headers=interaction["headers"], content=content,
+                              request=request)
+
+    @staticmethod
+    def copy_response(response: httpx.Response, request: httpx.Request) -> httpx.Response:
+        headers = {name: value for name, value in response.headers.items()
+                   if name.lower() not in DROPPED_RESPONSE_HEADERS}
+        return httpx.Response(response.status_code, headers=headers, content=response.content, request=request)
+
+    def stats(self) -> dict:
+        return {"path": str(self.path), "mode": self.mode, "recorded": self.recorded,
+                "replayed": self.replayed, "misses": self.misses}
+
+
+class RecordReplayTransport(httpx.BaseTransport):
+    def __init__(self, cassette: Cassette, transport: Optional[httpx.BaseTransport] = None):
+        self.cassette = cassette
+        self.transport = transport or httpx.HTTPTransport()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        request.read()
+        key = request_key(request)
+        if self.cassette.mode == "replay":
+            return self.cassette.play(key, request)
+        response = self.transport.handle_request(request)
+        try:
+            response.read()
+        finally:
+            response.close()
+        self.cassette.record(key, request, response)
+        return self.cassette.copy_response(response, request)
+
+    def close(self):
+        self.transport.close()
+
+
+class AsyncRecordReplayTransport(httpx.AsyncBaseTransport):
+    def __init__(self, cassette: Cassette, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.cassette = cassette
+        self.transport = transport or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        await request.aread()
+        key = request_key(request)
+        if self.cassette.mode == "replay":
+            return self.cassette.play(key, request)
+        response = await self.transport.handle_async_request(request)
+        try:
+            await response.aread()
+        finally:
+            await response.aclose()
+        self.cassette.record(key, request, response)
+        return self.cassette.copy_response(response, request)
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+_cassettes = {}
+_cassettes_lock = threading.Lock()
+
+
+def get_cassette(path=None, mode: Optional[str] = None) -> Optional[Cassette]:
+    """Process-wide cassette so every client in the process records to (or replays from) the same file"""
+    path = path or os.getenv("PROOF_LLAMACLOUD_CASSETTE")
+    if not path:
+        return None
+    mode = mode or os.getenv("PROOF_LLAMACLOUD_CASSETTE_MODE", "replay")
+    with _cassettes_lock:
+        key = (str(Path(path).resolve()), mode)
+        if key not in _cassettes:
+            _cassettes[key] = Cassette(path, mode)
+            logger.warning(f"CASSETTE: LlamaCloud traffic is in {mode} mode using {path}")
+        return _cassettes[key]
+
+
+def cassette_http_client(cassette: Optional[Cassette] = None, **kwargs) -> Optional[httpx.Client]:
+    """httpx.Client routed through the cassette, or None when no cassette is configured"""
+    cassette = cassette or get_cassette()
+    if cassette is None:
+        return None
+    return httpx.Client(transport=RecordReplayTransport(cassette), **kwargs)
+
+
+def cassette_async_http_client(cassette: Optional[Cassette] = None, **kwargs) -> Optional[httpx.AsyncClient]:
+    cassette = cassette or get_cassette()
+    if cassette is None:
+        return None
+    return httpx.AsyncClient(transport=AsyncRecordReplayTransport(cassette), **kwargs)
@@ -0,0 +1,188 @@
+from llama_index.core.schema import NodeWithScore
+from llama_index.core.storage.docstore.utils import json_to_doc
+from typing import Optional
+import logging
+import threading
+import time
+from errors import *
+from pipeline.rate_limit import current_priority
+from pipeline.budget import current_budget
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Index metadata is re-read at most this often so an index sync elsewhere reaches every replica
+INFO_TTL_SECONDS = 30
+
+
+def deserialize_nodes(payload):
+    if payload is None:
+        return None
+    return [NodeWithScore(node=json_to_doc(item["node"]), score=item["score"]) for item in payload]
+
+
+class RemoteRAGService:
+    """
+    Thin client for pipeline.service exposing the RAGService surface used by ui/
+    Caches, connection pools and retriever topology live in the shared service process
+    """
+    def __init__(self, service_url: str, timeout: float = 60):
+        self.service_url = service_url.rstrip("/")
+        self.http = httpx.Client(base_url=self.service_url, timeout=timeout)
+        self._info = None
+        self._info_fetched_at = 0.0
+        self._info_lock = threading.Lock()
+        # The file catalog can be large, so it is only re-read when the index version moves
+        self._files = None
+        self._files_lock = threading.Lock()
+        try:
+            self._get_info(force=True)
+        except Exception as e:
+            logging.error(f"Failed to reach RAG service at {self.service_url}: {e}")
+            raise LlamaCloudClientInitError(f"Failed to reach RAG service at {self.service_url}") from e
+
+    def _get_info(self, force=False):
+        with self._info_lock:
+            if force or time.monotonic() - self._info_fetched_at > INFO_TTL_SECONDS:
+                response = self.http.get("/info")
+                response.raise_for_status()
+                self._info = response.json()
+                self._info_fetched_at = time.monotonic()
+            return self._info
+
+    def _post(self, path: str, payload: dict, timeout=httpx.USE_CLIENT_DEFAULT):
+        response = self.http.post(path, json=payload, timeout=timeout)
+        try:
+            response.raise_for_status()
+        except httpx.HTTPStatusError as e:
+            # The service answers errors with {"error": ...}; a proxy or a crashed worker may send HTML or nothing
+            error = response.text
+            if response.headers.get("content-type", "").startswith("application/json"):
+                body = response.json()
+                error = body.get("error", error) if isinstance(body, dict) else error
+            raise LlamaOperationFailedError(f"RAG service {path} failed ({response.status_code}): {error}") from e
+        return response.json()
+
+    @staticmethod
+    def _retrieve_payload(query_text: str, store: Optional[str], images: bool = False) -> dict:
+        payload = {"query": query_text, "store": store, "images": images, "priority": int(current_priority())}
+        budget = current_budget()
+        if budget is not None:
+            payload["budget_seconds"] = budget.remaining()
+        return payload
+
+    @staticmethod
+    def _record_shed(result: dict):
+        # Work the service shed counts against this question's budget so the UI can flag it
+        budget = current_budget()
+        if budget is not None:
+            budget.shed.extend(stage for stage in result.get("shed", []) if stage not in budget.shed)
+        return result
+
+    @property
+    def organization_id(self):
+        return self._get_info()["organization_id"]
+
+    @property
+    def project_id(self):
+        return self._get_info()["project_id"]
+
+    @property
+    def indices(self):
+        return self._get_info()["indices"]
+
+    @property
+    def index_version(self):
+        return self._get_info()["index_version"]
+
+    @property
+    def answer_scope(self) -> tuple:
+        return tuple(self._get_info()["answer_scope"])
+
+    @property
+    def file_id_name_dict(self):
+        index_version = self.index_version
+        with self._files_lock:
+            if self._files is None or self._files["index_version"] != index_version:
+                response = self.http.get("/files")
+                response.raise_for_status()
+                self._files = response.json()
+            return self._files["file_id_name_dict"]
+
+    def composite_retrieval(self, query_text: str, store: Optional[str] = None):
+        if query_text is None:
+            raise MissingValueError("Query text is missing")
+        try:
+            result = self._record_shed(self._post("/retrieve", self._retrieve_payload(query_text, store)))
+            return deserialize_nodes(result["nodes"])
+        except Exception as e:
+            logging.warning(f"Composite retrieval failed: {e}")
+            return None
+
+    def multi_modal_composite_retrieval(self, query_text: str, store: Optional[str] = None):
+        if query_text is None:
+            raise MissingValueError("Query text is missing")
+        try:
+            result = self._record_shed(self._post("/retrieve", self._retrieve_payload(query_text, store, images=True)))
+            return deserialize_nodes(result["nodes"])
+        except Exception as e:
+            logging.warning(f"Multi modal composite retrieval failed: {e}")
+            return None
+
+    def operations_snapshot(self, window_seconds: Optional[float] = None) -> dict:
+        """The service's in-process stats; served from memory without touching LlamaCloud"""
+        params = {"window_seconds": window_seconds} if window_seconds else {}
+        response = self.http.get("/operations", params=params)
+        response.raise_for_status()
+        return response.json()
+
+    def summary_retrieval(self, query_text: str, top_k: int = 5):
+        if query_text is None:
+            raise MissingValueError("Query text is missing")
+        return deserialize_nodes(self._post("/summaries", {"query": query_text, "top_k": top_k})["nodes"])
+
+    def build_document_summaries(self, summarize_llm):
+        # The service summarizes with its own LLM
+        return self._post("/summaries/build", {}, timeout=None)
+
+    def get_file_content_url(self, file_id: str, expires_in_seconds: int = 3600):
+        """Get a presigned URL to download the file content"""
+        try:
+            return self._post("/file_url", {"file_id": file_id, "expires_in_seconds": expires_in_seconds,
+                                           "priority": int(current_priority())})["url"]
+        except Exception as e:
+            logger.error(f"GET_FILE_CONTENT_URL: Error using file_id {file_id} to get content url: {e}")
+
+    def list_file_screenshots(self, file_id: str):
+        response = self.http.get("/screenshots", params={"file_id": file_id})
+        response.raise_for_status()
+        return response.json()["screenshots"]
+
+    def get_file_screenshot(self, file_id: str, page_index: int):
+        response = self.http.get("/screenshot", params={"file_id": file_id, "page_index": page_index})
+        response.raise_for_status()
+        return response.content
+
+    def list_llama_files_dict(self):
+        response = self.http.get("/files_hierarchy")
+        response.raise_for_status()
+        return response.json()["files"]
+
+    def rename_pipeline(self, new_name: str, pipeline_id: str):
+        if new_name is None or pipeline_id is None:
+            raise MissingValueError("No name was submitted to rename_pipeline")
+        try:
+            name = self._post("/rename", {"new_name": new_name, "pipeline_id": pipeline_id})["name"]
+        except Exception as e:
+            raise APIError(f"Error with call to update pipeline name: {str(e)}")
+        self._get_info(force=True)
+        return name
+
+    def run_retriever_sync(self, summarize_llm=None):
+        # The service summarizes with its own LLM; the local one only signals that summaries are wanted
+        try:
+            # Syncing and summarizing can take minutes
+            self._post("/sync", {"summarize": summarize_llm is not None}, timeout=None)
+        except Exception as e:
+            raise RetrieverFailedError(f"Failed to sync composite retriever: {e}")
+        self._get_info(force=True)
@@ -0,0 +1,312 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional
+import asyncio
+import contextvars
+import logging
+import os
+import random
+import threading
+import time
+
+import httpx
+
+from errors import DeadlineExceededError, CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+HEDGING_ENABLED = os.getenv("PROOF_HEDGED_REQUESTS", "1") == "1"
+# Without latency samples, a caller budget under this share of the deadline is assumed too short for a healthy call
+BINDING_BUDGET_FRACTION = 0.5
+
+
+@dataclass(frozen=True)
+class OperationPolicy:
+    deadline_seconds: float
+    attempts: int = 3
+    base_backoff_seconds: float = 0.2
+    max_backoff_seconds: float = 2.0
+    hedge: bool = False
+    # Hedging waits for this many samples before trusting the p95
+    min_hedge_samples: int = 20
+
+
+# Only idempotent reads are retried or hedged
+OPERATION_POLICIES = {
+    "retrieve": OperationPolicy(deadline_seconds=float(os.getenv("PROOF_RETRIEVE_DEADLINE", "20")), hedge=True),
+    "file_url": OperationPolicy(deadline_seconds=5),
+    "screenshot": OperationPolicy(deadline_seconds=10),
+}
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies used to derive hedge delays"""
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        with self._lock:
+            if not self._samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+    def __len__(self):
+        return len(self._samples)
+
+
+class CircuitBreaker:
+    """
+    Opens after consecutive failures so callers fail fast to cached or local results
+    After reset_timeout one probe call is let through (half-open); success closes the circuit
+    """
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout_seconds: float = 30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_seconds = reset_timeout_seconds
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self.state = "closed"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout_seconds:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            if self.state != "closed":
+                logger.info(f"CIRCUIT_BREAKER[{self.name}]: Closed")
+            self.state = "closed"
+
+    def release_probe(self):
+        """An outcome that says nothing about backend health, e.g. a 404; a half-open circuit may probe again"""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self.state == "half_open" or self._failures >= self.failure_threshold:
+                if self.state != "open":
+                    logger.warning(f"CIRCUIT_BREAKER[{self.name}]: Opened after {self._failures} failures")
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"name": self.name, "state": self.state, "consecutive_failures": self._failures}
+
+
+def is_retryable(e: Exception) -> bool:
+    """Timeouts, connection errors, 429 and 5xx; anything else, client errors included, is the caller's problem"""
+    if isinstance(e, (TimeoutError, DeadlineExceededError, httpx.TransportError)):
+        return True
+    status_code = getattr(e, "status_code", None)
+    if status_code is None and getattr(e, "response", None) is not None:
+        status_code = getattr(e.response, "status_code", None)
+    return isinstance(status_code, int) and (status_code == 429 or status_code >= 500)
+
+
+def backoff_delay(policy: OperationPolicy, attempt: int) -> float:
+    """Full jitter: uniform between 0 and the capped exponential delay"""
+    return random.uniform(0, min(policy.max_backoff_seconds, policy.base_backoff_seconds * (2 ** attempt)))
+
+
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv("PROOF_RESILIENCE_WORKERS", "32")),
+                               thread_name_prefix="proof-backend")
+_trackers = {}
+_breakers = {}
+_registry_lock = threading.Lock()
+
+
+def get_latency_tracker(operation: str) -> LatencyTracker:
+    with _registry_lock:
+        return _trackers.setdefault(operation, LatencyTracker())
+
+
+def get_circuit_breaker(operation: str) -> CircuitBreaker:
+    with _registry_lock:
+        if operation not in _breakers:
+            _breakers[operation] = CircuitBreaker(name=operation)
+        return _breakers[operation]
+
+
+def _hedge_delay(policy: OperationPolicy, tracker: LatencyTracker) -> Optional[float]:
+    if not (policy.hedge and HEDGING_ENABLED) or len(tracker) < policy.min_hedge_samples:
+        return None
+    return tracker.percentile(95)
+
+
+def _submit(fn: Callable):
+    # Executor threads inherit the caller's context so the request priority follows the call
+    context = contextvars.copy_context()
+    return _executor.submit(context.run, fn)
+
+
+def _attempt(fn: Callable, deadline: float, hedge_delay: Optional[float]):
+    """One attempt, optionally hedged with a duplicate request after hedge_delay"""
+    futures = [_submit(fn)]
+    remaining = deadline - time.monotonic()
+    first_wait = remaining if hedge_delay is None else min(hedge_delay, remaining)
+    done, _ = wait(futures, timeout=max(first_wait, 0))
+
+    if not done and hedge_delay is not None and deadline - time.monotonic() > 0:
+        logger.info(f"HEDGE: Sending duplicate request after {hedge_delay:.2f}s")
+        futures.append(_submit(fn))
+
+    last_error = None
+    pending = set(futures)
+    while pending:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+            last_error = future.exception()
+    if last_error is not None and not pending:
+        raise last_error
+    raise DeadlineExceededError("Deadline exceeded")
+
+
+def _caller_budget_was_binding(error: Exception, budget: float, policy: OperationPolicy,
+                               tracker: LatencyTracker) -> bool:
+    """A timeout says nothing about backend health only if the caller allowed less than a healthy call takes"""
+    if not isinstance(error, DeadlineExceededError) or budget >= policy.deadline_seconds:
+        return False
+    healthy_p95 = tracker.percentile(95)
+    return budget < (healthy_p95 if healthy_p95 is not None else BINDING_BUDGET_FRACTION * policy.deadline_seconds)
+
+
+def call_with_policy(operation: str, fn: Callable, deadline_seconds: Optional[float] = None):
+    """
+    Runs an idempotent backend read with a deadline, jittered retries, optional hedging and a circuit breaker
+    Raises CircuitOpenError without calling the backend when the circuit is open
+    """
+    policy = OPERATION_POLICIES[operation]
+    breaker = get_circuit_breaker(operation)
+    tracker = get_latency_tracker(operation)
+    if not breaker.allow():
+        raise CircuitOpenError(f"{operation} circuit is open")
+
+    budget = policy.deadline_seconds if deadline_seconds is None else min(deadline_seconds, policy.deadline_seconds)
+    deadline = time.monotonic() + budget
+    last_error = None
+    for attempt in range(policy.attempts):
+        start = time.monotonic()
+        try:
+            result = _attempt(fn, deadline, _hedge_delay(policy, tracker))
+            tracker.record(time.monotonic() - start)
+            breaker.record_success()
+            return result
+        except Exception as e:
+            last_error = e
+            delay = backoff_delay(policy, attempt)
+            if not is_retryable(e) or time.monotonic() + delay >= deadline:
+                break
+            logger.warning(f"RETRY[{operation}]: Attempt {attempt + 1} failed ({type(e).__name__}), retrying in {delay:.2f}s")
+            time.sleep(delay)
+
+    # Only backend failures count toward the circuit; a 404 or 403 on one file must not open it for everyone
+    if is_retryable(last_error) and not _caller_budget_was_binding(last_error, budget, policy, tracker):
+        breaker.record_failure()
+    else:
+        breaker.release_probe()
+    raise last_error
+
+
+async def _aattempt(coro_fn: Callable[[], Awaitable], deadline: float, hedge_delay: Optional[float]):
+    tasks = [asyncio.ensure_future(coro_fn())]
+    try:
+        remaining = deadline - time.monotonic()
+        first_wait = remaining if hedge_delay is None else min(hedge_delay, remaining)
+        done, _ = await asyncio.wait(tasks, timeout=max(first_wait, 0))
+        if not done and hedge_delay is not None and deadline - time.monotonic() > 0:
+            tasks.append(asyncio.ensure_future(coro_fn()))
+
+        last_error = None
+        pending = set(tasks)
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                last_error = task.exception()
+        if last_error is not None and not pending:
+            raise last_error
+        raise DeadlineExceededError("Deadline exceeded")
+    finally:
+        # Unlike threads, losing async requests can be cancelled
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+async def acall_with_policy(operation: str, coro_fn: Callable[[], Awaitable], deadline_seconds: Optional[float] = None):
+    """Event-loop counterpart of call_with_policy"""
+    policy = OPERATION_POLICIES[operation]
+    breaker = get_circuit_breaker(operation)
+    tracker = get_latency_tracker(operation)
+    if not breaker.allow():
+        raise CircuitOpenError(f"{operation} circuit is open")
+
+    budget = policy.deadline_seconds if deadline_seconds is None else min(deadline_seconds, policy.deadline_seconds)
+    deadline = time.monotonic() + budget
+    last_error = None
+    for attempt in range(policy.attempts):
+        start = time.monotonic()
+        try:
+            result = await _aattempt(coro_fn, deadline, _hedge_delay(policy, tracker))
+            tracker.record(time.monotonic() - start)
+            breaker.record_success()
+            return result
+        except Exception as e:
+            last_error = e
+            delay = backoff_delay(policy, attempt)
+            if not is_retryable(e) or time.monotonic() + delay >= deadline:
+                break
+            await asyncio.sleep(delay)
+
+    # Only backend failures count toward the circuit; a 404 or 403 on one file must not open it for everyone
+    if is_retryable(last_error) and not _caller_budget_was_binding(last_error, budget, policy, tracker):
+        breaker.record_failure()
+    else:
+        breaker.release_probe()
+    raise last_error
+
+
+def resilience_stats() -> dict:
+    with _registry_lock:
+        operations = set(_trackers) | set(_breakers)
+    stats = {}
+    for operation in operations:
+        tracker = get_latency_tracker(operation)
+        stats[operation] = {
+            "circuit": get_circuit_breaker(operation).stats()["state"],
+            "p50_ms": 1000 * (tracker.percentile(50) or 0),
+            "p95_ms": 1000 * (tracker.percentile(95) or 0),
+            "p99_ms": 1000 * (tracker.percentile(99) or 0),
+        }
+    return stats
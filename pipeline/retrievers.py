@@ -0,0 +1,116 @@
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import QueryBundle, NodeWithScore
+from typing import Callable, List, Optional
+import logging
+import math
+import os
+import re
+
+from pipeline.semantic_cache import query_tokens
+from pipeline.summaries import is_overview_query
+from pipeline.tracing import set_attribute, span
+
+logger = logging.getLogger(__name__)
+
+CARRY_OVER_COVERAGE_THRESHOLD = float(os.getenv("PROOF_CARRY_OVER_COVERAGE", "0.6"))
+
+
+class ServiceRetriever(BaseRetriever):
+    """Routes chat engine retrieval through RAGService so it shares the service's caches"""
+    def __init__(self, rag_service, store_fn: Optional[Callable[[], Optional[str]]] = None):
+        super().__init__()
+        self._rag_service = rag_service
+        self._store_fn = store_fn
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        store = self._store_fn() if self._store_fn else None
+        return self._rag_service.composite_retrieval(query_bundle.query_str, store=store) or []
+
+
+class SummaryFirstRetriever(BaseRetriever):
+    """Answers overview-style questions from the precomputed summary index before falling back to chunks"""
+    def __init__(self, rag_service, base_retriever: BaseRetriever, top_k: int = 5):
+        super().__init__()
+        self._rag_service = rag_service
+        self._base_retriever = base_retriever
+        self._top_k = top_k
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        if is_overview_query(query_bundle.query_str):
+            try:
+                nodes = self._rag_service.summary_retrieval(query_bundle.query_str, top_k=self._top_k)
+                if nodes:
+                    set_attribute("summary_nodes", len(nodes))
+                    logger.info(f"SUMMARY_FIRST: Answering from {len(nodes)} summaries")
+                    return nodes
+            except Exception as e:
+                logger.warning(f"SUMMARY_FIRST: Summary retrieval failed, using chunks: {e}")
+        return self._base_retriever.retrieve(query_bundle)
+
+
+class CarryOverRetriever(BaseRetriever):
+    """
+    Keeps the previous turns' candidate pool for one conversation and reranks it locally for follow-ups
+    Escalates to the base retriever when the pool covers too few of the follow-up's query terms
+    """
+    def __init__(self,
+                 base_retriever: BaseRetriever,
+                 history_fn: Callable[[], list],
+                 top_k: int = 5,
+                 coverage_threshold: float = CARRY_OVER_COVERAGE_THRESHOLD,
+                 max_pool_size: int = 30):
+        super().__init__()
+        self._base_retriever = base_retriever
+        self._history_fn = history_fn
+        self._top_k = top_k
+        self._coverage_threshold = coverage_threshold
+        self._max_pool_size = max_pool_size
+        self._pool = []
+        self.local_hits = 0
+        self.escalations = 0
+
+    def reset(self):
+        self._pool = []
+
+    def _merge_into_pool(self, nodes: List[NodeWithScore]):
+        new_ids = {node.node.node_id for node in nodes}
+        self._pool = (list(nodes) + [node for node in self._pool if node.node.node_id not in new_ids])[:self._max_pool_size]
+
+    def _rerank_pool(self, query: str):
+        """Scores pool nodes by query term frequency; returns the top nodes and the share of terms they cover"""
+        terms = set(query_tokens(query))
+        if not terms or not self._pool:
+            return [], 0.0
+
+        scored = []
+        for node in self._pool:
+            node_terms = re.findall(r"[a-z0-9]+", node.node.get_content().lower())
+            counts = {term: node_terms.count(term) for term in terms}
+            score = sum(math.log1p(count) for count in counts.values()) / len(terms)
+            scored.append((score, node, {term for term, count in counts.items() if count}))
+
+        scored.sort(key=lambda item: item[0], reverse=True)
+        top = scored[:self._top_k]
+        covered = set().union(*(matched for _, _, matched in top))
+        nodes = [NodeWithScore(node=node.node, score=score) for score, node, _ in top if score > 0]
+        return nodes, len(covered) / len(terms)
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        if not self._history_fn():
+            # New or reset conversation
+            self._pool = []
+
+        with span("carry_over.rerank", pool_size=len(self._pool)) as rerank_span:
+            nodes, coverage = self._rerank_pool(query_bundle.query_str)
+            if rerank_span is not None:
+                rerank_span.set_attribute("coverage", round(coverage, 3))
+        if nodes and coverage >= self._coverage_threshold:
+            self.local_hits += 1
+            logger.info(f"CARRY_OVER: Reranked {len(self._pool)} pooled nodes locally (coverage {coverage:.2f})")
+            return nodes
+
+        self.escalations += 1
+        logger.info(f"CARRY_OVER: Escalating to full retrieval (coverage {coverage:.2f})")
+        nodes = self._base_retriever.retrieve(query_bundle)
+        self._merge_into_pool(nodes)
+        return nodes
@@ -0,0 +1,216 @@
+from collections import OrderedDict, deque
+from typing import Any, Dict, Hashable, Optional, Tuple
+import logging
+import math
+import os
+import random
+import re
+import threading
+import zlib
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_THRESHOLD = float(os.getenv("PROOF_SEMANTIC_CACHE_THRESHOLD", "0.8"))
+DEFAULT_MAX_ENTRIES = int(os.getenv("PROOF_SEMANTIC_CACHE_SIZE", "512"))
+DEFAULT_FALSE_HIT_SAMPLE_RATE = float(os.getenv("PROOF_SEMANTIC_CACHE_SAMPLE_RATE", "0.05"))
+
+VECTOR_DIMS = 1 << 20
+
+# Filler words directors add around the same question ("show me ... over time")
+STOPWORDS = {
+    "a", "an", "the", "me", "show", "of", "over", "in", "on", "for", "to", "and", "what", "are", "is",
+    "please", "give", "tell", "about", "can", "you", "i", "my", "our", "us", "with", "time", "some",
+    "any", "list", "all", "do", "does", "we", "there", "this", "that", "these", "those",
+}
+
+
+MONTHS = {
+    "january", "february", "march", "april", "may", "june", "july", "august", "september", "october",
+    "november", "december", "jan", "feb", "mar", "apr", "jun", "jul", "aug", "sep", "sept", "oct", "nov", "dec",
+}
+# "t" is what tokenizing leaves of "wasn't" and "weren't"
+NEGATIONS = {"not", "no", "never", "without", "nor", "t"}
+
+
+def query_tokens(text: str):
+    return [word for word in re.findall(r"[a-z0-9]+", text.lower()) if word not in STOPWORDS]
+
+
+def anchor_tokens(tokens) -> frozenset:
+    """
+    Tokens that change the answer however similar the rest of the question is
+    Numbers, months, negation and which committee ("risk committee" vs "investment committee")
+    """
+    anchors = set()
+    for i, token in enumerate(tokens):
+        if token.isdigit() or token in MONTHS:
+            anchors.add(token)
+        elif token in NEGATIONS:
+            anchors.add("not")
+        elif token == "committee" and i > 0:
+            anchors.add(f"committee:{tokens[i - 1]}")
+    return frozenset(anchors)
+
+
+def query_vector(text: str) -> Dict[int, float]:
+    """L2-normalized hashed vector of words, word bigrams and character trigrams"""
+    words = query_tokens(text)
+    vector = {}
+
+    def add(feature, weight):
+        bucket = zlib.crc32(feature.encode("utf-8")) % VECTOR_DIMS
+        vector[bucket] = vector.get(bucket, 0.0) + weight
+
+    for word in words:
+        add(f"w:{word}", 1.0)
+        padded = f"#{word}#"
+        for i in range(len(padded) - 2):
+            add(f"c:{padded[i:i + 3]}", 0.3)
+    for first, second in zip(words, words[1:]):
+        add(f"b:{first} {second}", 0.5)
+
+    norm = math.sqrt(sum(weight * weight for weight in vector.values())) or 1.0
+    return {bucket: weight / norm for bucket, weight in vector.items()}
+
+
+def cosine_similarity(a: Dict[int, float], b: Dict[int, float]) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(weight * b.get(bucket, 0.0) for bucket, weight in a.items())
+
+
+class SemanticCache:
+    """
+    LRU cache that reuses results for near-duplicate questions
+    Entries are scoped (e.g. by index version and selected store) and never match across scopes
+    Anchor tokens must match exactly so "budget for 2024" never serves "budget for 2025"
+    and "risks not escalated" never serves "risks escalated"
+    """
+    def __init__(self,
+                 name: str,
+                 threshold: float = DEFAULT_THRESHOLD,
+                 max_entries: int = DEFAULT_MAX_ENTRIES,
+                 false_hit_sample_rate: float = DEFAULT_FALSE_HIT_SAMPLE_RATE):
+        self.name = name
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.false_hit_sample_rate = false_hit_sample_rate
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.sampled_hits = 0
+        self.false_hits = 0
+        self.false_hit_samples = deque(maxlen=50)
+
+    @staticmethod
+    def _key(scope: Hashable, query: str):
+        return scope, " ".join(query_tokens(query))
+
+    def lookup(self, scope: Hashable, query: str, threshold: Optional[float] = None) -> Optional[Tuple[Any, str, float]]:
+        """Returns (value, cached_query, similarity) for the best entry above threshold"""
+        threshold = self.threshold if threshold is None else threshold
+        key = self._key(scope, query)
+        anchors = anchor_tokens(key[1].split())
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                entry = self._entries[key]
+                self.hits += 1
+                return entry["value"], entry["query"], 1.0
+
+            vector = query_vector(query)
+            best_key, best_similarity = None, 0.0
+            for entry_key, entry in self._entries.items():
+                if entry_key[0] != scope or entry["anchors"] != anchors:
+                    continue
+                similarity = cosine_similarity(vector, entry["vector"])
+                if similarity > best_similarity:
+                    best_key, best_similarity = entry_key, similarity
+
+            if best_key is None or best_similarity < threshold:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(best_key)
+            entry = self._entries[best_key]
+            self.hits += 1
+            return entry["value"], entry["query"], best_similarity
+
+    def put(self, scope: Hashable, query: str, value: Any):
+        key = self._key(scope, query)
+        with self._lock:
+            self._entries[key] = {
+                "query": query,
+                "value": value,
+                "vector": query_vector(query),
+                "anchors": anchor_tokens(key[1].split()),
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def should_sample(self, similarity: float) -> bool:
+        """Exact matches are never false hits so only fuzzy hits are sampled"""
+        return similarity < 1.0 and random.random() < self.false_hit_sample_rate
+
+    def record_sample(self, query: str, cached_query: str, similarity: float, is_false_hit: Optional[bool]):
+        """Records a sampled hit; is_false_hit is None when the hit could not be verified automatically"""
+        with self._lock:
+            self.sampled_hits += 1
+            if is_false_hit:
+                self.false_hits += 1
+            self.false_hit_samples.append({
+                "query": query,
+                "cached_query": cached_query,
+                "similarity": round(similarity, 3),
+                "false_hit": is_false_hit,
+            })
+        if is_false_hit:
+            logger.warning(f"SEMANTIC_CACHE[{self.name}]: False hit '{query}' -> '{cached_query}' ({similarity:.2f})")
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "name": self.name,
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "sampled_hits": self.sampled_hits,
+                "false_hits": self.false_hits,
+                "false_hit_rate": self.false_hits / self.sampled_hits if self.sampled_hits else 0.0,
+                "recent_samples": list(self.false_hit_samples),
+            }
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def semantic_cache_stats() -> list:
+    with _caches_lock:
+        caches = list(_caches.values())
+    return [cache.stats() for cache in caches]
+
+
+def get_semantic_cache(name: str) -> SemanticCache:
+    """Process-wide caches so every session benefits from every other session's questions"""
+    with _caches_lock:
+        if name not in _caches:
+            _caches[name] = SemanticCache(name=name)
+        return _caches[name]
+
+
+def node_overlap(a, b) -> float:
+    """Jaccard overlap of node ids between two retrieval results"""
+    ids_a = {node.node.node_id for node in a or []}
+    ids_b = {node.node.node_id for node in b or []}
+    if not ids_a and not ids_b:
+        return 1.0
+    return len(ids_a & ids_b) / len(ids_a | ids_b)
@@ -0,0 +1,229 @@
+#Standalone retrieval service so several Streamlit replicas share one warm RAGService
+#Run with: python -m pipeline.service --host 127.0.0.1 --port 8700
+
+from contextlib import asynccontextmanager, nullcontext
+from llama_index.core.storage.docstore.utils import doc_to_json
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+import argparse
+import asyncio
+import logging
+import os
+
+from pipeline.pipeline import RAGService
+from pipeline.async_pipeline import AsyncRAGService
+from pipeline.rate_limit import Priority, RateLimitedOpenAI, request_priority
+from pipeline.budget import question_budget
+from pipeline.tracing import get_metrics_registry
+from pipeline.operations import operations_snapshot
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_LLM_MODEL = os.getenv("PROOF_LLM_MODEL", "o4-mini-2025-04-16")
+
+
+def serialize_nodes(nodes_with_scores):
+    if nodes_with_scores is None:
+        return None
+    return [{"node": doc_to_json(node_with_score.node), "score": node_with_score.score}
+            for node_with_score in nodes_with_scores]
+
+
+def _error(e: Exception, status_code: int = 500):
+    logger.error(f"RAG_SERVICE: {type(e).__name__}: {e}")
+    return JSONResponse({"error": str(e), "type": type(e).__name__}, status_code=status_code)
+
+
+def _request_priority(body: dict) -> Priority:
+    """Clients forward their priority class so the shared limiter keeps interactive chat first"""
+    try:
+        return Priority(int(body.get("priority", Priority.INTERACTIVE)))
+    except ValueError:
+        return Priority.INTERACTIVE
+
+
+def _request_budget(body: dict):
+    """Continues the caller's question budget; requests without one are never degraded"""
+    if body.get("budget_seconds") is None:
+        return nullcontext()
+    return question_budget(total_seconds=float(body["budget_seconds"]))
+
+
+async def health(request: Request):
+    return JSONResponse({"status": "ok"})
+
+
+async def metrics(request: Request):
+    return Response(get_metrics_registry().render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+async def operations(request: Request):
+    window = request.query_params.get("window_seconds")
+    try:
+        window_seconds = float(window) if window else None
+    except ValueError as e:
+        return _error(e, status_code=400)
+    if window_seconds is not None and not window_seconds > 0:
+        return _error(ValueError(f"window_seconds must be positive, got {window}"), status_code=400)
+    return JSONResponse(operations_snapshot(window_seconds))
+
+
+async def info(request: Request):
+    rag = request.app.state.rag
+    return JSONResponse({
+        "organization_id": rag.organization_id,
+        "project_id": rag.project_id,
+        "indices": rag.indices,
+        "index_version": rag.index_version,
+        "answer_scope": list(rag.answer_scope),
+    })
+
+
+async def files(request: Request):
+    # Kept out of /info: clients poll that often and only need the catalog when index_version changes
+    rag = request.app.state.rag
+    return JSONResponse({"index_version": rag.index_version, "file_id_name_dict": rag.file_id_name_dict})
+
+
+async def retrieve(request: Request):
+    body = await request.json()
+    allama = request.app.state.allama
+    try:
+        with request_priority(_request_priority(body)), _request_budget(body) as budget:
+            if body.get("images", False):
+                nodes = await allama.multi_modal_composite_retrieval(body["query"], store=body.get("store"))
+            else:
+                nodes = await allama.composite_retrieval(body["query"], store=body.get("store"))
+        return JSONResponse({"nodes": serialize_nodes(nodes), "shed": budget.shed if budget is not None else []})
+    except Exception as e:
+        return _error(e)
+
+
+async def summaries(request: Request):
+    body = await request.json()
+    try:
+        nodes = request.app.state.allama.summary_retrieval(body["query"], top_k=body.get("top_k", 5))
+        return JSONResponse({"nodes": serialize_nodes(nodes)})
+    except Exception as e:
+        return _error(e)
+
+
+async def file_url(request: Request):
+    body = await request.json()
+    try:
+        with request_priority(_request_priority(body)):
+            url = await request.app.state.allama.get_file_content_url(
+                file_id=body["file_id"], expires_in_seconds=body.get("expires_in_seconds", 3600))
+        return JSONResponse({"url": url})
+    except Exception as e:
+        return _error(e)
+
+
+async def screenshots(request: Request):
+    try:
+        result = await request.app.state.allama.list_file_screenshots(request.query_params["file_id"])
+        return JSONResponse({"screenshots": [screenshot.dict() for screenshot in result]})
+    except Exception as e:
+        return _error(e)
+
+
+async def screenshot(request: Request):
+    try:
+        image_bytes = await request.app.state.allama.get_file_screenshot(
+            request.query_params["file_id"], int(request.query_params["page_index"]))
+        return Response(image_bytes, media_type="image/png")
+    except Exception as e:
+        return _error(e)
+
+
+async def files_hierarchy(request: Request):
+    result = await asyncio.to_thread(request.app.state.rag.list_llama_files_dict)
+    return JSONResponse({"files": result})
+
+
+async def rename(request: Request):
+    body = await request.json()
+    rag = request.app.state.rag
+    try:
+        new_name = await asyncio.to_thread(rag.rename_pipeline,
+                                           new_name=body.get("new_name"), pipeline_id=body.get("pipeline_id"))
+        rag._indices = await asyncio.to_thread(rag.list_llama_indices)
+        request.app.state.allama._indices = rag.indices
+        return JSONResponse({"name": new_name})
+    except Exception as e:
+        return _error(e, status_code=400)
+
+
+async def sync(request: Request):
+    body = await request.json()
+    rag = request.app.state.rag
+    summarize_llm = None
+    if body.get("summarize", False):
+        summarize_llm = RateLimitedOpenAI(model=SUMMARY_LLM_MODEL)
+    try:
+        with request_priority(Priority.BACKGROUND):
+            await asyncio.to_thread(rag.run_retriever_sync, summarize_llm=summarize_llm)
+        request.app.state.allama._index_version = rag.index_version
+        request.app.state.allama.file_id_name_dict = rag.file_id_name_dict
+        return JSONResponse({"index_version": rag.index_version})
+    except Exception as e:
+        return _error(e)
+
+
+async def build_summaries(request: Request):
+    rag = request.app.state.rag
+    try:
+        with request_priority(Priority.BACKGROUND):
+            stats = await asyncio.to_thread(rag.build_document_summaries, RateLimitedOpenAI(model=SUMMARY_LLM_MODEL))
+        return JSONResponse(stats)
+    except Exception as e:
+        return _error(e)
+
+
+def create_app(llama_cloud_api_key: str):
+
+    @asynccontextmanager
+    async def lifespan(app):
+        app.state.rag = await asyncio.to_thread(RAGService, llama_cloud_api_key=llama_cloud_api_key)
+        app.state.allama = AsyncRAGService.from_sync(app.state.rag)
+        logger.info("RAG_SERVICE: Backend initialized")
+        try:
+            yield
+        finally:
+            await app.state.allama.aclose()
+
+    routes = [
+        Route("/health", health),
+        Route("/info", info),
+        Route("/files", files),
+        Route("/metrics", metrics),
+        Route("/operations", operations),
+        Route("/retrieve", retrieve, methods=["POST"]),
+        Route("/summaries", summaries, methods=["POST"]),
+        Route("/summaries/build", build_summaries, methods=["POST"]),
+        Route("/file_url", file_url, methods=["POST"]),
+        Route("/screenshots", screenshots),
+        Route("/screenshot", screenshot),
+        Route("/files_hierarchy", files_hierarchy),
+        Route("/rename", rename, methods=["POST"]),
+        Route("/sync", sync, methods=["POST"]),
+    ]
+    return Starlette(routes=routes, lifespan=lifespan)
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Shared Proof retrieval service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8700)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    uvicorn.run(create_app(os.environ["LLAMA_CLOUD_API_KEY"]), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
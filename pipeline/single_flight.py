@@ -0,0 +1,114 @@
+from typing import Any, Awaitable, Callable, Hashable
+import asyncio
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(text.lower().split()) if isinstance(text, str) else text
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls across threads (Streamlit sessions) into one in-flight call
+    Followers block until the leader finishes and receive its result or exception
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            self.calls += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            logger.info(f"SINGLE_FLIGHT[{self.name}]: Joined in-flight call")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"name": self.name, "calls": self.calls, "coalesced": self.coalesced, "in_flight": len(self._calls)}
+
+
+class AsyncSingleFlight:
+    """Event-loop counterpart of SingleFlight for AsyncRAGService"""
+    def __init__(self, name: str):
+        self.name = name
+        self._futures = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        self.calls += 1
+        future = self._futures.get(key)
+        if future is not None:
+            self.coalesced += 1
+            # Shielded so one cancelled follower doesn't cancel the shared call
+            return await asyncio.shield(future)
+
+        future = asyncio.ensure_future(fn())
+        self._futures[key] = future
+        future.add_done_callback(lambda _: self._futures.pop(key, None))
+        return await asyncio.shield(future)
+
+    def stats(self) -> dict:
+        return {"name": self.name, "calls": self.calls, "coalesced": self.coalesced, "in_flight": len(self._futures)}
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def get_single_flight(name: str) -> SingleFlight:
+    """Process-wide so identical requests from different sessions coalesce"""
+    with _flights_lock:
+        if name not in _flights:
+            _flights[name] = SingleFlight(name=name)
+        return _flights[name]
+
+
+def single_flight_stats() -> list:
+    with _flights_lock:
+        flights = list(_flights.values())
+    return [flight.stats() for flight in flights + list(_async_flights.values())]
+
+
+_async_flights = {}
+
+
+def get_async_single_flight(name: str) -> AsyncSingleFlight:
+    if name not in _async_flights:
+        _async_flights[name] = AsyncSingleFlight(name=name)
+    return _async_flights[name]
@@ -0,0 +1,96 @@
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from typing import List, Optional
+import json
+import logging
+import os
+import threading
+import time
+
+from pipeline.tracing import Span, add_trace_listener
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_SECONDS = float(os.getenv("PROOF_SLOW_QUERY_MS", "8000")) / 1000
+SLOW_QUERY_LOG_PATH = Path(os.getenv("PROOF_SLOW_QUERY_LOG",
+                                     Path(os.getenv("PROOF_CACHE_DIR", ".proof_cache")) / "slow_queries.jsonl"))
+SLOW_QUERY_LOG_BYTES = int(os.getenv("PROOF_SLOW_QUERY_LOG_BYTES", str(5 * 1024 * 1024)))
+SLOW_QUERY_LOG_BACKUPS = 5
+
+# Root spans that represent something a director waited for
+SLOW_QUERY_TRACES = {"question", "references"}
+
+_slow_query_logger = None
+_slow_query_logger_lock = threading.Lock()
+
+
+def _get_slow_query_logger() -> logging.Logger:
+    """Dedicated logger writing one JSON record per line to a size-rotated file, kept out of the app log"""
+    global _slow_query_logger
+    with _slow_query_logger_lock:
+        if _slow_query_logger is None:
+            SLOW_QUERY_LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
+            handler = RotatingFileHandler(SLOW_QUERY_LOG_PATH, maxBytes=SLOW_QUERY_LOG_BYTES,
+                                          backupCount=SLOW_QUERY_LOG_BACKUPS)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            slow_query_logger = logging.getLogger("proof.slow_queries")
+            slow_query_logger.setLevel(logging.INFO)
+            slow_query_logger.propagate = False
+            slow_query_logger.addHandler(handler)
+            _slow_query_logger = slow_query_logger
+        return _slow_query_logger
+
+
+def slow_query_record(root: Span) -> dict:
+    stages_ms = {}
+    for child in root.children:
+        stages_ms[child["name"]] = round(stages_ms.get(child["name"], 0) + child["duration_ms"], 3)
+
+    condensed = [child["attributes"]["condensed_query"] for child in root.children
+                 if child["name"] == "condense" and "condensed_query" in child["attributes"]]
+    retrieval_keys = ("retriever", "store", "mode", "rerank_top_n", "index_count", "cache_hit",
+                      "degraded", "fallback", "node_count")
+    retrievals = [{**{key: child["attributes"].get(key) for key in retrieval_keys},
+                   "nodes": child.get("payload", {}).get("nodes")}
+                  for child in root.children if child["name"] == "retrieval"]
+
+    return {
+        "recorded_at": time.time(),
+        "trace_id": root.trace_id,
+        "kind": root.name,
+        "question_id": root.attributes.get("question_id"),
+        # Prompt and history ride on the span's payload so only slow queries ever write them to disk
+        "prompt": root.payload.get("prompt", root.attributes.get("prompt")),
+        "store": root.attributes.get("store"),
+        "history": root.payload.get("history", []),
+        "condensed_query": condensed[0] if condensed else None,
+        "duration_ms": round(1000 * root.duration, 3),
+        "stages_ms": stages_ms,
+        "retrievals": retrievals,
+        "attributes": {key: value for key, value in root.attributes.items()
+                       if key not in {"prompt", "history", "store", "question_id"}},
+        "error": root.error,
+    }
+
+
+def log_slow_query(root: Span):
+    if root.name not in SLOW_QUERY_TRACES or root.duration < SLOW_QUERY_SECONDS:
+        return
+    record = slow_query_record(root)
+    _get_slow_query_logger().info(json.dumps(record, default=str))
+    logger.warning(f"SLOW_QUERY: {root.name} took {record['duration_ms']:.0f} ms: '{record['prompt']}'")
+
+
+def read_slow_queries(path: Optional[Path] = None) -> List[dict]:
+    """Records from the log and its rotated backups, oldest first"""
+    path = Path(path) if path else SLOW_QUERY_LOG_PATH
+    files = [path.with_name(f"{path.name}.{index}") for index in range(SLOW_QUERY_LOG_BACKUPS, 0, -1)] + [path]
+    records = []
+    for file in files:
+        if file.exists():
+            with open(file, "r") as f:
+                records.extend(json.loads(line) for line in f if line.strip())
+    return records
+
+
+add_trace_listener(log_slow_query)
@@ -0,0 +1,237 @@
+from llama_index.core.schema import TextNode, NodeWithScore
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+
+from pipeline.semantic_cache import query_tokens
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_STORE_PATH = Path(os.getenv("PROOF_CACHE_DIR", ".proof_cache")) / "summaries.json"
+
+# Only the head of very long board books is summarized to keep sync cost bounded
+MAX_SUMMARY_INPUT_CHARS = 24000
+
+MONTHS = {
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6,
+    "jul": 7, "aug": 8, "sep": 9, "oct": 10, "nov": 11, "dec": 12,
+}
+
+# Order matters: the first keyword found in the file name wins
+COMMITTEE_KEYWORDS = [
+    ("risk", "Risk Oversight Committee"),
+    ("budget", "Budget Committee"),
+    ("benefits", "Benefits Committee"),
+    ("compensation", "Compensation Committee"),
+    ("policy", "Policy Committee"),
+    ("imc", "Investment Management Committee"),
+    ("investment", "Investment Management Committee"),
+    ("ace", "Audit, Compliance and Ethics Committee"),
+    ("audit", "Audit, Compliance and Ethics Committee"),
+]
+
+# Share of the question's topic words a summary must contain; below it the question falls back to chunk retrieval
+MIN_SUMMARY_OVERLAP = float(os.getenv("PROOF_MIN_SUMMARY_OVERLAP", "0.5"))
+# Words every board document matches, so they say nothing about which summary fits
+GENERIC_TERMS = {"board", "paper", "papers", "document", "documents", "doc", "docs", "file", "files",
+                 "meeting", "meetings", "committee", "committees", "pack", "book"}
+
+OVERVIEW_PATTERN = re.compile(
+    r"\b(summar\w*|overview|recap|highlights?|key themes|most recent|latest|what happened|main points)\b",
+    re.IGNORECASE
+)
+
+FILE_SUMMARY_PROMPT = (
+    "Summarize the following board document for a company director in at most 200 words. "
+    "Keep figures, decisions, risks and action items. Document: {name}\n\n{text}"
+)
+
+GROUP_SUMMARY_PROMPT = (
+    "Combine the following document summaries for the {title} into a single overview of at most 250 words. "
+    "Keep figures, decisions, risks and action items and name the source documents.\n\n{text}"
+)
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def is_overview_query(query: str) -> bool:
+    """Broad questions that summaries answer better than raw chunks"""
+    if not query:
+        return False
+    return OVERVIEW_PATTERN.search(query) is not None
+
+
+def meeting_key(file_name: str) -> Optional[str]:
+    """Derives a YYYY-MM meeting key from names like board-minutes-feb-2025 or Risk-Dashboard-Q2-2024"""
+    name = file_name.lower()
+    match = re.search(r"(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*[^a-z0-9]?(\d{4})", name)
+    if match:
+        return f"{match.group(2)}-{MONTHS[match.group(1)]:02d}"
+    match = re.search(r"q([1-4])[^a-z0-9]?(\d{4})", name)
+    if match:
+        return f"{match.group(2)}-{int(match.group(1)) * 3:02d}"
+    return None
+
+
+def committee_name(file_name: str) -> str:
+    tokens = set(re.split(r"[^a-z]+", file_name.lower()))
+    for keyword, committee in COMMITTEE_KEYWORDS:
+        if keyword in tokens:
+            return committee
+    return "Board"
+
+
+class DocumentSummaryStore:
+    """
+    Summary index of per-file, per-meeting and per-committee summaries persisted as JSON
+    Summaries are keyed by content hash so a sync only re-summarizes files whose text changed
+    """
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path) if path else SUMMARY_STORE_PATH
+        self._lock = threading.Lock()
+        self.data = {"files": {}, "meetings": {}, "committees": {}}
+        # Bumped by each build that changed a summary so results built on the old ones can be told apart
+        self.revision = 0
+        self._load()
+
+    def _load(self):
+        try:
+            if self.path.exists():
+                with open(self.path, "r") as f:
+                    loaded = json.load(f)
+                for level in self.data:
+                    self.data[level] = loaded.get(level, {})
+        except Exception as e:
+            logger.warning(f"SUMMARY_STORE: Failed to load {self.path}, starting empty: {e}")
+
+    def save(self):
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(".tmp")
+            with open(tmp_path, "w") as f:
+                json.dump(self.data, f)
+            os.replace(tmp_path, self.path)
+
+    def __len__(self):
+        return sum(len(level) for level in self.data.values())
+
+    def build(self, documents: Dict[str, dict], summarize: Callable[[str], str]) -> dict:
+        """
+        Incrementally rebuilds summaries
+
+        Args:
+            documents: file_id -> {'name', 'pipeline', 'text'}
+            summarize: callable taking a prompt and returning summary text
+        """
+        stats = {"files_summarized": 0, "files_unchanged": 0, "files_removed": 0, "groups_summarized": 0}
+        files = self.data["files"]
+
+        for file_id in [file_id for file_id in files if file_id not in documents]:
+            del files[file_id]
+            stats["files_removed"] += 1
+
+        for file_id, doc in documents.items():
+            doc_hash = content_hash(doc["text"])
+            existing = files.get(file_id)
+            if existing and existing.get("hash") == doc_hash:
+                stats["files_unchanged"] += 1
+                continue
+            try:
+                summary = summarize(FILE_SUMMARY_PROMPT.format(name=doc["name"],
+                                                               text=doc["text"][:MAX_SUMMARY_INPUT_CHARS]))
+            except Exception as e:
+                logger.error(f"SUMMARY_STORE: Failed to summarize {doc['name']}: {e}")
+                continue
+            files[file_id] = {
+                "name": doc["name"],
+                "pipeline": doc.get("pipeline"),
+                "hash": doc_hash,
+                "meeting": meeting_key(doc["name"]),
+                "committee": committee_name(doc["name"]),
+                "summary": summary,
+            }
+            stats["files_summarized"] += 1
+
+        stats["groups_summarized"] += self._build_groups("meetings", "meeting", summarize)
+        stats["groups_summarized"] += self._build_groups("committees", "committee", summarize)
+
+        if stats["files_summarized"] or stats["files_removed"] or stats["groups_summarized"]:
+            self.revision += 1
+        self.save()
+        logger.info(f"SUMMARY_STORE: Build finished {stats}")
+        return stats
+
+    def _build_groups(self, level: str, field: str, summarize: Callable[[str], str]) -> int:
+        groups = {}
+        for file_id, entry in self.data["files"].items():
+            key = entry.get(field)
+            if key:
+                groups.setdefault(key, []).append(file_id)
+
+        rebuilt = 0
+        current = self.data[level]
+        for key in [key for key in current if key not in groups]:
+            del current[key]
+
+        for key, file_ids in groups.items():
+            file_ids.sort()
+            group_hash = content_hash("".join(self.data["files"][file_id]["hash"] for file_id in file_ids))
+            if current.get(key, {}).get("hash") == group_hash:
+                continue
+            title = f"{key} meeting" if level == "meetings" else key
+            text = "\n\n".join(f"{self.data['files'][file_id]['name']}:\n{self.data['files'][file_id]['summary']}"
+                               for file_id in file_ids)
+            try:
+                summary = summarize(GROUP_SUMMARY_PROMPT.format(title=title, text=text))
+            except Exception as e:
+                logger.error(f"SUMMARY_STORE: Failed to summarize {level} {key}: {e}")
+                continue
+            current[key] = {"hash": group_hash, "files": file_ids, "summary": summary}
+            rebuilt += 1
+        return rebuilt
+
+    def retrieve(self, query: str, top_k: int = 5) -> List[NodeWithScore]:
+        """
+        Ranks summaries by overlap with the question's topic words, favouring recent meetings on ties
+        Returns nothing when no summary is about the topic, so the caller falls back to chunks
+        """
+        query_terms = set(query_tokens(OVERVIEW_PATTERN.sub(" ", query))) - GENERIC_TERMS
+        candidates = []
+
+        for file_id, entry in self.data["files"].items():
+            candidates.append(("file", entry["name"], entry["summary"], entry.get("meeting"),
+                               {"file_id": file_id, "file_name": entry["name"], "summary_level": "file",
+                                "committee": entry.get("committee"), "meeting": entry.get("meeting")}))
+        for key, entry in self.data["meetings"].items():
+            candidates.append(("meeting", f"{key} meeting", entry["summary"], key,
+                               {"summary_level": "meeting", "meeting": key}))
+        for key, entry in self.data["committees"].items():
+            candidates.append(("committee", key, entry["summary"], None,
+                               {"summary_level": "committee", "committee": key}))
+
+        scored = []
+        for level, title, summary, meeting, metadata in candidates:
+            if query_terms:
+                terms = set(re.findall(r"[a-z0-9]+", f"{title} {summary}".lower()))
+                overlap = len(query_terms & terms) / len(query_terms)
+                if overlap < MIN_SUMMARY_OVERLAP:
+                    continue
+            else:
+                # "Summarize the latest meeting" names no topic: every summary fits, most recent first
+                overlap = 1.0
+            scored.append((overlap, meeting or "", level, title, summary, metadata))
+
+        scored.sort(key=lambda item: (item[0], item[1]), reverse=True)
+
+        nodes = []
+        for overlap, _, level, title, summary, metadata in scored[:top_k]:
+            node = TextNode(text=f"Summary of {title}:\n{summary}", metadata=metadata)
+            nodes.append(NodeWithScore(node=node, score=overlap))
+        return nodes
@@ -0,0 +1,419 @@
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from typing import Callable, Dict, Optional
+import bisect
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+TRACING_ENABLED = os.getenv("PROOF_TRACING", "1") == "1"
+# Share of traces written to the log; metrics and slow-query capture see every trace
+TRACE_SAMPLE_RATE = float(os.getenv("PROOF_TRACE_SAMPLE_RATE", "0.1"))
+TRACE_LOG_PATH = Path(os.getenv("PROOF_TRACE_LOG", Path(os.getenv("PROOF_CACHE_DIR", ".proof_cache")) / "traces.jsonl"))
+TRACE_LOG_BYTES = int(os.getenv("PROOF_TRACE_LOG_BYTES", str(20 * 1024 * 1024)))
+TRACE_LOG_BACKUPS = 5
+
+# Seconds; spans from a local cache hit to a slow LLM completion
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+# Longest operations dashboard window
+WINDOW_RETENTION_SECONDS = 24 * 3600
+
+
+class Histogram:
+    """
+    Cumulative buckets for Prometheus plus per-minute aggregates for the dashboard's windows
+    Percentiles are interpolated within buckets, so every sample in a window counts however busy it was
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS, retention_seconds: float = WINDOW_RETENTION_SECONDS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._counts = [0] * (len(self.buckets) + 1)
+        # [minute, count, sum, bucket counts] per minute that saw a sample, oldest first
+        self._minutes = deque()
+        self._retention_minutes = int(retention_seconds // 60) + 1
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        minute = int(time.time() // 60)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            # A clock step backwards lands in the newest minute rather than reordering the deque
+            if not self._minutes or self._minutes[-1][0] < minute:
+                self._minutes.append([minute, 0, 0.0, [0] * (len(self.buckets) + 1)])
+                while minute - self._minutes[0][0] >= self._retention_minutes:
+                    self._minutes.popleft()
+            aggregate = self._minutes[-1]
+            aggregate[1] += 1
+            aggregate[2] += value
+            aggregate[3][index] += 1
+            self.count += 1
+            self.sum += value
+
+    def _window(self, since: Optional[float]):
+        """(count, sum, bucket counts) since a time, to minute resolution, or since start"""
+        with self._lock:
+            if since is None:
+                return self.count, self.sum, list(self._counts)
+            first_minute = int(since // 60)
+            count, total, counts = 0, 0.0, [0] * (len(self.buckets) + 1)
+            for minute, minute_count, minute_sum, minute_counts in reversed(self._minutes):
+                if minute < first_minute:
+                    break
+                count += minute_count
+                total += minute_sum
+                counts = [a + b for a, b in zip(counts, minute_counts)]
+        return count, total, counts
+
+    def percentile(self, p: float, since: Optional[float] = None) -> Optional[float]:
+        count, _, counts = self._window(since)
+        if not count:
+            return None
+        rank = p / 100 * count
+        seen = 0
+        for index, bucket_count in enumerate(counts):
+            if bucket_count and seen + bucket_count >= rank:
+                if index == len(self.buckets):
+                    # Past the last bound there is nothing to interpolate towards
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index else 0.0
+                return lower + (self.buckets[index] - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+    def window_sum(self, since: float) -> float:
+        return self._window(since)[1]
+
+    def window_count(self, since: float) -> int:
+        return self._window(since)[0]
+
+    def cumulative_counts(self):
+        with self._lock:
+            counts = list(self._counts)
+        total = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            total += count
+            yield bound, total
+
+
+class MetricsRegistry:
+    """In-process histograms, counters and gauges keyed by metric name and labels"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms: Dict[tuple, Histogram] = {}
+        self.counters: Dict[tuple, float] = {}
+        self.gauges: Dict[tuple, float] = {}
+        self._collectors: Dict[str, Callable[[], Dict[tuple, float]]] = {}
+
+    @staticmethod
+    def _key(name: str, labels: dict) -> tuple:
+        return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def observe(self, name: str, value: float, buckets=DEFAULT_BUCKETS, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(buckets=buckets)
+        histogram.observe(value)
+
+    def increment(self, name: str, amount: float = 1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def set_gauge(self, name: str, value: float, **labels):
+        with self._lock:
+            self.gauges[self._key(name, labels)] = value
+
+    def register_collector(self, name: str, collector: Callable[[], Dict[tuple, float]]):
+        """Collectors return {(metric_name, labels_dict_items): value} gauges computed at scrape time"""
+        with self._lock:
+            self._collectors[name] = collector
+
+    def collected_gauges(self) -> Dict[tuple, float]:
+        with self._lock:
+            gauges = dict(self.gauges)
+            collectors = list(self._collectors.items())
+        for name, collector in collectors:
+            try:
+                for (metric, labels), value in collector().items():
+                    gauges[self._key(metric, dict(labels))] = value
+            except Exception as e:
+                logger.warning(f"METRICS: Collector {name} failed: {e}")
+        return gauges
+
+    def histogram(self, name: str, **labels) -> Optional[Histogram]:
+        return self.histograms.get(self._key(name, labels))
+
+    def histograms_named(self, name: str) -> Dict[tuple, Histogram]:
+        """{labels: histogram} for every label set recorded under name"""
+        with self._lock:
+            return {labels: histogram for (metric, labels), histogram in self.histograms.items() if metric == name}
+
+    def render_prometheus(self) -> str:
+        def escape(value) -> str:
+            return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+        def label_text(labels, extra=()):
+            items = list(labels) + list(extra)
+            if not items:
+                return ""
+            return "{" + ",".join(f'{key}="{escape(value)}"' for key, value in items) + "}"
+
+        lines = []
+        typed = set()
+
+        def declare(name: str, metric_type: str):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} {metric_type}")
+
+        with self._lock:
+            histograms = list(self.histograms.items())
+            counters = list(self.counters.items())
+        for (name, labels), histogram in sorted(histograms, key=lambda item: item[0]):
+            declare(name, "histogram")
+            for bound, count in histogram.cumulative_counts():
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{name}_bucket{label_text(labels, [('le', le)])} {count}")
+            lines.append(f"{name}_sum{label_text(labels)} {histogram.sum}")
+            lines.append(f"{name}_count{label_text(labels)} {histogram.count}")
+        for (name, labels), value in sorted(counters):
+            # Some counters are already named with the suffix at the call site
+            name = name if name.endswith("_total") else f"{name}_total"
+            declare(name, "counter")
+            lines.append(f"{name}{label_text(labels)} {value}")
+        for (name, labels), value in sorted(self.collected_gauges().items()):
+            declare(name, "gauge")
+            lines.append(f"{name}{label_text(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+_registry = MetricsRegistry()
+
+
+def get_metrics_registry() -> MetricsRegistry:
+    """Process-wide so every session and background job reports into one store"""
+    return _registry
+
+
+class Span:
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], sampled: bool, attributes: dict,
+                 labels: Optional[dict] = None, parent: Optional["Span"] = None):
+        self.name = name
+        # The root collects its finished descendants so trace listeners see the whole question
+        self.root = parent.root if parent is not None else self
+        self.children = []
+        self.labels = labels
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.attributes = dict(attributes)
+        # Heavy or sensitive detail (prompts, chat history, document snippets) for trace listeners only, never exported
+        self.payload = {}
+        self.start = time.time()
+        self.duration = None
+        self.error = None
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def set_payload(self, key: str, value):
+        self.payload[key] = value
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": round(1000 * self.duration, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class _JsonLinesExporter:
+    """Writes finished spans to a size-rotated file from a background thread so request threads never block on disk"""
+    def __init__(self, path: Path, max_bytes: int = TRACE_LOG_BYTES, backups: int = TRACE_LOG_BACKUPS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._queue = queue.Queue(maxsize=10000)
+        self._thread = None
+        self._handler = None
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def export(self, span: Span):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+                self._thread.start()
+        try:
+            self._queue.put_nowait(span.to_dict())
+        except queue.Full:
+            self.dropped += 1
+
+    def _write(self, line: str):
+        if self._handler is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._handler = RotatingFileHandler(self.path, maxBytes=self.max_bytes, backupCount=self.backups)
+            self._handler.setFormatter(logging.Formatter("%(message)s"))
+        # Rotates before a write would pass max_bytes, so the log never grows past (backups + 1) files
+        self._handler.emit(logging.LogRecord("proof.traces", logging.INFO, str(self.path), 0, line, None, None))
+
+    def _run(self):
+        while True:
+            records = [self._queue.get()]
+            while not self._queue.empty() and len(records) < 500:
+                records.append(self._queue.get_nowait())
+            try:
+                for record in records:
+                    self._write(json.dumps(record, default=str))
+            except Exception as e:
+                logger.warning(f"TRACING: Failed to export {len(records)} spans: {e}")
+
+
+_exporter = _JsonLinesExporter(TRACE_LOG_PATH)
+_trace_listeners = []
+_current_span = contextvars.ContextVar("proof_current_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def add_trace_listener(listener: Callable[[Span], None]):
+    """Called with each finished root span; its descendants are in root.children"""
+    if listener not in _trace_listeners:
+        _trace_listeners.append(listener)
+
+
+def set_attribute(key: str, value):
+    """Annotates the innermost open span, if any"""
+    active = _current_span.get()
+    if active is not None:
+        active.set_attribute(key, value)
+
+
+def set_payload(key: str, value):
+    """Attaches detail to the innermost open span that trace listeners see but the trace log never stores"""
+    active = _current_span.get()
+    if active is not None:
+        active.set_payload(key, value)
+
+
+@contextmanager
+def span(name: str, labels: Optional[dict] = None, **attributes):
+    """
+    Times a stage into the proof_stage_seconds histogram and, for sampled traces, the JSON lines log
+    With labels the stage also gets its own histogram, e.g. retrieval latency per store
+    A span opened with no parent starts a new trace
+    """
+    if not TRACING_ENABLED:
+        yield None
+        return
+    parent = _current_span.get()
+    if parent is None:
+        new_span = Span(name, uuid.uuid4().hex, None, random.random() < TRACE_SAMPLE_RATE, attributes, labels)
+    else:
+        new_span = Span(name, parent.trace_id, parent.span_id, parent.sampled, attributes, labels, parent=parent)
+    token = _current_span.set(new_span)
+    start = time.perf_counter()
+    try:
+        yield new_span
+    except Exception as e:
+        new_span.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        new_span.duration = time.perf_counter() - start
+        _current_span.reset(token)
+        _finish(new_span)
+
+
+def record_span(name: str, duration: float, **attributes):
+    """Records a stage measured outside a with-block, e.g. time to the first streamed token"""
+    if not TRACING_ENABLED:
+        return
+    parent = _current_span.get()
+    new_span = Span(name, parent.trace_id if parent else uuid.uuid4().hex, parent.span_id if parent else None,
+                    parent.sampled if parent else random.random() < TRACE_SAMPLE_RATE, attributes, parent=parent)
+    new_span.start = time.time() - duration
+    new_span.duration = duration
+    _finish(new_span)
+
+
+def _finish(finished: Span):
+    _registry.observe("proof_stage_seconds", finished.duration, stage=finished.name)
+    if finished.labels:
+        _registry.observe(f"proof_{finished.name.replace('.', '_')}_seconds", finished.duration, **finished.labels)
+    if finished.error is not None:
+        _registry.increment("proof_stage_errors", stage=finished.name)
+    if finished.sampled:
+        _exporter.export(finished)
+    if finished.root is not finished:
+        finished.root.children.append({**finished.to_dict(), "payload": finished.payload})
+        return
+    for listener in _trace_listeners:
+        try:
+            listener(finished)
+        except Exception as e:
+            logger.warning(f"TRACING: Trace listener failed: {e}")
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = _registry.render_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes would otherwise flood the app log
+        pass
+
+
+_metrics_server = None
+_metrics_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: Optional[int] = None, host: str = "127.0.0.1"):
+    """Serves /metrics in Prometheus text format; a no-op without PROOF_METRICS_PORT or when already running"""
+    global _metrics_server
+    port = port or (int(os.environ["PROOF_METRICS_PORT"]) if os.getenv("PROOF_METRICS_PORT") else None)
+    if port is None:
+        return None
+    with _metrics_server_lock:
+        if _metrics_server is None:
+            try:
+                _metrics_server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            except OSError as e:
+                # Another process (e.g. a second Streamlit worker) already holds the port; don't retry every rerun
+                logger.warning(f"METRICS: Could not bind {host}:{port}: {e}")
+                _metrics_server = False
+                return None
+            threading.Thread(target=_metrics_server.serve_forever, name="metrics-server", daemon=True).start()
+            logger.info(f"METRICS: Serving /metrics on {host}:{port}")
+        return _metrics_server or None
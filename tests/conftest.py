@@ -0,0 +1,32 @@
+import pytest
+
+from pipeline import record_replay, resilience
+from tools.fake_llamacloud import FakeConfig, FakeLlamaCloudServer
+
+
+@pytest.fixture(scope="session")
+def fake_server():
+    """One in-process fake for the session; parsing the sample PDFs takes a few seconds"""
+    with FakeLlamaCloudServer(config=FakeConfig()) as server:
+        yield server
+
+
+@pytest.fixture
+def fake_llamacloud(fake_server):
+    """The shared fake with its config, retrievers and request counts reset for each test"""
+    fake_server.state.config = FakeConfig()
+    fake_server.state.reset()
+    yield fake_server
+    fake_server.state.config = FakeConfig()
+
+
+@pytest.fixture
+def fresh_resilience(monkeypatch):
+    """Breakers and latency windows are process-wide; each test starts with closed circuits and no samples"""
+    monkeypatch.setattr(resilience, "_breakers", {})
+    monkeypatch.setattr(resilience, "_trackers", {})
+
+
+@pytest.fixture
+def fresh_cassettes(monkeypatch):
+    monkeypatch.setattr(record_replay, "_cassettes", {})
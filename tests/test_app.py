@@ -0,0 +1,57 @@
+from pathlib import Path
+
+import pytest
+
+from tools.signed_in_app import clear_unselected_button_groups, signed_in_app_test
+
+APP_PATH = Path(__file__).resolve().parent.parent / "app.py"
+
+
+@pytest.fixture
+def app(fake_llamacloud, monkeypatch):
+    """app.py signed in as one director, against the fake LlamaCloud server and the mock LLM"""
+    monkeypatch.setenv("LLAMA_CLOUD_BASE_URL", fake_llamacloud.base_url)
+    monkeypatch.setenv("PROOF_FAKE_LLM", "1")
+    monkeypatch.delenv("PROOF_RAG_SERVICE_URL", raising=False)
+    app = signed_in_app_test(str(APP_PATH), "director@example.com", default_timeout=60)
+    app.secrets["LLAMA_CLOUD_API_KEY"] = "fake-llamacloud-key"
+    app.secrets["OPENAI_API_KEY"] = "fake-openai-key"
+    return app
+
+
+def test_first_load_initializes_once_and_settles(app):
+    app.run()
+
+    assert not app.exception
+    assert app.session_state["refresh_state"] is False
+    assert "llama" in app.session_state
+    assert app.chat_input
+
+
+def test_rerun_after_idle_eviction_rebuilds_the_service(app):
+    app.run()
+    first_service = app.session_state["llama"]
+
+    # What session_idle_check leaves behind for an idle session
+    del app.session_state["llama"]
+    app.session_state["refresh_state"] = True
+    clear_unselected_button_groups(app)
+    app.run()
+
+    assert not app.exception
+    assert app.session_state["refresh_state"] is False
+    assert app.session_state["llama"] is not first_service
+
+
+
+def test_session_metrics_see_the_chat_memory(app, caplog):
+    app.run()
+    clear_unselected_button_groups(app)
+    question = "What was approved in the most recent budget?"
+    app.chat_input[0].set_value(question).run()
+
+    assert not app.exception
+    # The director's earlier conversation may have been resumed from the chat store ahead of it
+    user_message, answer = app.session_state["chat_engine"].memory.get_all()[-2:]
+    assert user_message.content == question and answer.role.value == "assistant"
+    assert "Failed to record session metrics" not in caplog.text
@@ -0,0 +1,46 @@
+from utils.chat_store import ChatStore, message_seq, new_conversation_id
+
+
+def _message(role, content):
+    return {"role": role, "content": content, "seq": message_seq()}
+
+
+def test_pages_walk_back_through_a_conversation(tmp_path):
+    store = ChatStore(tmp_path / "chat.sqlite3")
+    conversation = new_conversation_id()
+    for index in range(5):
+        store.append("director@example.com", conversation, _message("user", f"question {index}"), title="question 0")
+        store.append("director@example.com", conversation, _message("assistant", f"answer {index}"))
+    assert store.flush()
+
+    latest, has_more = store.load_page("director@example.com", conversation, limit=4)
+    assert [message["content"] for message in latest] == ["question 3", "answer 3", "question 4", "answer 4"]
+    assert has_more
+
+    earlier, has_more = store.load_page("director@example.com", conversation, before_seq=latest[0]["seq"], limit=10)
+    assert len(earlier) == 6 and earlier[0]["content"] == "question 0"
+    assert not has_more
+    assert store.stats()["written"] == 10
+
+
+def test_conversations_are_private_to_their_user(tmp_path):
+    store = ChatStore(tmp_path / "chat.sqlite3")
+    conversation = new_conversation_id()
+    store.append("director@example.com", conversation, _message("user", "question"), title="question")
+    assert store.flush()
+
+    assert store.latest_conversation("director@example.com") == conversation
+    assert store.conversations("director@example.com")[0]["title"] == "question"
+    assert store.latest_conversation("other@example.com") is None
+    assert store.load_page("other@example.com", conversation) == ([], False)
+
+
+def test_reopened_store_keeps_history(tmp_path):
+    path = tmp_path / "chat.sqlite3"
+    store = ChatStore(path)
+    conversation = new_conversation_id()
+    store.append("director@example.com", conversation, _message("user", "question"))
+    assert store.flush()
+
+    messages, _ = ChatStore(path).load_page("director@example.com", conversation)
+    assert [message["content"] for message in messages] == ["question"]
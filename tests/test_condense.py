@@ -0,0 +1,25 @@
+from pipeline.condense import fast_path_reason
+
+COMMON_QUERIES = ("Summarize the latest board meeting",)
+
+
+def test_first_turn_and_common_queries_skip_the_llm():
+    assert fast_path_reason(False, "And for 2023?") == "first_turn"
+    assert fast_path_reason(True, "  summarize the LATEST board meeting ", COMMON_QUERIES) == "common_query"
+
+
+def test_follow_ups_go_to_the_llm_when_the_heuristic_is_off():
+    assert fast_path_reason(True, "What was the pension fund return in 2024?", heuristic=False) is None
+
+
+def test_heuristic_keeps_follow_ups_that_lean_on_earlier_turns():
+    for question in ("And for 2023?", "What did they decide about it?", "Break down the costs by department",
+                     "What about the budget committee?", "Tell me more"):
+        assert fast_path_reason(True, question, heuristic=True) is None, question
+
+
+def test_heuristic_lets_self_contained_questions_through():
+    for question in ("What was the pension fund return in 2024?",
+                     "How did the board vote on the 2025 budget?",
+                     "Summarize the Q2 2024 investment committee report"):
+        assert fast_path_reason(True, question, heuristic=True) == "self_contained", question
@@ -0,0 +1,48 @@
+from llama_index.core.schema import NodeWithScore, QueryBundle, TextNode
+
+from pipeline.context_packer import ELISION, TokenBudgetPacker, count_tokens
+
+FILLER = " ".join(f"Item {index} on the agenda was noted without discussion." for index in range(40))
+
+
+def _node(text, score):
+    return NodeWithScore(node=TextNode(text=text), score=score)
+
+
+def _pack(nodes, query, budget=3000):
+    return TokenBudgetPacker(token_budget=budget).postprocess_nodes(nodes, query_bundle=QueryBundle(query))
+
+
+def test_duplicate_chunks_and_repeated_sentences_are_packed_once():
+    budget = "The board approved the 2025 budget of 4.2 million."
+    packed = _pack([
+        _node(budget, 0.9),
+        _node(budget.upper(), 0.8),
+        _node(f"{budget} The pension committee reviewed returns.", 0.7),
+    ], "What budget did the board approve?")
+
+    assert [node.node.get_content() for node in packed] == [budget, "The pension committee reviewed returns."]
+
+
+def test_long_chunks_keep_the_sentences_around_query_terms():
+    text = f"{FILLER} The pension fund returned 7.1% in 2024. {FILLER}"
+    packed = _pack([_node(text, 0.9)], "What did the pension fund return?")
+
+    content = packed[0].node.get_content()
+    assert "The pension fund returned 7.1% in 2024." in content
+    assert content.startswith(ELISION.strip()) and content.endswith(ELISION.strip())
+    assert count_tokens(content) < count_tokens(text) / 5
+
+
+def test_highest_scores_fill_the_budget_first():
+    low = _node("Risk appetite was unchanged. " * 10, 0.2)
+    high = _node("Risk appetite was raised for private credit. " * 10, 0.9)
+    packed = _pack([low, high], "What changed in risk appetite?", budget=100)
+
+    assert packed[0].score == 0.9
+    assert sum(count_tokens(node.node.get_content()) for node in packed) <= 100
+
+
+def test_zero_budget_passes_nodes_through():
+    nodes = [_node(FILLER, 0.5)]
+    assert _pack(nodes, "anything", budget=0) == nodes
@@ -0,0 +1,83 @@
+import threading
+import time
+from types import SimpleNamespace
+
+from llama_index.core.llms import ChatMessage, MessageRole
+
+from pipeline.memory import SUMMARY_HEADER, RollingSummaryMemory
+
+
+class FakeSummarizer:
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.prompts = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def complete(self, prompt):
+        self.release.wait(5)
+        self.prompts.append(prompt)
+        if self.fail:
+            raise RuntimeError("summarizer down")
+        return SimpleNamespace(text=f"summary {len(self.prompts)}")
+
+
+def _turns(memory, count, start=0):
+    for index in range(start, start + count):
+        memory.put(ChatMessage(role=MessageRole.USER, content=f"question {index}"))
+        memory.put(ChatMessage(role=MessageRole.ASSISTANT, content=f"answer {index}"))
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_older_turns_fold_into_a_summary_ahead_of_the_recent_ones():
+    memory = RollingSummaryMemory(summarizer_llm=FakeSummarizer(), recent_turns=2)
+    _turns(memory, 5)
+    _wait_for(lambda: memory.summary)
+
+    history = memory.get()
+    assert history[0].role == MessageRole.SYSTEM
+    assert history[0].content.startswith(SUMMARY_HEADER)
+    assert [message.content for message in history[1:]] == ["question 3", "answer 3", "question 4", "answer 4"]
+    # The full transcript is still stored for the chat panel and the chat store
+    assert len(memory.get_all()) == 10
+
+
+def test_failed_summaries_keep_turns_verbatim():
+    memory = RollingSummaryMemory(summarizer_llm=FakeSummarizer(fail=True), recent_turns=1)
+    _turns(memory, 3)
+    _wait_for(lambda: not memory._folding)
+
+    assert memory.summary == ""
+    assert [message.content for message in memory.get()][0] == "question 0"
+
+
+def test_set_with_get_output_keeps_the_summary():
+    memory = RollingSummaryMemory(summarizer_llm=FakeSummarizer(), recent_turns=1)
+    _turns(memory, 3)
+    _wait_for(lambda: memory.summary)
+    summary = memory.summary
+
+    memory.set(memory.get())
+
+    assert memory.summary == summary
+    assert [message.content for message in memory.get_all()] == ["question 2", "answer 2"]
+
+
+def test_a_fold_of_replaced_history_is_discarded():
+    summarizer = FakeSummarizer()
+    summarizer.release.clear()
+    memory = RollingSummaryMemory(summarizer_llm=summarizer, recent_turns=1)
+    _turns(memory, 3)
+
+    memory.reset()
+    summarizer.release.set()
+    _wait_for(lambda: not memory._folding)
+
+    assert memory.summary == ""
+    assert memory.get() == []
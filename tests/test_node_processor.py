@@ -0,0 +1,30 @@
+import httpx
+
+from pipeline.pipeline import RAGService
+from pipeline.semantic_cache import get_semantic_cache
+from pipeline.summaries import DocumentSummaryStore
+from utils.node_processor import process_nodes
+
+
+def test_summary_fallback_references_skip_file_less_summaries(fake_llamacloud, fresh_resilience, tmp_path):
+    with httpx.Client(timeout=60) as client:
+        service = RAGService("test-key", base_url=fake_llamacloud.base_url, httpx_client=client)
+        file_name, file_id = next(iter(service.file_id_name_dict.items()))
+        service.summary_store = DocumentSummaryStore(tmp_path / "summaries.json")
+        service.summary_store.data = {
+            "files": {file_id: {"name": file_name, "summary": "Revenue grew and the budget was approved",
+                                "meeting": "2025-02", "committee": "Board"}},
+            "meetings": {"2025-02": {"summary": "Revenue grew and the budget was approved", "files": [file_id]}},
+            "committees": {"Board": {"summary": "Revenue grew and the budget was approved", "files": [file_id]}},
+        }
+        get_semantic_cache("retrieval").clear()
+        fake_llamacloud.state.config.update({"error_rate": 1.0, "error_status": 400,
+                                             "error_paths": r"/retrievers/.*retrieve"})
+
+        # multi_modal_composite_retrieval takes this path whenever the image budget is spent
+        nodes = service.composite_retrieval("Summarize the revenue and budget")
+        assert {node.node.metadata["summary_level"] for node in nodes} == {"file", "meeting", "committee"}
+
+        references = process_nodes(nodes, service)
+
+    assert [reference["metadata"]["file_id"] for reference in references] == [file_id]
@@ -0,0 +1,127 @@
+import asyncio
+import threading
+import time
+
+import httpx
+import pytest
+
+from pipeline.rate_limit import Priority, TokenBucketLimiter
+
+
+def _limiter(max_concurrency: int, rate_per_second: float = 1000, burst: int = 1000) -> TokenBucketLimiter:
+    return TokenBucketLimiter(name="test", rate_per_second=rate_per_second, burst=burst,
+                              max_concurrency=max_concurrency)
+
+
+def _wait_for(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Condition not met in time")
+        time.sleep(0.005)
+
+
+def test_concurrency_budget_holds_under_load(fake_llamacloud):
+    fake_llamacloud.state.config.route_latency_ms = {"projects": 50}
+    limiter = _limiter(max_concurrency=2)
+    lock = threading.Lock()
+    active, peak, statuses = [0], [0], []
+
+    def call():
+        with limiter.slot():
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            response = httpx.get(f"{fake_llamacloud.base_url}/api/v1/projects")
+            with lock:
+                active[0] -= 1
+                statuses.append(response.status_code)
+
+    threads = [threading.Thread(target=call) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert statuses == [200] * 8
+    assert peak[0] == 2
+    assert limiter.stats()["in_flight"] == 0
+    assert fake_llamacloud.state.stats()["requests"]["projects"] == 8
+
+
+def test_interactive_waiters_are_served_before_background():
+    limiter = _limiter(max_concurrency=1)
+    limiter.acquire()
+    order = []
+
+    def waiter(priority: Priority):
+        limiter.acquire(priority)
+        order.append(priority)
+        limiter.release()
+
+    background = threading.Thread(target=waiter, args=(Priority.BACKGROUND,))
+    background.start()
+    _wait_for(lambda: limiter.stats()["queue_depth"] == 1)
+    interactive = threading.Thread(target=waiter, args=(Priority.INTERACTIVE,))
+    interactive.start()
+    _wait_for(lambda: limiter.stats()["queue_depth"] == 2)
+
+    limiter.release()
+    background.join()
+    interactive.join()
+    assert order == [Priority.INTERACTIVE, Priority.BACKGROUND]
+
+
+def test_429_pauses_every_caller(fake_llamacloud):
+    fake_llamacloud.state.config.update({"error_rate": 1.0, "error_status": 429})
+    limiter = _limiter(max_concurrency=4, rate_per_second=1000, burst=10)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        with limiter.slot():
+            httpx.get(f"{fake_llamacloud.base_url}/api/v1/projects").raise_for_status()
+
+    assert limiter.stats()["throttled"] == 1
+    # Without a retry-after header the pause is one second
+    start = time.monotonic()
+    with limiter.slot():
+        pass
+    assert time.monotonic() - start >= 0.9
+
+
+def test_cancelled_async_waiter_leaves_no_queue_entry_or_slot():
+    limiter = _limiter(max_concurrency=1)
+
+    async def scenario():
+        limiter.acquire()
+        waiter = asyncio.ensure_future(limiter.aacquire())
+        while limiter.stats()["queue_depth"] == 0:
+            await asyncio.sleep(0.005)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        limiter.release()
+        # The worker thread notices the cancellation on its next wake-up
+        for _ in range(200):
+            if limiter.stats()["queue_depth"] == 0 and limiter.stats()["in_flight"] == 0:
+                break
+            await asyncio.sleep(0.01)
+
+    asyncio.run(scenario())
+    assert limiter.stats()["queue_depth"] == 0
+    assert limiter.stats()["in_flight"] == 0
+
+
+def test_async_slot_against_fake(fake_llamacloud):
+    limiter = _limiter(max_concurrency=3)
+    fake_llamacloud.state.config.route_latency_ms = {"projects": 30}
+
+    async def scenario():
+        async with httpx.AsyncClient(base_url=fake_llamacloud.base_url) as client:
+            async def call():
+                async with limiter.aslot():
+                    assert limiter.stats()["in_flight"] <= 3
+                    return (await client.get("/api/v1/projects")).status_code
+            return await asyncio.gather(*(call() for _ in range(10)))
+
+    assert asyncio.run(scenario()) == [200] * 10
+    assert limiter.stats()["in_flight"] == 0
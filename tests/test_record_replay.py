@@ -0,0 +1,118 @@
+import asyncio
+
+import httpx
+import pytest
+
+from errors import CassetteMissError
+from pipeline.async_pipeline import AsyncRAGService
+from pipeline.pipeline import RAGService
+from pipeline.record_replay import Cassette, cassette_http_client
+from pipeline.semantic_cache import get_semantic_cache
+from tools.fake_llamacloud import FakeConfig, FakeLlamaCloudServer
+
+# Nothing listens here, so a replayed request that escapes the cassette fails
+UNREACHABLE_URL = "http://127.0.0.1:9"
+HEADERS = {"Authorization": "Bearer secret-test-key"}
+
+
+def test_replay_serves_recorded_responses_offline(fake_llamacloud, tmp_path):
+    path = tmp_path / "session.jsonl"
+    with cassette_http_client(Cassette(path, "record"), base_url=fake_llamacloud.base_url, headers=HEADERS) as client:
+        projects = client.get("/api/v1/projects").json()
+        file_id = client.get("/api/v1/files").json()[0]["id"]
+        screenshot = client.get(f"/api/v1/files/{file_id}/page_screenshots/0").content
+
+    assert "secret-test-key" not in path.read_text()
+
+    cassette = Cassette(path, "replay")
+    with cassette_http_client(cassette, base_url=UNREACHABLE_URL, headers=HEADERS) as client:
+        assert client.get("/api/v1/projects").json() == projects
+        assert client.get("/api/v1/files").json()[0]["id"] == file_id
+        # Binary bodies survive the round trip
+        assert client.get(f"/api/v1/files/{file_id}/page_screenshots/0").content == screenshot
+    assert cassette.stats()["replayed"] == 3
+    assert cassette.stats()["misses"] == 0
+
+
+def test_repeated_requests_replay_in_recorded_order(fake_llamacloud, tmp_path):
+    path = tmp_path / "session.jsonl"
+    with cassette_http_client(Cassette(path, "record"), base_url=fake_llamacloud.base_url) as client:
+        client.get("/api/v1/projects")
+        first = client.get("/_fake/stats").json()
+        client.get("/api/v1/projects")
+        second = client.get("/_fake/stats").json()
+    assert first != second
+
+    with cassette_http_client(Cassette(path, "replay"), base_url=UNREACHABLE_URL) as client:
+        assert client.get("/_fake/stats").json() == first
+        assert client.get("/_fake/stats").json() == second
+        # Past the end of the recording the last response repeats
+        assert client.get("/_fake/stats").json() == second
+
+
+def test_unrecorded_request_is_a_miss(fake_llamacloud, tmp_path):
+    path = tmp_path / "session.jsonl"
+    with cassette_http_client(Cassette(path, "record"), base_url=fake_llamacloud.base_url) as client:
+        client.get("/api/v1/projects")
+
+    cassette = Cassette(path, "replay")
+    with cassette_http_client(cassette, base_url=UNREACHABLE_URL) as client:
+        with pytest.raises(CassetteMissError):
+            client.get("/api/v1/projects", params={"project_name": "other"})
+    assert cassette.stats()["misses"] == 1
+
+
+def test_replay_without_a_recording_fails_fast(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        Cassette(tmp_path / "missing.jsonl", "replay")
+
+
+def test_async_service_records_and_replays_every_call(tmp_path, monkeypatch, fresh_cassettes, fresh_resilience):
+    path = tmp_path / "session.jsonl"
+    question = "What was approved at the last board meeting?"
+
+    async def session(base_url: str):
+        # The semantic cache is process-wide; a hit would skip the recorded retrieval
+        get_semantic_cache("retrieval").clear()
+        service = await AsyncRAGService.create("test-key", base_url=base_url)
+        try:
+            nodes = await service.composite_retrieval(question)
+            return service.indices, [(node.node.get_content(), node.score) for node in nodes]
+        finally:
+            await service.aclose()
+
+    monkeypatch.setenv("PROOF_LLAMACLOUD_CASSETTE", str(path))
+    monkeypatch.setenv("PROOF_LLAMACLOUD_CASSETTE_MODE", "record")
+    with FakeLlamaCloudServer(config=FakeConfig()) as server:
+        # As in the service, sync init attaches the indices to the composite retrievers; kept out of the cassette
+        with httpx.Client(timeout=60) as client:
+            RAGService("test-key", base_url=server.base_url, httpx_client=client)
+        recorded = asyncio.run(session(server.base_url))
+    assert recorded[1]
+
+    monkeypatch.setenv("PROOF_LLAMACLOUD_CASSETTE_MODE", "replay")
+    replayed = asyncio.run(session(UNREACHABLE_URL))
+    assert replayed == recorded
+
+
+def test_service_from_sync_retrieves_through_its_own_client(fake_llamacloud, fresh_resilience):
+    seen = []
+
+    async def record_request(request):
+        seen.append(request.url.path)
+
+    async def session(rag_service):
+        get_semantic_cache("retrieval").clear()
+        client = httpx.AsyncClient(timeout=60, event_hooks={"request": [record_request]})
+        service = AsyncRAGService.from_sync(rag_service, httpx_client=client)
+        try:
+            return await service.composite_retrieval("What was approved at the last board meeting?")
+        finally:
+            await service.aclose()
+
+    with httpx.Client(timeout=60) as client:
+        rag_service = RAGService("test-key", base_url=fake_llamacloud.base_url, httpx_client=client)
+        nodes = asyncio.run(session(rag_service))
+
+    assert nodes
+    assert any(path.endswith("/retrieve") for path in seen)
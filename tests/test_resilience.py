@@ -0,0 +1,83 @@
+import time
+
+import httpx
+import pytest
+
+from errors import CircuitOpenError, DeadlineExceededError
+from pipeline.resilience import CircuitBreaker, call_with_policy, get_circuit_breaker
+
+
+def _get(url: str):
+    def fn():
+        response = httpx.get(url)
+        response.raise_for_status()
+        return response.json()
+    return fn
+
+
+def test_backend_failures_open_the_circuit(fake_llamacloud, fresh_resilience):
+    fake_llamacloud.state.config.update({"error_rate": 1.0, "error_status": 503})
+    fn = _get(f"{fake_llamacloud.base_url}/api/v1/projects")
+
+    for _ in range(get_circuit_breaker("file_url").failure_threshold):
+        with pytest.raises(httpx.HTTPStatusError):
+            call_with_policy("file_url", fn)
+    assert get_circuit_breaker("file_url").state == "open"
+
+    requests = fake_llamacloud.state.stats()["requests"]["projects"]
+    with pytest.raises(CircuitOpenError):
+        call_with_policy("file_url", fn)
+    # An open circuit fails fast without calling the backend
+    assert fake_llamacloud.state.stats()["requests"]["projects"] == requests
+
+
+def test_5xx_is_retried(fake_llamacloud, fresh_resilience):
+    fake_llamacloud.state.config.update({"error_rate": 1.0, "error_status": 503})
+    with pytest.raises(httpx.HTTPStatusError):
+        call_with_policy("file_url", _get(f"{fake_llamacloud.base_url}/api/v1/projects"))
+    assert fake_llamacloud.state.stats()["requests"]["projects"] > 1
+
+
+def test_client_errors_are_not_retried_and_keep_the_circuit_closed(fake_llamacloud, fresh_resilience):
+    fn = _get(f"{fake_llamacloud.base_url}/api/v1/files/missing-file")
+
+    for _ in range(2 * get_circuit_breaker("file_url").failure_threshold):
+        with pytest.raises(httpx.HTTPStatusError) as error:
+            call_with_policy("file_url", fn)
+        assert error.value.response.status_code == 404
+
+    assert get_circuit_breaker("file_url").stats() == {"name": "file_url", "state": "closed",
+                                                       "consecutive_failures": 0}
+    assert fake_llamacloud.state.stats()["requests"]["files"] == 2 * get_circuit_breaker("file_url").failure_threshold
+
+
+def test_short_caller_budget_does_not_count_as_a_backend_failure(fake_llamacloud, fresh_resilience):
+    fake_llamacloud.state.config.route_latency_ms = {"projects": 500}
+    with pytest.raises(DeadlineExceededError):
+        call_with_policy("file_url", _get(f"{fake_llamacloud.base_url}/api/v1/projects"), deadline_seconds=0.05)
+    assert get_circuit_breaker("file_url").stats()["consecutive_failures"] == 0
+
+
+def test_half_open_circuit_lets_one_probe_through():
+    breaker = CircuitBreaker(name="test", failure_threshold=1, reset_timeout_seconds=0.05)
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.allow() is False
+
+    time.sleep(0.06)
+    assert breaker.allow() is True
+    assert breaker.allow() is False
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow() is True
+
+
+def test_failed_probe_reopens_the_circuit():
+    breaker = CircuitBreaker(name="test", failure_threshold=3, reset_timeout_seconds=0.05)
+    for _ in range(3):
+        breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow() is True
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.allow() is False
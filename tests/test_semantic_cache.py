@@ -0,0 +1,48 @@
+import pytest
+
+from pipeline.semantic_cache import SemanticCache
+from ui.chatbot import ANSWER_CACHE_THRESHOLD
+
+SCOPE = ("org", "v1")
+
+NEAR_MISSES = [
+    ("What did the board approve in March?", "What did the board approve in April?"),
+    ("What risks were escalated to the board?", "What risks were not escalated to the board?"),
+    ("What risks were escalated to the board?", "What risks weren't escalated to the board?"),
+    ("Summarize the risk committee's report", "Summarize the investment committee's report"),
+    ("What was the budget for 2024?", "What was the budget for 2025?"),
+]
+
+
+@pytest.mark.parametrize("cached, asked", NEAR_MISSES)
+def test_near_miss_questions_never_share_an_answer(cached, asked):
+    cache = SemanticCache(name="test")
+    cache.put(SCOPE, cached, "cached answer")
+
+    # Differing anchors block the match even below any sensible threshold
+    assert cache.lookup(SCOPE, asked, threshold=0.1) is None
+    assert cache.lookup(SCOPE, asked, threshold=ANSWER_CACHE_THRESHOLD) is None
+
+
+def test_rewordings_still_hit():
+    cache = SemanticCache(name="test")
+    cache.put(SCOPE, "What did the board approve in March?", "cached answer")
+
+    answer, cached_query, similarity = cache.lookup(SCOPE, "what did the board approve in march",
+                                                    threshold=ANSWER_CACHE_THRESHOLD)
+    assert answer == "cached answer" and similarity == 1.0
+    assert cache.lookup(SCOPE, "Show me what the board approved in March", threshold=0.5) is not None
+
+
+def test_answers_need_closer_wording_than_retrieval():
+    cache = SemanticCache(name="test", threshold=0.8)
+    cache.put(SCOPE, "What were the key risks raised?", "cached answer")
+
+    assert cache.lookup(SCOPE, "What key risks were raised?") is not None
+    assert cache.lookup(SCOPE, "What key risks were raised?", threshold=ANSWER_CACHE_THRESHOLD) is None
+
+
+def test_scopes_never_match():
+    cache = SemanticCache(name="test")
+    cache.put(SCOPE, "What did the board approve in March?", "cached answer")
+    assert cache.lookup(("org", "v2"), "What did the board approve in March?") is None
@@ -0,0 +1,52 @@
+import socket
+import threading
+import time
+
+import pytest
+import uvicorn
+
+from pipeline.remote import RemoteRAGService
+from pipeline.service import create_app
+
+
+@pytest.fixture
+def service_url(fake_llamacloud, fresh_resilience, monkeypatch):
+    """pipeline.service on a free local port, backed by the fake LlamaCloud server"""
+    monkeypatch.setenv("LLAMA_CLOUD_BASE_URL", fake_llamacloud.base_url)
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(create_app("test-key"), host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 60
+    while not server.started:
+        assert time.monotonic() < deadline, "RAG service did not start"
+        time.sleep(0.05)
+    yield f"http://127.0.0.1:{port}"
+    server.should_exit = True
+    thread.join()
+
+
+def test_file_catalog_is_only_refetched_when_the_index_version_changes(service_url, monkeypatch):
+    monkeypatch.setattr("pipeline.remote.INFO_TTL_SECONDS", 0)
+    remote = RemoteRAGService(service_url)
+    requests = []
+    remote.http.event_hooks["request"].append(lambda request: requests.append(request.url.path))
+
+    assert "file_id_name_dict" not in remote.http.get("/info").json()
+    catalog = remote.file_id_name_dict
+    assert catalog and remote.file_id_name_dict == catalog
+    assert requests.count("/files") == 1
+
+    remote._files["index_version"] = "stale"
+    assert remote.file_id_name_dict == catalog
+    assert requests.count("/files") == 2
+
+
+def test_file_url_failures_come_back_as_json_errors(service_url):
+    remote = RemoteRAGService(service_url)
+    response = remote.http.post("/file_url", json={"expires_in_seconds": 60})
+
+    assert response.status_code == 500
+    assert response.json()["type"] == "KeyError"
@@ -0,0 +1,68 @@
+from types import SimpleNamespace
+
+from llama_index.core.llms import ChatMessage, MessageRole
+
+from pipeline.memory import RollingSummaryMemory
+from utils import session_memory
+from utils.session_memory import (ReferenceSpillStore, enforce_session_cap, evict_heavy_objects,
+                                  load_spilled_references, session_footprint)
+
+
+def _session(question_id="q1", text="x" * 1000):
+    # Room for about two turns
+    memory = RollingSummaryMemory(recent_turns=1, token_limit=150)
+    for index in range(4):
+        memory.put(ChatMessage(role=MessageRole.USER, content=f"question {index}"))
+        memory.put(ChatMessage(role=MessageRole.ASSISTANT, content="y" * 500))
+    return {
+        "messages": [{"role": "assistant", "content": "answer", "question_id": question_id}],
+        "chat_engine": SimpleNamespace(memory=memory),
+        "llama": object(),
+        "current_references": {"prompt": "question", "question_id": question_id,
+                               "nodes": [{"id": "n1", "type": "text", "content": text, "score": 0.5}]},
+    }
+
+
+def test_footprint_counts_messages_memory_and_references():
+    footprint = session_footprint(_session())
+    assert footprint["references"] == 1000
+    assert footprint["memory"] == 4 * len("question 0") + 4 * 500
+    assert footprint["total"] == sum(value for key, value in footprint.items() if key != "total")
+
+
+def test_session_over_its_cap_trims_memory_then_spills_references(tmp_path, monkeypatch):
+    monkeypatch.setattr(session_memory, "_spill_store", ReferenceSpillStore(tmp_path))
+    state = _session()
+
+    footprint = enforce_session_cap(state, "session-1", cap_bytes=100)
+
+    assert state["current_references"] is None
+    assert state["messages"][0]["references_spilled"] is True
+    assert footprint["references"] == 0
+    # Only what the LLM would still be sent is kept
+    kept = state["chat_engine"].memory.get_all()
+    assert 0 < len(kept) < 8 and kept[-1].content == "y" * 500
+    assert load_spilled_references("session-1", "q1")["nodes"][0]["content"] == "x" * 1000
+    assert session_memory.get_reference_spill_store().flush()
+    assert (tmp_path / "session-1" / "q1.json").exists()
+
+
+def test_session_under_its_cap_is_left_alone(tmp_path, monkeypatch):
+    monkeypatch.setattr(session_memory, "_spill_store", ReferenceSpillStore(tmp_path))
+    state = _session()
+    enforce_session_cap(state, "session-1", cap_bytes=1024 * 1024)
+    assert state["current_references"] is not None
+    assert len(state["chat_engine"].memory.get_all()) == 8
+
+
+def test_idle_eviction_keeps_history_and_asks_for_a_rebuild(tmp_path, monkeypatch):
+    monkeypatch.setattr(session_memory, "_spill_store", ReferenceSpillStore(tmp_path))
+    state = _session()
+    history = state["chat_engine"].memory.get_all()
+
+    evict_heavy_objects(state, "session-1")
+
+    assert "chat_engine" not in state and "llama" not in state
+    assert state["refresh_state"] is True
+    assert state["evicted_chat_history"] == history
+    assert load_spilled_references("session-1", "q1") is not None
@@ -0,0 +1,91 @@
+import asyncio
+import threading
+
+import httpx
+
+from pipeline.single_flight import AsyncSingleFlight, SingleFlight
+
+
+def _run_concurrently(count: int, fn):
+    barrier = threading.Barrier(count)
+    results, errors = [], []
+
+    def call():
+        barrier.wait()
+        try:
+            results.append(fn())
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+
+def test_identical_concurrent_calls_make_one_request(fake_llamacloud):
+    fake_llamacloud.state.config.route_latency_ms = {"projects": 200}
+    flight = SingleFlight(name="test")
+    url = f"{fake_llamacloud.base_url}/api/v1/projects"
+
+    results, errors = _run_concurrently(5, lambda: flight.do("projects", lambda: httpx.get(url).json()))
+
+    assert errors == []
+    assert len(results) == 5 and all(result == results[0] for result in results)
+    assert fake_llamacloud.state.stats()["requests"]["projects"] == 1
+    assert flight.stats() == {"name": "test", "calls": 5, "coalesced": 4, "in_flight": 0}
+
+
+def test_followers_get_the_leaders_error_and_the_key_is_freed(fake_llamacloud):
+    fake_llamacloud.state.config.update({"error_rate": 1.0, "error_status": 503, "route_latency_ms": {"projects": 200}})
+    flight = SingleFlight(name="test")
+    url = f"{fake_llamacloud.base_url}/api/v1/projects"
+
+    def fetch():
+        response = httpx.get(url)
+        response.raise_for_status()
+        return response.json()
+
+    results, errors = _run_concurrently(3, lambda: flight.do("projects", fetch))
+    assert results == []
+    assert len(errors) == 3 and all(isinstance(error, httpx.HTTPStatusError) for error in errors)
+    assert fake_llamacloud.state.stats()["requests"]["projects"] == 1
+
+    # A failed call isn't cached: the next caller goes to the backend again
+    fake_llamacloud.state.config.update({"error_rate": 0.0})
+    assert flight.do("projects", fetch)
+    assert fake_llamacloud.state.stats()["requests"]["projects"] == 2
+
+
+def test_different_keys_are_not_coalesced(fake_llamacloud):
+    flight = SingleFlight(name="test")
+    url = f"{fake_llamacloud.base_url}/api/v1/projects"
+    flight.do("a", lambda: httpx.get(url).json())
+    flight.do("b", lambda: httpx.get(url).json())
+    assert fake_llamacloud.state.stats()["requests"]["projects"] == 2
+    assert flight.stats()["coalesced"] == 0
+
+
+def test_async_calls_coalesce_and_a_cancelled_follower_keeps_the_call(fake_llamacloud):
+    fake_llamacloud.state.config.route_latency_ms = {"projects": 200}
+    flight = AsyncSingleFlight(name="test")
+
+    async def scenario():
+        async with httpx.AsyncClient(base_url=fake_llamacloud.base_url) as client:
+            async def fetch():
+                return (await client.get("/api/v1/projects")).json()
+
+            callers = [asyncio.ensure_future(flight.do("projects", fetch)) for _ in range(4)]
+            await asyncio.sleep(0.05)
+            callers[1].cancel()
+            results = await asyncio.gather(*callers, return_exceptions=True)
+            return results
+
+    results = asyncio.run(scenario())
+    assert isinstance(results[1], asyncio.CancelledError)
+    completed = [result for index, result in enumerate(results) if index != 1]
+    assert all(result == completed[0] for result in completed)
+    assert fake_llamacloud.state.stats()["requests"]["projects"] == 1
+    assert flight.stats()["in_flight"] == 0
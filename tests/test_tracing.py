@@ -0,0 +1,76 @@
+import pytest
+
+from pipeline.tracing import Histogram, MetricsRegistry
+
+
+def test_counters_get_one_total_suffix():
+    registry = MetricsRegistry()
+    registry.increment("proof_condense_total", path="fast")
+    registry.increment("proof_answers", 2)
+
+    lines = registry.render_prometheus().splitlines()
+
+    assert 'proof_condense_total{path="fast"} 1' in lines
+    assert "proof_answers_total 2" in lines
+    assert not any("_total_total" in line for line in lines)
+
+
+def test_every_metric_is_typed_once_before_its_samples():
+    registry = MetricsRegistry()
+    registry.observe("proof_stage_seconds", 0.2, stage="retrieval")
+    registry.observe("proof_stage_seconds", 0.4, stage="llm")
+    registry.increment("proof_condense_total")
+    registry.set_gauge("proof_sessions", 3)
+
+    lines = registry.render_prometheus().splitlines()
+
+    assert [line for line in lines if line.startswith("# TYPE")] == [
+        "# TYPE proof_stage_seconds histogram",
+        "# TYPE proof_condense_total counter",
+        "# TYPE proof_sessions gauge",
+    ]
+    assert lines.index("# TYPE proof_stage_seconds histogram") < lines.index(
+        'proof_stage_seconds_count{stage="llm"} 1')
+
+
+def test_label_values_are_escaped():
+    registry = MetricsRegistry()
+    registry.increment("proof_errors", error='bad "quote"\\path\nnext')
+
+    assert 'proof_errors_total{error="bad \\"quote\\"\\\\path\\nnext"} 1' in registry.render_prometheus()
+
+
+def test_windows_count_every_sample_past_a_thousand(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr("pipeline.tracing.time.time", lambda: now[0])
+    registry = MetricsRegistry()
+
+    for _ in range(3000):
+        registry.observe("proof_stage_seconds", 2.0, stage="llm")
+    now[0] += 600
+    for _ in range(2000):
+        registry.observe("proof_stage_seconds", 0.02, stage="llm")
+    histogram = registry.histogram("proof_stage_seconds", stage="llm")
+
+    five_minutes = now[0] - 300
+    assert histogram.window_count(five_minutes) == 2000
+    assert histogram.window_sum(five_minutes) == pytest.approx(40.0)
+    assert 0.01 <= histogram.percentile(99, since=five_minutes) <= 0.025
+
+    hour = now[0] - 3600
+    assert histogram.window_count(hour) == 5000
+    assert 1 <= histogram.percentile(95, since=hour) <= 2.5
+    assert histogram.percentile(50, since=now[0] + 60) is None
+
+
+def test_minutes_older_than_the_retention_are_dropped(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr("pipeline.tracing.time.time", lambda: now[0])
+    histogram = Histogram(retention_seconds=3600)
+
+    histogram.observe(1.0)
+    now[0] += 2 * 3600
+    histogram.observe(1.0)
+
+    assert histogram.window_count(0) == 1
+    assert histogram.count == 2
@@ -0,0 +1,275 @@
+#Micro-benchmarks for RAGService and node processing hot paths, run offline against the fake LlamaCloud server
+#Run with: python -m tools.benchmark run [--quick] [--only NAME] [--output results.json]
+#Compare with: python -m tools.benchmark compare baseline.json results.json [--threshold 0.2]
+
+import os
+
+# Benchmarks measure our code, not the production LlamaCloud rate limit
+os.environ.setdefault("PROOF_LLAMACLOUD_RPS", "100000")
+os.environ.setdefault("PROOF_LLAMACLOUD_BURST", "100000")
+os.environ.setdefault("LLAMA_CLOUD_API_KEY", "fake-llamacloud-key")
+
+from importlib import metadata
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Callable, List, Optional
+import argparse
+import base64
+import json
+import logging
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+from llama_index.core.schema import ImageNode, NodeWithScore, TextNode
+
+from pipeline.pipeline import RAGService
+from pipeline.semantic_cache import get_semantic_cache
+from tools.fake_llamacloud import (DATA_SOURCE_ID, LIBRARY_NAME, FakeConfig, FakeLlamaCloudServer,
+                                   get_fake_corpus, placeholder_png)
+from utils.node_processor import process_nodes
+from utils.precompute import load_common_queries_config
+
+logger = logging.getLogger(__name__)
+
+BENCHMARK_DIR = Path(os.getenv("PROOF_CACHE_DIR", ".proof_cache")) / "benchmarks"
+# Slowdowns smaller than this are noise however large the ratio
+NOISE_FLOOR_MS = 1.0
+
+
+def measure(name: str, fn: Callable, repeat: int = 5, setup: Optional[Callable] = None, **params) -> dict:
+    """Times fn repeat times; setup runs before each timed call and is not counted"""
+    samples = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        samples.append(1000 * (time.perf_counter() - start))
+    result = {
+        "name": name,
+        "params": params,
+        "repeat": repeat,
+        "min_ms": round(min(samples), 3),
+        "median_ms": round(statistics.median(samples), 3),
+        "mean_ms": round(statistics.fmean(samples), 3),
+        "max_ms": round(max(samples), 3),
+    }
+    label = " ".join(f"{key}={value}" for key, value in params.items())
+    print(f"{name:<36} {label:<28} median {result['median_ms']:>10.2f} ms  min {result['min_ms']:>10.2f} ms")
+    return result
+
+
+def result_key(result: dict) -> str:
+    return f"{result['name']}[{json.dumps(result['params'], sort_keys=True)}]"
+
+
+def _rag_service(server: FakeLlamaCloudServer) -> RAGService:
+    return RAGService(llama_cloud_api_key=os.environ["LLAMA_CLOUD_API_KEY"], base_url=server.base_url)
+
+
+def _precreate_retrievers(server: FakeLlamaCloudServer):
+    for name in (RAGService.COMPOSITE_RETRIEVER_NAME, RAGService.COMPOSITE_IMAGE_RETRIEVER_NAME):
+        server.state.add_retriever(name, replace=False)
+
+
+def bench_init(args, server: FakeLlamaCloudServer) -> List[dict]:
+    # Cold: the composite retrievers don't exist yet, so init creates them and syncs every index
+    cold = measure("rag_service_init", lambda: _rag_service(server), repeat=args.repeat,
+                   setup=server.state.reset, state="cold")
+    _rag_service(server)
+    warm = measure("rag_service_init", lambda: _rag_service(server), repeat=args.repeat, state="warm")
+    return [cold, warm]
+
+
+def bench_sync_indices(args, server: FakeLlamaCloudServer) -> List[dict]:
+    results = []
+    corpus = get_fake_corpus()
+    for count in args.index_counts:
+        with FakeLlamaCloudServer(config=FakeConfig(), corpus=corpus.with_pipeline_copies(count)) as scaled:
+            _precreate_retrievers(scaled)
+            rag = _rag_service(scaled)
+            repeat = 1 if count >= 1000 else args.repeat
+            for retriever in (rag.composite_retriever, rag.composite_image_retriever):
+                kind = "image" if retriever is rag.composite_image_retriever else "text"
+                results.append(measure("sync_indices_with_retriever",
+                                       lambda: rag._sync_indices_with_retriever(retriever),
+                                       repeat=repeat, indices=count, retriever=kind))
+    return results
+
+
+def synthetic_files(count: int, data_source_share: float = 0.9) -> list:
+    """File listings shaped like the llama_cloud File model, mostly synced from a SharePoint data source"""
+    files = []
+    synced = int(count * data_source_share)
+    for index in range(count):
+        from_data_source = index < synced
+        name = (f"{LIBRARY_NAME}/Folder {index % 200:03d}/Board paper {index:06d}.pdf" if from_data_source
+                else f"Upload {index:06d}.pdf")
+        files.append(SimpleNamespace(id=f"file-{index:06d}", name=name,
+                                     resource_info={"url": f"https://example.invalid/{index}"},
+                                     data_source_id=DATA_SOURCE_ID if from_data_source else None))
+    return files
+
+
+def bench_parse_hierarchy(args, rag: RAGService) -> List[dict]:
+    files = synthetic_files(args.file_count)
+    return [measure("parse_files_to_hierarchy", lambda: rag._parse_files_to_hierarchy(files),
+                    repeat=args.repeat, files=args.file_count)]
+
+
+def mixed_nodes(rag: RAGService, text_count: int = 15, image_count: int = 5) -> list:
+    corpus = get_fake_corpus()
+    chunks = corpus.chunks[:text_count]
+    nodes = [NodeWithScore(node=TextNode(id_=chunk.id, text=chunk.text,
+                                         metadata={"file_id": chunk.file_id,
+                                                   "file_name": corpus.files[chunk.file_id]["file_name"]}),
+                           score=1.0 - index / 100)
+             for index, chunk in enumerate(chunks)]
+    image = base64.b64encode(placeholder_png(1280, 720, 200)).decode("ascii")
+    file_ids = [file_id for file_id in corpus.files if file_id in rag.file_id_name_dict]
+    for index in range(image_count):
+        file_id = file_ids[index % len(file_ids)]
+        nodes.append(NodeWithScore(node=ImageNode(id_=f"image-{index}", image=image,
+                                                  metadata={"file_id": file_id, "page_index": index,
+                                                            "file_name": corpus.files[file_id]["file_name"]}),
+                                   score=0.5))
+    return nodes
+
+
+def bench_process_nodes(args, rag: RAGService) -> List[dict]:
+    nodes = mixed_nodes(rag)
+    return [measure("process_nodes", lambda: process_nodes(nodes, rag), repeat=args.repeat,
+                    text_nodes=15, image_nodes=5)]
+
+
+def bench_format_composite_result(args, rag: RAGService) -> List[dict]:
+    results = []
+    retriever = rag.client.retrievers.list_retrievers(project_id=rag.project_id,
+                                                      organization_id=rag.organization_id)[0]
+    for top_n in (5, 100):
+        result = rag.client.retrievers.retrieve(retriever_id=retriever.id, query="budget investment returns risk",
+                                                rerank_top_n=top_n)
+        results.append(measure("format_composite_retrieval_result",
+                               lambda: RAGService._format_composite_retrieval_result(result),
+                               repeat=max(args.repeat, 20), nodes=len(result.nodes)))
+    return results
+
+
+def bench_retrieval(args, rag: RAGService) -> List[dict]:
+    queries = load_common_queries_config()["queries"] or ["Show budget trends"]
+    cache = get_semantic_cache("retrieval")
+
+    def retrieve_all():
+        for query in queries:
+            rag.composite_retrieval(query)
+
+    cache.clear()
+    off = measure("composite_retrieval", retrieve_all, repeat=args.repeat, setup=cache.clear,
+                  cache="off", queries=len(queries))
+    retrieve_all()
+    on = measure("composite_retrieval", retrieve_all, repeat=args.repeat, cache="on", queries=len(queries))
+    return [off, on]
+
+
+# name -> (function, needs a RAGService on the shared server)
+BENCHMARKS = {
+    "init": (bench_init, False),
+    "sync_indices": (bench_sync_indices, False),
+    "parse_hierarchy": (bench_parse_hierarchy, True),
+    "process_nodes": (bench_process_nodes, True),
+    "format_composite_result": (bench_format_composite_result, True),
+    "retrieval": (bench_retrieval, True),
+}
+
+
+def _environment() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=Path(__file__).resolve().parent.parent).stdout.strip() or None
+    except OSError:
+        commit = None
+    versions = {}
+    for package in ("llama-index-core", "llama-cloud", "llama-index-indices-managed-llama-cloud", "httpx",
+                    "streamlit"):
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            versions[package] = None
+    return {"python": sys.version.split()[0], "platform": platform.platform(), "commit": commit,
+            "packages": versions}
+
+
+def run(args) -> dict:
+    selected = args.only or list(BENCHMARKS)
+    results = []
+    with FakeLlamaCloudServer(config=FakeConfig(latency_ms=args.latency_ms)) as server:
+        rag = None
+        for name in selected:
+            fn, needs_rag = BENCHMARKS[name]
+            if needs_rag and rag is None:
+                _precreate_retrievers(server)
+                rag = _rag_service(server)
+                rag._sync_indices_with_retriever(rag.composite_retriever)
+                rag._sync_indices_with_retriever(rag.composite_image_retriever)
+            results.extend(fn(args, rag if needs_rag else server))
+    return {"created_at": time.time(), "environment": _environment(), "latency_ms": args.latency_ms,
+            "results": results}
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> List[dict]:
+    """Rows for every benchmark in both runs; a regression is a median slower by more than threshold and the noise floor"""
+    baseline_results = {result_key(result): result for result in baseline["results"]}
+    rows = []
+    for result in current["results"]:
+        before = baseline_results.get(result_key(result))
+        if before is None:
+            continue
+        change = (result["median_ms"] - before["median_ms"]) / before["median_ms"] if before["median_ms"] else 0.0
+        rows.append({"benchmark": result_key(result), "baseline_ms": before["median_ms"],
+                     "current_ms": result["median_ms"], "change": change,
+                     "regression": change > threshold and result["median_ms"] - before["median_ms"] > NOISE_FLOOR_MS})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline micro-benchmarks for the retrieval hot paths")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run")
+    run_parser.add_argument("--only", action="append", choices=list(BENCHMARKS))
+    run_parser.add_argument("--repeat", type=int, default=5)
+    run_parser.add_argument("--quick", action="store_true", help="Skip the 1000-index and 100k-file sizes")
+    run_parser.add_argument("--latency-ms", type=float, default=0.0, help="Fake LlamaCloud latency per request")
+    run_parser.add_argument("--output", default=None)
+    compare_parser = commands.add_parser("compare")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.2, help="Allowed slowdown, 0.2 = 20%%")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    if args.command == "run":
+        args.index_counts = (10, 100) if args.quick else (10, 100, 1000)
+        args.file_count = 10_000 if args.quick else 100_000
+        report = run(args)
+        output = Path(args.output) if args.output else BENCHMARK_DIR / f"benchmark-{time.strftime('%Y%m%d-%H%M%S')}.json"
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(report, indent=2))
+        print(f"Results written to {output}")
+        return
+
+    rows = compare(json.loads(Path(args.baseline).read_text()), json.loads(Path(args.current).read_text()),
+                   args.threshold)
+    for row in rows:
+        flag = "REGRESSION" if row["regression"] else ""
+        print(f"{row['benchmark']:<80} {row['baseline_ms']:>10.2f} -> {row['current_ms']:>10.2f} ms "
+              f"{row['change']:>+7.1%} {flag}")
+    regressions = [row for row in rows if row["regression"]]
+    print(f"{len(regressions)} regression(s) across {len(rows)} benchmarks")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
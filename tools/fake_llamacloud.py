@@ -0,0 +1,874 @@
+#Local fake of the LlamaCloud API serving assets/sample_board_docs, for offline benchmarks and load tests
+#Run with: python -m tools.fake_llamacloud --port 8787 [--latency-ms 80 --jitter-ms 40 --error-rate 0.02]
+#then point the app at it with LLAMA_CLOUD_BASE_URL=http://127.0.0.1:8787 and any LLAMA_CLOUD_API_KEY
+
+from collections import Counter
+from dataclasses import asdict, dataclass, field, fields
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+import argparse
+import copy
+import json
+import logging
+import math
+import os
+import random
+import re
+import struct
+import threading
+import time
+import uuid
+import zlib
+
+logger = logging.getLogger(__name__)
+
+CORPUS_ROOT = Path(__file__).resolve().parent.parent / "assets" / "sample_board_docs"
+# Fixed timestamps and ids keep responses identical across runs
+TIMESTAMP = "2025-06-18T00:00:00Z"
+NAMESPACE = uuid.UUID("6f1c1d8e-2a44-4b8e-9a51-0f2d7c1e9b11")
+ORGANIZATION_ID = str(uuid.uuid5(NAMESPACE, "organization"))
+PROJECT_ID = str(uuid.uuid5(NAMESPACE, "project"))
+DATA_SOURCE_ID = str(uuid.uuid5(NAMESPACE, "data-source"))
+DATA_SOURCE_NAME = "Board SharePoint"
+# Files are listed as if synced from SharePoint: "<library>/<folder>/<file>"
+LIBRARY_NAME = "Board Documents"
+# Pipelines parsed with take_screenshot, so retrieval can return page images
+SCREENSHOT_PIPELINES = {"presentations", "financials_and_figures"}
+CHUNK_CHARS = 1200
+DEFAULT_TOP_K = 10
+DEFAULT_RERANK_TOP_N = 6
+STOPWORDS = {"a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "have", "in", "is", "it", "of",
+             "on", "or", "that", "the", "this", "to", "was", "were", "what", "when", "which", "who", "with", "how"}
+
+
+def _id(*parts) -> str:
+    return str(uuid.uuid5(NAMESPACE, "/".join(str(part) for part in parts)))
+
+
+def _terms(text: str) -> List[str]:
+    return [term for term in re.findall(r"[a-z0-9]+", text.lower()) if term not in STOPWORDS]
+
+
+def _decode_pdf_string(raw: bytes) -> str:
+    text = re.sub(rb"\\([0-7]{1,3})", lambda m: bytes([int(m.group(1), 8) & 0xFF]), raw)
+    text = text.replace(rb"\(", b"(").replace(rb"\)", b")").replace(rb"\\", b"\\")
+    decoded = text.decode("latin-1")
+    # Strings in embedded (subset) font encodings come out as control characters
+    printable = sum(ch.isprintable() for ch in decoded)
+    return decoded if decoded and printable / len(decoded) > 0.8 else ""
+
+
+# Literal strings shown with Tj, and arrays of them shown with TJ; the patterns stay linear on binary streams
+PDF_STRING = re.compile(rb"\(((?:[^()\\]|\\.)*)\)", re.S)
+PDF_TEXT_OPERATOR = re.compile(rb"\(((?:[^()\\]|\\.)*)\)\s*Tj|\[((?:[^\[\]\\]|\\.)*)\]\s*TJ", re.S)
+
+
+def _pdf_pages(data: bytes) -> List[str]:
+    """Page texts; uses pypdf when installed, otherwise a rough scan of the Flate-compressed content streams"""
+    try:
+        from pypdf import PdfReader
+        import io
+        return [page.extract_text() or "" for page in PdfReader(io.BytesIO(data)).pages]
+    except ImportError:
+        pass
+
+    page_count = max(1, len(re.findall(rb"/Type\s*/Page(?![s\w])", data)))
+    strings = []
+    for match in re.finditer(rb"stream\r?\n(.*?)\r?\nendstream", data, re.S):
+        # Images and embedded fonts hold no text operators and are most of the bytes
+        dictionary = data[max(0, match.start() - 400):match.start()]
+        dictionary = dictionary[dictionary.rfind(b"obj"):]
+        if b"/Image" in dictionary or b"/Length1" in dictionary or b"/FontFile" in dictionary:
+            continue
+        try:
+            stream = zlib.decompress(match.group(1))
+        except zlib.error:
+            continue
+        for single, array in PDF_TEXT_OPERATOR.findall(stream):
+            raw = single or b"".join(PDF_STRING.findall(array))
+            strings.append(_decode_pdf_string(raw))
+    text = re.sub(r"\s+", " ", " ".join(strings)).strip()
+    # Without page boundaries, text is spread evenly over the pages
+    size = math.ceil(len(text) / page_count) if text else 0
+    return [text[i * size:(i + 1) * size] for i in range(page_count)]
+
+
+def placeholder_png(width: int, height: int, shade: int) -> bytes:
+    """A flat grey PNG, enough for the app to decode and render as a page screenshot"""
+    def chunk(kind: bytes, payload: bytes) -> bytes:
+        return struct.pack(">I", len(payload)) + kind + payload + struct.pack(">I", zlib.crc32(kind + payload))
+    row = b"\x00" + bytes([shade]) * width
+    return (b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(row * height))
+            + chunk(b"IEND", b""))
+
+
+@dataclass
+class FakeChunk:
+    id: str
+    file_id: str
+    pipeline_id: str
+    page_index: int
+    text: str
+    start_char_idx: int
+    end_char_idx: int
+    terms: Counter = field(repr=False, default_factory=Counter)
+
+
+class FakeCorpus:
+    """Pipelines, files and chunks built from a folder tree: each subfolder becomes one pipeline"""
+    def __init__(self, root: Path = CORPUS_ROOT):
+        self.root = Path(root)
+        self.pipelines = {}
+        self.files = {}
+        self.chunks = []
+        self.document_frequency = Counter()
+        for folder in sorted(path for path in self.root.iterdir() if path.is_dir()):
+            self._load_pipeline(folder)
+        self.chunk_count = len(self.chunks)
+        logger.info(f"FAKE_LLAMACLOUD: Loaded {len(self.files)} files into {len(self.pipelines)} pipelines "
+                    f"({self.chunk_count} chunks) from {self.root}")
+
+    def with_pipeline_copies(self, count: int) -> "FakeCorpus":
+        """A corpus with `count` pipelines listing the same files, for scaling index-count dependent paths"""
+        scaled = copy.copy(self)
+        scaled.pipelines = {}
+        sources = list(self.pipelines.values())
+        for index in range(count):
+            source = sources[index % len(sources)]
+            pipeline_id = _id("pipeline", source["name"], index)
+            scaled.pipelines[pipeline_id] = {**source, "id": pipeline_id, "name": f"{source['name']}-{index:04d}",
+                                             "file_ids": list(source["file_ids"])}
+        return scaled
+
+    def _load_pipeline(self, folder: Path):
+        pipeline_id = _id("pipeline", folder.name)
+        self.pipelines[pipeline_id] = {"id": pipeline_id, "name": folder.name,
+                                       "take_screenshot": folder.name in SCREENSHOT_PIPELINES, "file_ids": []}
+        for path in sorted(folder.iterdir()):
+            if path.suffix.lower() not in {".pdf", ".txt"}:
+                continue
+            data = path.read_bytes()
+            pages = _pdf_pages(data) if path.suffix.lower() == ".pdf" else [data.decode("utf-8", errors="replace")]
+            file_id = _id("file", folder.name, path.name)
+            self.files[file_id] = {"id": file_id, "name": f"{LIBRARY_NAME}/{folder.name}/{path.name}",
+                                   "file_name": path.name, "path": path, "size": len(data),
+                                   "type": path.suffix.lstrip(".").lower(), "pages": len(pages),
+                                   "pipeline_id": pipeline_id}
+            self.pipelines[pipeline_id]["file_ids"].append(file_id)
+            self._chunk_file(file_id, pipeline_id, pages or [path.stem.replace("-", " ")])
+
+    def _chunk_file(self, file_id: str, pipeline_id: str, pages: List[str]):
+        offset = 0
+        for page_index, page_text in enumerate(pages):
+            # Files whose text can't be extracted still match on their name
+            page_text = page_text.strip() or self.files[file_id]["file_name"].rsplit(".", 1)[0].replace("-", " ")
+            for start in range(0, len(page_text), CHUNK_CHARS):
+                text = page_text[start:start + CHUNK_CHARS]
+                chunk = FakeChunk(id=_id("chunk", file_id, page_index, start), file_id=file_id,
+                                  pipeline_id=pipeline_id, page_index=page_index, text=text,
+                                  start_char_idx=offset + start, end_char_idx=offset + start + len(text),
+                                  terms=Counter(_terms(text)))
+                self.chunks.append(chunk)
+                self.document_frequency.update(set(chunk.terms))
+            offset += len(page_text)
+
+    def _idf(self, term: str) -> float:
+        return math.log(1 + self.chunk_count / (1 + self.document_frequency.get(term, 0)))
+
+    def search(self, pipeline_ids, query: str, top_k: int = DEFAULT_TOP_K) -> List[tuple]:
+        """Deterministic keyword scoring normalized to [0, 1]: the idf-weighted share of query terms a chunk contains"""
+        query_terms = set(_terms(query))
+        total = sum(self._idf(term) for term in query_terms)
+        if not total:
+            return []
+        pipeline_ids = set(pipeline_ids)
+        scored = []
+        for chunk in self.chunks:
+            if chunk.pipeline_id not in pipeline_ids:
+                continue
+            matched = sum(self._idf(term) for term in query_terms if term in chunk.terms)
+            if matched:
+                # Repeated mentions break ties between chunks matching the same terms
+                density = sum(chunk.terms[term] for term in query_terms) / (1 + sum(chunk.terms.values()))
+                scored.append((0.9 * matched / total + 0.1 * min(1.0, 5 * density), chunk))
+        scored.sort(key=lambda item: (-item[0], item[1].id))
+        return scored[:top_k]
+
+
+@dataclass
+class FakeConfig:
+    """Latency and failure injection; every field can be changed at runtime with POST /_fake/config"""
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    # A share of requests gets an extra delay, to exercise hedging and deadlines
+    slow_rate: float = 0.0
+    slow_ms: float = 2000.0
+    error_rate: float = 0.0
+    error_status: int = 503
+    # Only paths matching this regex get injected errors and slow responses
+    error_paths: Optional[str] = None
+    # Extra latency for specific operations, e.g. {"retrieve": 400}
+    route_latency_ms: Dict[str, float] = field(default_factory=dict)
+    seed: int = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(latency_ms=float(os.getenv("PROOF_FAKE_LATENCY_MS", "0")),
+                   jitter_ms=float(os.getenv("PROOF_FAKE_JITTER_MS", "0")),
+                   slow_rate=float(os.getenv("PROOF_FAKE_SLOW_RATE", "0")),
+                   slow_ms=float(os.getenv("PROOF_FAKE_SLOW_MS", "2000")),
+                   error_rate=float(os.getenv("PROOF_FAKE_ERROR_RATE", "0")),
+                   error_status=int(os.getenv("PROOF_FAKE_ERROR_STATUS", "503")),
+                   error_paths=os.getenv("PROOF_FAKE_ERROR_PATHS") or None,
+                   seed=int(os.getenv("PROOF_FAKE_SEED", "0")))
+
+    def update(self, values: dict):
+        names = {f.name for f in fields(self)}
+        for name, value in values.items():
+            if name not in names:
+                raise ValueError(f"Unknown fake config field '{name}'")
+            setattr(self, name, value)
+
+
+class FakeLlamaCloudState:
+    """Mutable server state: config, retrievers created by clients, uploads and request stats"""
+    def __init__(self, corpus: FakeCorpus, config: FakeConfig):
+        self.corpus = corpus
+        self.config = config
+        self.lock = threading.Lock()
+        self.random = random.Random(config.seed)
+        self.retrievers = {}
+        self.uploads = {}
+        self.data_sources = {DATA_SOURCE_ID: {"id": DATA_SOURCE_ID, "name": DATA_SOURCE_NAME,
+                                              "source_type": "MICROSOFT_SHAREPOINT", "project_id": PROJECT_ID,
+                                              "component": {}, "custom_metadata": {},
+                                              "created_at": TIMESTAMP, "updated_at": TIMESTAMP}}
+        self.requests = Counter()
+        self.injected_errors = Counter()
+        self.slow_responses = Counter()
+
+    def reset(self):
+        with self.lock:
+            self.retrievers.clear()
+            self.uploads.clear()
+            self.requests.clear()
+            self.injected_errors.clear()
+            self.slow_responses.clear()
+            self.random = random.Random(self.config.seed)
+
+    def add_retriever(self, name: str, pipelines: Optional[List[dict]] = None, replace: bool = True) -> dict:
+        """Also used to pre-create retrievers so a RAGService init skips the index sync"""
+        retriever_id = _id("retriever", name)
+        with self.lock:
+            retriever = self.retrievers.setdefault(retriever_id, {"id": retriever_id, "name": name, "pipelines": []})
+            # Upserting with no pipelines keeps the indices already attached
+            if replace or pipelines:
+                retriever["pipelines"] = pipelines or []
+        return retriever
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"requests": dict(self.requests), "injected_errors": dict(self.injected_errors),
+                    "slow_responses": dict(self.slow_responses), "retrievers": len(self.retrievers),
+                    "config": asdict(self.config)}
+
+    def plan(self, operation: str, path: str):
+        """Delay in seconds and injected status (or None) for one request"""
+        config = self.config
+        with self.lock:
+            self.requests[operation] += 1
+            delay = config.latency_ms + config.route_latency_ms.get(operation, 0.0)
+            if config.jitter_ms:
+                delay += self.random.uniform(0, config.jitter_ms)
+            targeted = config.error_paths is None or re.search(config.error_paths, path) is not None
+            if targeted and config.slow_rate and self.random.random() < config.slow_rate:
+                delay += config.slow_ms
+                self.slow_responses[operation] += 1
+            status = None
+            if targeted and config.error_rate and self.random.random() < config.error_rate:
+                status = config.error_status
+                self.injected_errors[operation] += 1
+        return delay / 1000, status
+
+
+# Resource builders; shapes follow the llama_cloud client's models with optional fields filled where the app reads them
+
+def organization_json() -> dict:
+    return {"id": ORGANIZATION_ID, "name": "Fake Board Organization", "feature_flags": {},
+            "parse_plan_level": "DEFAULT", "created_at": TIMESTAMP, "updated_at": TIMESTAMP}
+
+
+def project_json() -> dict:
+    return {"id": PROJECT_ID, "name": "Default", "organization_id": ORGANIZATION_ID, "is_default": True,
+            "ad_hoc_eval_dataset_id": None, "created_at": TIMESTAMP, "updated_at": TIMESTAMP}
+
+
+def pipeline_json(pipeline: dict) -> dict:
+    return {
+        "id": pipeline["id"],
+        "name": pipeline["name"],
+        "project_id": PROJECT_ID,
+        "pipeline_type": "MANAGED",
+        "managed_pipeline_id": None,
+        "embedding_config": {"type": "OPENAI_EMBEDDING",
+                             "component": {"model_name": "text-embedding-3-small", "class_name": "OpenAIEmbedding"}},
+        "embedding_model_config_id": None,
+        "transform_config": {"mode": "auto", "chunk_size": CHUNK_CHARS, "chunk_overlap": 0},
+        "preset_retrieval_parameters": {"dense_similarity_top_k": DEFAULT_TOP_K, "retrieval_mode": "chunks",
+                                        "retrieve_image_nodes": pipeline["take_screenshot"]},
+        "eval_parameters": {"llm_model": "GPT_4O_MINI"},
+        "llama_parse_parameters": {"take_screenshot": pipeline["take_screenshot"]},
+        "data_sink": None,
+        "created_at": TIMESTAMP,
+        "updated_at": TIMESTAMP,
+    }
+
+
+def file_json(file: dict, base_url: str) -> dict:
+    return {
+        "id": file["id"],
+        "name": file["name"],
+        "external_file_id": file["name"],
+        "file_size": file["size"],
+        "file_type": file["type"],
+        "project_id": PROJECT_ID,
+        "last_modified_at": TIMESTAMP,
+        "resource_info": {"file_size": file["size"], "last_modified_at": TIMESTAMP,
+                          "url": f"{base_url}/_fake/files/{file['id']}/download"},
+        "permission_info": None,
+        "data_source_id": DATA_SOURCE_ID if file.get("pipeline_id") else None,
+        "created_at": TIMESTAMP,
+        "updated_at": TIMESTAMP,
+    }
+
+
+def pipeline_file_json(file: dict, base_url: str, pipeline_id: Optional[str] = None) -> dict:
+    pipeline_id = pipeline_id or file["pipeline_id"]
+    return {**file_json(file, base_url), "id": _id("pipeline-file", pipeline_id, file["id"]), "file_id": file["id"],
+            "pipeline_id": pipeline_id, "custom_metadata": {}, "config_hash": {},
+            "indexed_page_count": file["pages"], "status": "SUCCESS", "status_updated_at": TIMESTAMP}
+
+
+def _node_metadata(corpus: FakeCorpus, chunk: FakeChunk) -> dict:
+    file = corpus.files[chunk.file_id]
+    return {"file_name": file["file_name"], "file_path": file["name"], "file_id": file["id"],
+            "pipeline_id": chunk.pipeline_id, "page_label": chunk.page_index + 1, "file_size": file["size"]}
+
+
+def text_node_json(corpus: FakeCorpus, chunk: FakeChunk) -> dict:
+    return {"id_": chunk.id, "embedding": None, "extra_info": _node_metadata(corpus, chunk),
+            "excluded_embed_metadata_keys": [], "excluded_llm_metadata_keys": [], "relationships": {},
+            "text": chunk.text, "start_char_idx": chunk.start_char_idx, "end_char_idx": chunk.end_char_idx,
+            "text_template": "{metadata_str}\n\n{content}", "metadata_template": "{key}: {value}",
+            "metadata_seperator": "\n", "class_name": "TextNode"}
+
+
+def page_screenshot_json(corpus: FakeCorpus, file_id: str, page_index: int) -> dict:
+    file = corpus.files[file_id]
+    return {"page_index": page_index, "file_id": file_id, "image_size": len(_screenshot(file_id, page_index)),
+            "metadata": {"file_name": file["file_name"], "file_id": file_id, "page_label": page_index + 1}}
+
+
+def image_nodes_json(corpus: FakeCorpus, scored: List[tuple], limit: int) -> List[dict]:
+    nodes, seen = [], set()
+    for score, chunk in scored:
+        key = (chunk.file_id, chunk.page_index)
+        if key in seen or not corpus.pipelines[chunk.pipeline_id]["take_screenshot"]:
+            continue
+        seen.add(key)
+        nodes.append({"node": page_screenshot_json(corpus, chunk.file_id, chunk.page_index), "score": score,
+                      "class_name": "PageScreenshotNodeWithScore"})
+        if len(nodes) >= limit:
+            break
+    return nodes
+
+
+_screenshots = {}
+_screenshots_lock = threading.Lock()
+
+
+def _screenshot(file_id: str, page_index: int) -> bytes:
+    with _screenshots_lock:
+        key = (file_id, page_index)
+        if key not in _screenshots:
+            _screenshots[key] = placeholder_png(320, 240, 120 + zlib.crc32(f"{file_id}:{page_index}".encode()) % 100)
+        return _screenshots[key]
+
+
+class FakeLlamaCloudHandler(BaseHTTPRequestHandler):
+    state: FakeLlamaCloudState = None
+    protocol_version = "HTTP/1.1"
+
+    # (method, path pattern, operation name used for stats and route latency, handler)
+    ROUTES = [
+        ("GET", r"/api/v1/organizations/default", "organization", "get_organization"),
+        ("GET", r"/api/v1/organizations/(?P<id>[^/]+)", "organization", "get_organization"),
+        ("GET", r"/api/v1/projects", "projects", "list_projects"),
+        ("GET", r"/api/v1/projects/(?P<id>[^/]+)", "projects", "get_project"),
+        ("GET", r"/api/v1/pipelines", "pipelines", "search_pipelines"),
+        ("POST", r"/api/v1/pipelines", "pipelines", "create_pipeline"),
+        ("PUT", r"/api/v1/pipelines", "pipelines", "create_pipeline"),
+        ("GET", r"/api/v1/pipelines/(?P<id>[^/]+)", "pipelines", "get_pipeline"),
+        ("PUT", r"/api/v1/pipelines/(?P<id>[^/]+)", "pipelines", "update_pipeline"),
+        ("GET", r"/api/v1/pipelines/(?P<id>[^/]+)/status", "pipeline_status", "pipeline_status"),
+        ("GET", r"/api/v1/pipelines/(?P<id>[^/]+)/files2?", "pipeline_files", "list_pipeline_files"),
+        ("PUT", r"/api/v1/pipelines/(?P<id>[^/]+)/files", "pipeline_files", "add_pipeline_files"),
+        ("GET", r"/api/v1/pipelines/(?P<id>[^/]+)/documents", "pipeline_documents", "list_pipeline_documents"),
+        ("GET", r"/api/v1/pipelines/(?P<id>[^/]+)/data-sources", "data_sources", "list_pipeline_data_sources"),
+        ("PUT", r"/api/v1/pipelines/(?P<id>[^/]+)/data-sources", "data_sources", "list_pipeline_data_sources"),
+        ("POST", r"/api/v1/pipelines/(?P<id>[^/]+)/retrieve", "search", "run_search"),
+        ("POST", r"/api/v1/pipelines/(?P<id>[^/]+)/sync", "sync", "sync_pipeline"),
+        ("GET", r"/api/v1/data-sources", "data_sources", "list_data_sources"),
+        ("POST", r"/api/v1/data-sources", "data_sources", "create_data_source"),
+        ("GET", r"/api/v1/data-sources/(?P<id>[^/]+)", "data_sources", "get_data_source"),
+        ("GET", r"/api/v1/files", "files", "list_files"),
+        ("POST", r"/api/v1/files", "upload", "upload_file"),
+        ("GET", r"/api/v1/files/(?P<id>[^/]+)", "files", "get_file"),
+        ("GET", r"/api/v1/files/(?P<id>[^/]+)/content", "file_url", "read_file_content"),
+        ("GET", r"/api/v1/files/(?P<id>[^/]+)/page_screenshots", "screenshots", "list_page_screenshots"),
+        ("GET", r"/api/v1/files/(?P<id>[^/]+)/page_screenshots/(?P<page>\d+)", "screenshot", "get_page_screenshot"),
+        ("GET", r"/api/v1/retrievers", "retrievers", "list_retrievers"),
+        ("POST", r"/api/v1/retrievers", "retrievers", "create_retriever"),
+        ("PUT", r"/api/v1/retrievers", "retrievers", "upsert_retriever"),
+        ("POST", r"/api/v1/retrievers/retrieve", "retrieve", "direct_retrieve"),
+        ("GET", r"/api/v1/retrievers/(?P<id>[^/]+)", "retrievers", "get_retriever"),
+        ("PUT", r"/api/v1/retrievers/(?P<id>[^/]+)", "retrievers", "update_retriever"),
+        ("DELETE", r"/api/v1/retrievers/(?P<id>[^/]+)", "retrievers", "delete_retriever"),
+        ("POST", r"/api/v1/retrievers/(?P<id>[^/]+)/retrieve", "retrieve", "retrieve"),
+        ("GET", r"/_fake/stats", None, "fake_stats"),
+        ("POST", r"/_fake/config", None, "fake_config"),
+        ("POST", r"/_fake/reset", None, "fake_reset"),
+        ("GET", r"/_fake/files/(?P<id>[^/]+)/download", None, "download_file"),
+    ]
+    COMPILED_ROUTES = [(method, re.compile(pattern + r"/?$"), operation, handler)
+                       for method, pattern, operation, handler in ROUTES]
+
+    def log_message(self, format, *args):
+        logger.debug("FAKE_LLAMACLOUD: " + format % args)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PUT(self):
+        self._dispatch("PUT")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+    @property
+    def corpus(self) -> FakeCorpus:
+        return self.state.corpus
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.headers.get('Host') or '%s:%s' % self.server.server_address[:2]}"
+
+    def _dispatch(self, method: str):
+        url = urlsplit(self.path)
+        self.query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        self.raw_body = self.rfile.read(length) if length else b""
+        for route_method, pattern, operation, handler in self.COMPILED_ROUTES:
+            match = pattern.match(url.path)
+            if route_method != method or match is None:
+                continue
+            if operation is not None:
+                delay, status = self.state.plan(operation, url.path)
+                if delay:
+                    time.sleep(delay)
+                if status is not None:
+                    return self._send_json({"detail": f"Injected failure ({operation})"}, status=status)
+            try:
+                return getattr(self, handler)(**match.groupdict())
+            except KeyError as e:
+                return self._send_json({"detail": f"Not found: {e}"}, status=404)
+            except (ValueError, TypeError) as e:
+                return self._send_json({"detail": str(e)}, status=422)
+        self._send_json({"detail": f"Fake LlamaCloud has no route for {method} {url.path}"}, status=404)
+
+    def _body(self) -> dict:
+        return json.loads(self.raw_body) if self.raw_body else {}
+
+    def _send(self, payload: bytes, content_type: str, status: int = 200):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _send_json(self, payload, status: int = 200):
+        self._send(json.dumps(payload).encode("utf-8"), "application/json", status=status)
+
+    # Organizations and projects
+
+    def get_organization(self, id: Optional[str] = None):
+        self._send_json(organization_json())
+
+    def list_projects(self):
+        name = self.query.get("project_name")
+        self._send_json([project_json()] if name in (None, "Default") else [])
+
+    def get_project(self, id: str):
+        if id != PROJECT_ID:
+            raise KeyError(id)
+        self._send_json(project_json())
+
+    # Pipelines
+
+    def _pipeline(self, id: str) -> dict:
+        return self.corpus.pipelines[id]
+
+    def search_pipelines(self):
+        name = self.query.get("pipeline_name")
+        self._send_json([pipeline_json(pipeline) for pipeline in self.corpus.pipelines.values()
+                         if name is None or pipeline["name"] == name])
+
+    def create_pipeline(self):
+        body = self._body()
+        pipeline_id = _id("pipeline", body["name"])
+        take_screenshot = bool((body.get("llama_parse_parameters") or {}).get("take_screenshot", False))
+        with self.state.lock:
+            pipeline = self.corpus.pipelines.setdefault(pipeline_id, {"id": pipeline_id, "name": body["name"],
+                                                                      "take_screenshot": take_screenshot,
+                                                                      "file_ids": []})
+        self._send_json(pipeline_json(pipeline))
+
+    def get_pipeline(self, id: str):
+        self._send_json(pipeline_json(self._pipeline(id)))
+
+    def update_pipeline(self, id: str):
+        pipeline = self._pipeline(id)
+        body = self._body()
+        with self.state.lock:
+            pipeline["name"] = body.get("name") or pipeline["name"]
+        self._send_json(pipeline_json(pipeline))
+
+    def pipeline_status(self, id: str):
+        self._pipeline(id)
+        self._send_json({"job_id": _id("job", id), "deployment_date": TIMESTAMP, "status": "SUCCESS",
+                         "error": None, "effective_at": TIMESTAMP})
+
+    def list_pipeline_files(self, id: str):
+        files = [pipeline_file_json(self.corpus.files[file_id], self.base_url, pipeline_id=id)
+                 for file_id in self._pipeline(id)["file_ids"]]
+        if self.path.split("?")[0].rstrip("/").endswith("files2"):
+            return self._send_json({"files": files, "total_count": len(files), "limit": len(files), "offset": 0})
+        self._send_json(files)
+
+    def add_pipeline_files(self, id: str):
+        pipeline = self._pipeline(id)
+        added = []
+        with self.state.lock:
+            for entry in self._body() or []:
+                file = self.state.uploads.get(entry["file_id"]) or self.corpus.files[entry["file_id"]]
+                file["pipeline_id"] = id
+                if file["id"] not in pipeline["file_ids"]:
+                    pipeline["file_ids"].append(file["id"])
+                added.append(file)
+        self._send_json([pipeline_file_json(file, self.base_url, pipeline_id=id) for file in added])
+
+    def list_pipeline_documents(self, id: str):
+        skip, limit = int(self.query.get("skip", 0)), int(self.query.get("limit", 100))
+        documents = []
+        for file_id in self._pipeline(id)["file_ids"]:
+            chunks = [chunk for chunk in self.corpus.chunks if chunk.file_id == file_id]
+            metadata = {key: value for key, value in _node_metadata(self.corpus, chunks[0]).items()
+                        if key != "page_label"} if chunks else {}
+            documents.append({"id": _id("document", file_id), "text": "\n".join(chunk.text for chunk in chunks),
+                              "metadata": metadata, "excluded_embed_metadata_keys": [],
+                              "excluded_llm_metadata_keys": [], "page_positions": None})
+        self._send_json(documents[skip:skip + limit])
+
+    def list_pipeline_data_sources(self, id: str):
+        self._pipeline(id)
+        self._send_json([{"id": _id("pipeline-data-source", id), "data_source_id": DATA_SOURCE_ID,
+                          "pipeline_id": id, "last_synced_at": TIMESTAMP, "sync_interval": 43200.0,
+                          **{key: value for key, value in self.state.data_sources[DATA_SOURCE_ID].items()
+                             if key != "id"}}])
+
+    def run_search(self, id: str):
+        pipeline = self._pipeline(id)
+        body = self._body()
+        top_k = int(body.get("dense_similarity_top_k") or DEFAULT_TOP_K)
+        started = time.perf_counter()
+        scored = self.corpus.search([id], body.get("query", ""), top_k=top_k)
+        images = (image_nodes_json(self.corpus, scored, top_k)
+                  if body.get("retrieve_image_nodes") and pipeline["take_screenshot"] else [])
+        self._send_json({
+            "pipeline_id": id,
+            "retrieval_nodes": [{"node": text_node_json(self.corpus, chunk), "score": score,
+                                 "class_name": "NodeWithScore"} for score, chunk in scored],
+            "image_nodes": images,
+            "retrieval_latency": {"dense": time.perf_counter() - started},
+            "metadata": {},
+            "inferred_search_filters": None,
+            "class_name": "RetrieveResults",
+        })
+
+    def sync_pipeline(self, id: str):
+        self._send_json(pipeline_json(self._pipeline(id)))
+
+    # Data sources
+
+    def list_data_sources(self):
+        self._send_json(list(self.state.data_sources.values()))
+
+    def create_data_source(self):
+        body = self._body()
+        data_source_id = _id("data-source", body["name"])
+        data_source = {"id": data_source_id, "name": body["name"], "source_type": body.get("source_type"),
+                       "project_id": PROJECT_ID, "component": body.get("component") or {},
+                       "custom_metadata": body.get("custom_metadata") or {},
+                       "created_at": TIMESTAMP, "updated_at": TIMESTAMP}
+        with self.state.lock:
+            self.state.data_sources[data_source_id] = data_source
+        self._send_json(data_source)
+
+    def get_data_source(self, id: str):
+        self._send_json(self.state.data_sources[id])
+
+    # Files
+
+    def _file(self, id: str) -> dict:
+        return self.state.uploads.get(id) or self.corpus.files[id]
+
+    def list_files(self):
+        files = list(self.corpus.files.values()) + list(self.state.uploads.values())
+        self._send_json([file_json(file, self.base_url) for file in files])
+
+    def get_file(self, id: str):
+        self._send_json(file_json(self._file(id), self.base_url))
+
+    def upload_file(self):
+        # The multipart body is not parsed beyond the file name; uploads are listed but not searchable
+        match = re.search(rb'filename="([^"]+)"', self.raw_body)
+        name = match.group(1).decode("utf-8") if match else f"upload-{len(self.state.uploads)}"
+        file_id = _id("upload", name)
+        file = {"id": file_id, "name": name, "file_name": name.split("/")[-1], "path": None,
+                "size": len(self.raw_body), "type": name.rsplit(".", 1)[-1].lower(), "pages": 1, "pipeline_id": None}
+        with self.state.lock:
+            self.state.uploads[file_id] = file
+        self._send_json(file_json(file, self.base_url))
+
+    def read_file_content(self, id: str):
+        self._file(id)
+        expires_in = int(self.query.get("expires_at_seconds") or 3600)
+        self._send_json({"url": f"{self.base_url}/_fake/files/{id}/download?expires_in={expires_in}",
+                         "expires_at": TIMESTAMP, "form_fields": None})
+
+    def download_file(self, id: str):
+        file = self._file(id)
+        payload = file["path"].read_bytes() if file.get("path") else b""
+        content_type = "application/pdf" if file["type"] == "pdf" else "text/plain"
+        self._send(payload, content_type)
+
+    def list_page_screenshots(self, id: str):
+        file = self._file(id)
+        pipeline = self.corpus.pipelines.get(file.get("pipeline_id"))
+        if pipeline is None or not pipeline["take_screenshot"]:
+            return self._send_json([])
+        self._send_json([page_screenshot_json(self.corpus, id, page_index) for page_index in range(file["pages"])])
+
+    def get_page_screenshot(self, id: str, page: str):
+        file = self._file(id)
+        if int(page) >= file["pages"]:
+            raise KeyError(f"page {page}")
+        self._send(_screenshot(id, int(page)), "image/png")
+
+    # Retrievers
+
+    def _retriever_json(self, retriever: dict) -> dict:
+        return {"id": retriever["id"], "name": retriever["name"], "project_id": PROJECT_ID,
+                "pipelines": retriever["pipelines"], "created_at": TIMESTAMP, "updated_at": TIMESTAMP}
+
+    def _normalize_pipelines(self, pipelines) -> List[dict]:
+        normalized = []
+        for entry in pipelines or []:
+            pipeline = self._pipeline(entry["pipeline_id"])
+            normalized.append({"name": entry.get("name") or pipeline["name"],
+                               "description": entry.get("description"),
+                               "pipeline_id": pipeline["id"],
+                               "preset_retrieval_parameters": entry.get("preset_retrieval_parameters") or {}})
+        return normalized
+
+    def list_retrievers(self):
+        name = self.query.get("name")
+        with self.state.lock:
+            retrievers = list(self.state.retrievers.values())
+        self._send_json([self._retriever_json(retriever) for retriever in retrievers
+                         if name is None or retriever["name"] == name])
+
+    def create_retriever(self, replace: bool = True):
+        body = self._body()
+        retriever = self.state.add_retriever(body["name"], self._normalize_pipelines(body.get("pipelines")),
+                                             replace=replace)
+        self._send_json(self._retriever_json(retriever))
+
+    def upsert_retriever(self):
+        self.create_retriever(replace=False)
+
+    def get_retriever(self, id: str):
+        with self.state.lock:
+            retriever = self.state.retrievers[id]
+        self._send_json(self._retriever_json(retriever))
+
+    def update_retriever(self, id: str):
+        body = self._body()
+        with self.state.lock:
+            retriever = self.state.retrievers[id]
+            if body.get("name"):
+                retriever["name"] = body["name"]
+            if body.get("pipelines") is not None:
+                retriever["pipelines"] = self._normalize_pipelines(body["pipelines"])
+        self._send_json(self._retriever_json(retriever))
+
+    def delete_retriever(self, id: str):
+        with self.state.lock:
+            self.state.retrievers.pop(id)
+        self._send_json({})
+
+    def _composite_retrieve(self, retriever_id: Optional[str], pipelines: List[dict], body: dict):
+        query = body.get("query", "")
+        mode = str(body.get("mode") or "full").lower()
+        rerank_top_n = int(body.get("rerank_top_n") or DEFAULT_RERANK_TOP_N)
+        if mode == "routing" and pipelines:
+            # Route to the single index whose best chunk matches the query best
+            best = max(pipelines, key=lambda entry: (self.corpus.search([entry["pipeline_id"]], query, top_k=1)
+                                                     or [(0.0, None)])[0][0])
+            pipelines = [best]
+
+        text_nodes, image_nodes = [], []
+        for entry in pipelines:
+            params = entry.get("preset_retrieval_parameters") or {}
+            scored = self.corpus.search([entry["pipeline_id"]], query,
+                                        top_k=int(params.get("dense_similarity_top_k") or entry.get("top_k")
+                                                  or DEFAULT_TOP_K))
+            for score, chunk in scored:
+                node = {"id": chunk.id, "retriever_id": retriever_id, "retriever_pipeline_name": entry["name"],
+                        "pipeline_id": chunk.pipeline_id, "metadata": _node_metadata(self.corpus, chunk),
+                        "text": chunk.text, "start_char_idx": chunk.start_char_idx,
+                        "end_char_idx": chunk.end_char_idx}
+                text_nodes.append({"node": node, "score": score, "class_name": "CompositeRetrievedTextNodeWithScore"})
+            if params.get("retrieve_image_nodes") and self.corpus.pipelines[entry["pipeline_id"]]["take_screenshot"]:
+                image_nodes.extend(image_nodes_json(self.corpus, scored, rerank_top_n))
+
+        # The global rerank is approximated by the keyword score
+        text_nodes.sort(key=lambda item: (-item["score"], item["node"]["id"]))
+        image_nodes.sort(key=lambda item: -item["score"])
+        self._send_json({"nodes": text_nodes[:rerank_top_n], "image_nodes": image_nodes[:rerank_top_n]})
+
+    def retrieve(self, id: str):
+        with self.state.lock:
+            retriever = self.state.retrievers[id]
+        self._composite_retrieve(id, retriever["pipelines"], self._body())
+
+    def direct_retrieve(self):
+        body = self._body()
+        entries = body.get("pipelines") or []
+        pipelines = [{**normalized, "top_k": entry.get("top_k")}
+                     for normalized, entry in zip(self._normalize_pipelines(entries), entries)]
+        self._composite_retrieve(None, pipelines, body)
+
+    # Control endpoints for benchmarks and load tests
+
+    def fake_stats(self):
+        self._send_json(self.state.stats())
+
+    def fake_config(self):
+        self.state.config.update(self._body())
+        self._send_json(asdict(self.state.config))
+
+    def fake_reset(self):
+        self.state.reset()
+        self._send_json(self.state.stats())
+
+
+_corpora = {}
+_corpora_lock = threading.Lock()
+
+
+def get_fake_corpus(root: Path = CORPUS_ROOT) -> FakeCorpus:
+    """Parsing the PDFs takes a few seconds, so servers in one process share the corpus"""
+    with _corpora_lock:
+        key = str(Path(root).resolve())
+        if key not in _corpora:
+            _corpora[key] = FakeCorpus(root)
+        return _corpora[key]
+
+
+class FakeLlamaCloudServer:
+    """Runs the fake in a background thread; use as a context manager or call start()/stop()"""
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, config: Optional[FakeConfig] = None,
+                 corpus_root: Path = CORPUS_ROOT, corpus: Optional[FakeCorpus] = None):
+        self.state = FakeLlamaCloudState(corpus or get_fake_corpus(corpus_root), config or FakeConfig.from_env())
+        handler = type("BoundFakeLlamaCloudHandler", (FakeLlamaCloudHandler,), {"state": self.state})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> str:
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="fake-llamacloud", daemon=True)
+        self.thread.start()
+        logger.info(f"FAKE_LLAMACLOUD: Serving on {self.base_url}")
+        return self.base_url
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a fake LlamaCloud API over the sample board documents")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=int(os.getenv("PROOF_FAKE_LLAMACLOUD_PORT", "8787")))
+    parser.add_argument("--corpus", default=str(CORPUS_ROOT), help="Folder whose subfolders become pipelines")
+    defaults = FakeConfig.from_env()
+    parser.add_argument("--latency-ms", type=float, default=defaults.latency_ms)
+    parser.add_argument("--jitter-ms", type=float, default=defaults.jitter_ms)
+    parser.add_argument("--slow-rate", type=float, default=defaults.slow_rate)
+    parser.add_argument("--slow-ms", type=float, default=defaults.slow_ms)
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate)
+    parser.add_argument("--error-status", type=int, default=defaults.error_status)
+    parser.add_argument("--error-paths", default=defaults.error_paths, help="Regex limiting injected faults to matching paths")
+    parser.add_argument("--route-latency", action="append", default=[], metavar="OPERATION=MS",
+                        help="Extra latency per operation, e.g. retrieve=400 (repeatable)")
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    config = FakeConfig(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, slow_rate=args.slow_rate,
+                        slow_ms=args.slow_ms, error_rate=args.error_rate, error_status=args.error_status,
+                        error_paths=args.error_paths, seed=args.seed,
+                        route_latency_ms={operation: float(ms) for operation, ms in
+                                          (item.split("=", 1) for item in args.route_latency)})
+    server = FakeLlamaCloudServer(host=args.host, port=args.port, config=config, corpus_root=Path(args.corpus))
+    print(f"Fake LlamaCloud on {server.base_url}; set LLAMA_CLOUD_BASE_URL={server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
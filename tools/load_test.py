@@ -0,0 +1,240 @@
+#Multi-session load test: drives simulated directors through app.py with Streamlit's AppTest in one process
+#Run with: python -m tools.load_test [--sessions 1,2,4,8,16,32] [--turns 2] [--llamacloud-latency-ms 80]
+#Uses the fake LlamaCloud server and a mock LLM unless --llamacloud-url is given
+
+import os
+
+# Set before the app's modules are imported so every simulated session is fully offline
+os.environ.setdefault("PROOF_FAKE_LLM", "1")
+os.environ.setdefault("LLAMA_CLOUD_API_KEY", "fake-llamacloud-key")
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional
+import argparse
+import json
+import logging
+import random
+import resource
+import sys
+import time
+
+from streamlit.runtime import Runtime
+from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+from streamlit.runtime.media_file_manager import MediaFileManager
+from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+from streamlit.runtime.secrets import Secrets
+from unittest.mock import MagicMock
+import streamlit as st
+
+from tools.fake_llamacloud import FakeConfig, FakeLlamaCloudServer
+from tools.signed_in_app import clear_unselected_button_groups, signed_in_app_test
+from utils.precompute import load_common_queries_config
+from utils.session_metrics import get_session_metrics
+
+logger = logging.getLogger(__name__)
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+APP_PATH = REPO_ROOT / "app.py"
+LOAD_TEST_DIR = Path(os.getenv("PROOF_CACHE_DIR", ".proof_cache")) / "load_tests"
+FREE_FORM_QUESTIONS = [
+    "What was approved in the most recent budget?",
+    "Summarize the investment committee's latest report",
+    "Which risks were escalated to the board this year?",
+    "What changed in member benefits since last year?",
+    "Who presented at the last board meeting and on what?",
+    "What are the open action items from the risk oversight committee?",
+]
+# A level is past the knee once adding sessions buys less than this share of linear throughput growth
+KNEE_EFFICIENCY = 0.5
+# ...or once p95 latency is this many times the single-session p95
+KNEE_LATENCY_FACTOR = 2.0
+
+
+def rss_mb() -> float:
+    """Current resident set size; falls back to the peak where /proc is unavailable"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux kilobytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def share_one_runtime():
+    """
+    AppTest installs a mock Runtime and the app's secrets for each script run and removes them when the run
+    ends, under any other session still running; here every session shares one, as on a real server
+    """
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime.instance = classmethod(lambda cls: runtime)
+    Runtime.exists = classmethod(lambda cls: True)
+
+    secrets = Secrets()
+    secrets._secrets = {"LLAMA_CLOUD_API_KEY": os.environ["LLAMA_CLOUD_API_KEY"],
+                        "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "fake-openai-key")}
+    st.secrets = secrets
+
+
+def _percentile(values, p):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+class SimulatedSession:
+    """One director: signs in, asks common and free-form questions, opens a reference and resets the chat"""
+    def __init__(self, index: int, args, rng: random.Random):
+        self.index = index
+        self.args = args
+        self.rng = rng
+        self.timings = []
+        self.errors = []
+        self.app = None
+
+    def _step(self, action: str, run):
+        start = time.perf_counter()
+        try:
+            clear_unselected_button_groups(self.app)
+            run()
+            exceptions = [str(exception.value) for exception in self.app.exception]
+            if exceptions:
+                self.errors.append({"action": action, "error": exceptions[0]})
+        except Exception as e:
+            self.errors.append({"action": action, "error": f"{type(e).__name__}: {e}"})
+        self.timings.append({"action": action, "ms": 1000 * (time.perf_counter() - start)})
+
+    def _open_reference(self):
+        buttons = [button for button in self.app.button
+                   if button.key and button.key.endswith("_expand_summary_button")]
+        if not buttons:
+            raise LookupError("No text reference to open")
+        self.rng.choice(buttons).click().run()
+
+    def _reset_chat(self):
+        # st.pills is exposed as a button group in AppTest
+        self.app.button_group(key="settings_pills").set_value(["Reset Chat"]).run()
+
+    def run(self):
+        queries = load_common_queries_config()["queries"]
+        # Each director signs in as their own user with their own session id
+        self.app = signed_in_app_test(str(APP_PATH), f"director{self.index:03d}@example.com",
+                                      default_timeout=self.args.timeout)
+        self._step("load", self.app.run)
+        for _ in range(self.args.turns):
+            query_index = self.rng.randrange(len(queries))
+            self._step("common_query", lambda: self.app.button(key=f"common_query_{query_index}").click().run())
+            self._step("question", lambda: self.app.chat_input[0].set_value(self.rng.choice(FREE_FORM_QUESTIONS)).run())
+            self._step("open_reference", self._open_reference)
+        self._step("reset_chat", self._reset_chat)
+
+
+def run_level(sessions: int, args) -> dict:
+    rss_before = rss_mb()
+    # Sessions from earlier levels stay in the metrics until they go stale
+    earlier_sessions = {entry["session"] for entry in get_session_metrics().active()}
+    simulated = [SimulatedSession(index, args, random.Random(args.seed * 1000 + index)) for index in range(sessions)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions, thread_name_prefix="load-session") as pool:
+        list(pool.map(lambda session: session.run(), simulated))
+    wall_seconds = time.perf_counter() - start
+    # Sessions still hold their state here, so the RSS growth is what they cost
+    rss_after = rss_mb()
+
+    timings = [timing for session in simulated for timing in session.timings]
+    by_action = {}
+    for action in dict.fromkeys(timing["action"] for timing in timings):
+        values = [timing["ms"] for timing in timings if timing["action"] == action]
+        by_action[action] = {"count": len(values), "p50_ms": round(_percentile(values, 50), 1),
+                             "p95_ms": round(_percentile(values, 95), 1), "max_ms": round(max(values), 1)}
+    all_ms = [timing["ms"] for timing in timings]
+    errors = [error for session in simulated for error in session.errors]
+    result = {
+        "sessions": sessions,
+        "actions": len(timings),
+        "wall_seconds": round(wall_seconds, 2),
+        "throughput_per_second": round(len(timings) / wall_seconds, 3),
+        "p50_ms": round(_percentile(all_ms, 50), 1),
+        "p95_ms": round(_percentile(all_ms, 95), 1),
+        "p99_ms": round(_percentile(all_ms, 99), 1),
+        "by_action": by_action,
+        "errors": len(errors),
+        "error_samples": errors[:5],
+        "rss_before_mb": round(rss_before, 1),
+        "rss_after_mb": round(rss_after, 1),
+        "rss_per_session_mb": round((rss_after - rss_before) / sessions, 2),
+        "session_sizes": [entry for entry in get_session_metrics().active()
+                          if entry["session"] not in earlier_sessions],
+    }
+    print(f"{sessions:>4} sessions  {result['throughput_per_second']:>7.2f} actions/s  p50 {result['p50_ms']:>8.0f} ms  "
+          f"p95 {result['p95_ms']:>8.0f} ms  errors {len(errors):>3}  rss {rss_after:>7.0f} MB "
+          f"(+{result['rss_per_session_mb']:.1f} MB/session)")
+    return result
+
+
+def find_knee(levels: List[dict]) -> Optional[int]:
+    """First session count where throughput stops scaling or tail latency blows up"""
+    if not levels:
+        return None
+    base = levels[0]
+    for previous, level in zip(levels, levels[1:]):
+        linear_gain = previous["throughput_per_second"] * (level["sessions"] / previous["sessions"] - 1)
+        actual_gain = level["throughput_per_second"] - previous["throughput_per_second"]
+        if linear_gain > 0 and actual_gain < KNEE_EFFICIENCY * linear_gain:
+            return level["sessions"]
+        if level["p95_ms"] > KNEE_LATENCY_FACTOR * base["p95_ms"]:
+            return level["sessions"]
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test app.py with concurrent simulated sessions")
+    parser.add_argument("--sessions", default="1,2,4,8,16,32", help="Comma separated session counts to ramp through")
+    parser.add_argument("--turns", type=int, default=2, help="Common query, question and reference rounds per session")
+    parser.add_argument("--timeout", type=float, default=120, help="Seconds allowed per script run")
+    parser.add_argument("--llamacloud-url", default=None, help="Use this backend instead of the fake server")
+    parser.add_argument("--llamacloud-latency-ms", type=float, default=80.0)
+    parser.add_argument("--llamacloud-jitter-ms", type=float, default=40.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    share_one_runtime()
+    # app.py loads its assets relative to the repository root
+    os.chdir(REPO_ROOT)
+    server = None
+    if args.llamacloud_url:
+        os.environ["LLAMA_CLOUD_BASE_URL"] = args.llamacloud_url
+    else:
+        server = FakeLlamaCloudServer(config=FakeConfig(latency_ms=args.llamacloud_latency_ms,
+                                                        jitter_ms=args.llamacloud_jitter_ms, seed=args.seed))
+        os.environ["LLAMA_CLOUD_BASE_URL"] = server.start()
+
+    levels = []
+    try:
+        for sessions in [int(value) for value in args.sessions.split(",")]:
+            levels.append(run_level(sessions, args))
+    finally:
+        if server is not None:
+            server.stop()
+
+    knee = find_knee(levels)
+    print(f"Performance falls off at {knee} sessions" if knee else "No knee found in the tested range")
+    report = {"created_at": time.time(), "args": vars(args), "knee_sessions": knee, "levels": levels,
+              "backend_requests": server.state.stats()["requests"] if server is not None else None}
+    output = Path(args.output) if args.output else LOAD_TEST_DIR / f"load-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, default=str))
+    print(f"Report written to {output}")
+
+
+if __name__ == "__main__":
+    main()
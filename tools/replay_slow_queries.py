@@ -0,0 +1,174 @@
+#Replays captured slow queries so production regressions become reproducible benchmark cases
+#Run with: python -m tools.replay_slow_queries [--backend recorded|live|service] [--llm mock|openai]
+
+from llama_index.core.llms import ChatMessage, MessageRole
+from llama_index.core.llms.mock import MockLLM
+from llama_index.core.schema import NodeWithScore, TextNode
+from pathlib import Path
+from typing import Optional
+import argparse
+import json
+import logging
+import os
+import statistics
+import time
+
+from pipeline.memory import RollingSummaryMemory
+from pipeline.slow_queries import SLOW_QUERY_LOG_PATH, read_slow_queries
+from pipeline.tracing import span
+from utils.llama_chatbot import LLM_MODEL, build_chat_engine
+from utils.node_processor import process_nodes
+
+logger = logging.getLogger(__name__)
+
+
+class RecordedRAGService:
+    """Stand-in for RAGService that answers retrievals with the nodes captured in a slow-query record"""
+    def __init__(self, record: dict):
+        self.record = record
+        self.organization_id = "recorded"
+        self.project_id = "recorded"
+        self.indices = {}
+        self.index_version = "recorded"
+        self.file_id_name_dict = {}
+
+    def _nodes(self, images: bool):
+        retrievals = self.record.get("retrievals") or []
+        # References retrieval (images) is logged after the text retrieval used by the answer
+        retrieval = retrievals[-1] if images and retrievals else (retrievals[0] if retrievals else {})
+        # Same stage name as RAGService so captured and replayed stage timings line up
+        with span("retrieval", retriever="recorded", store=retrieval.get("store"), images=images) as retrieval_span:
+            nodes = self._recorded_nodes(retrieval)
+            if retrieval_span is not None:
+                retrieval_span.set_attribute("node_ids", [node.node.node_id for node in nodes])
+            return nodes
+
+    @staticmethod
+    def _recorded_nodes(retrieval: dict):
+        return [NodeWithScore(node=TextNode(id_=node["id"], text=node.get("text") or "",
+                                            metadata={"file_name": node.get("file_name"),
+                                                      "file_id": node.get("file_id")}),
+                              score=node.get("score"))
+                for node in retrieval.get("nodes") or []]
+
+    def composite_retrieval(self, query_text: str, store: Optional[str] = None):
+        return self._nodes(images=False)
+
+    def multi_modal_composite_retrieval(self, query_text: str, store: Optional[str] = None):
+        return self._nodes(images=True)
+
+    def summary_retrieval(self, query_text: str, top_k: int = 5):
+        return []
+
+    def get_file_content_url(self, file_id: str, expires_in_seconds: int = 3600):
+        return None
+
+
+def build_backend(args, record: dict):
+    if args.backend == "recorded":
+        return RecordedRAGService(record)
+    if args.backend == "service":
+        from pipeline.remote import RemoteRAGService
+        return RemoteRAGService(service_url=args.service_url)
+    from pipeline.pipeline import RAGService
+    return RAGService(llama_cloud_api_key=os.environ["LLAMA_CLOUD_API_KEY"])
+
+
+def build_replay_llm(name: str):
+    if name == "mock":
+        # Deterministic and free; isolates retrieval and local pipeline latency from the LLM
+        return MockLLM(max_tokens=256)
+    from pipeline.rate_limit import RateLimitedOpenAI
+    return RateLimitedOpenAI(model=LLM_MODEL)
+
+
+def replay_record(record: dict, rag_service, llm) -> dict:
+    start = time.perf_counter()
+    with span("replay", kind=record["kind"]) as root:
+        if record["kind"] == "references":
+            nodes = rag_service.multi_modal_composite_retrieval(record["prompt"], store=record.get("store")) or []
+            process_nodes(nodes, rag_service)
+        else:
+            # The trace holds raw turns, not the live summary; without a summarizer they are cut to the token limit
+            memory = RollingSummaryMemory()
+            for message in record.get("history") or []:
+                memory.put(ChatMessage(role=MessageRole(message["role"]), content=message["content"]))
+            chat_engine = build_chat_engine(rag_service=rag_service, llm=llm, memory=memory,
+                                            store_fn=lambda: record.get("store"))
+            nodes = chat_engine.chat(record["prompt"]).source_nodes
+    duration = time.perf_counter() - start
+
+    # What was retrieved, before the answer's context packing; backends without retrieval spans report the result
+    result_nodes = [node.node.node_id for node in nodes or []]
+    if root is None:
+        # PROOF_TRACING=0: no stage breakdown, only the total
+        return {"duration_ms": round(1000 * duration, 3), "stages_ms": {}, "node_ids": result_nodes,
+                "condensed_query": None}
+    replay_nodes = [node_id for child in root.children if child["name"] == "retrieval"
+                    for node_id in child["attributes"].get("node_ids", [])] or result_nodes
+    stages_ms = {}
+    for child in root.children:
+        stages_ms[child["name"]] = round(stages_ms.get(child["name"], 0) + child["duration_ms"], 3)
+    condensed = [child["attributes"].get("condensed_query") for child in root.children if child["name"] == "condense"]
+    return {"duration_ms": round(1000 * root.duration, 3), "stages_ms": stages_ms,
+            "node_ids": replay_nodes, "condensed_query": condensed[0] if condensed else None}
+
+
+def node_overlap(captured: list, replayed: list) -> Optional[float]:
+    if not captured:
+        return None
+    return len(set(captured) & set(replayed)) / len(set(captured))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay captured slow queries")
+    parser.add_argument("--log", default=str(SLOW_QUERY_LOG_PATH))
+    parser.add_argument("--backend", choices=["recorded", "live", "service"], default="recorded")
+    parser.add_argument("--service-url", default=os.getenv("PROOF_RAG_SERVICE_URL"))
+    parser.add_argument("--llm", choices=["mock", "openai"], default="mock")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per query; the median is reported")
+    parser.add_argument("--limit", type=int, default=None, help="Replay only the most recent N records")
+    parser.add_argument("--output", default=None, help="Write per-query results as JSON lines")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    records = read_slow_queries(Path(args.log))
+    if args.limit:
+        records = records[-args.limit:]
+    if not records:
+        print(f"No slow queries recorded in {args.log}")
+        return
+
+    llm = build_replay_llm(args.llm)
+    shared_backend = None if args.backend == "recorded" else build_backend(args, {})
+    results = []
+    for record in records:
+        rag_service = shared_backend or build_backend(args, record)
+        runs = [replay_record(record, rag_service, llm) for _ in range(args.repeat)]
+        median_ms = statistics.median(run["duration_ms"] for run in runs)
+        captured_nodes = [node["id"] for retrieval in record.get("retrievals", []) for node in retrieval.get("nodes") or []]
+        result = {
+            "trace_id": record["trace_id"],
+            "kind": record["kind"],
+            "prompt": record["prompt"],
+            "captured_ms": record["duration_ms"],
+            "replay_median_ms": median_ms,
+            "captured_stages_ms": record["stages_ms"],
+            "replay_stages_ms": runs[-1]["stages_ms"],
+            "node_overlap": node_overlap(captured_nodes, runs[-1]["node_ids"]),
+            "captured_condensed_query": record.get("condensed_query"),
+            "replay_condensed_query": runs[-1]["condensed_query"],
+        }
+        results.append(result)
+        overlap = "n/a" if result["node_overlap"] is None else f"{result['node_overlap']:.2f}"
+        print(f"{record['kind']:<10} captured {record['duration_ms']:>9.0f} ms  replay {median_ms:>9.0f} ms  "
+              f"overlap {overlap:>4}  {record['prompt']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            for result in results:
+                f.write(json.dumps(result) + "\n")
+
+
+if __name__ == "__main__":
+    main()
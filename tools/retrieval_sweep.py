@@ -0,0 +1,241 @@
+#Retrieval quality vs latency sweep over the golden questions in assets/golden_questions.json
+#Run with: python -m tools.retrieval_sweep [--modes full,routing] [--rerank-top-n 3,5,10] [--top-k 3,5,10]
+#Uses the fake LlamaCloud server unless --llamacloud-url is given; writes JSON and an SVG chart to .proof_cache/retrieval_sweeps/
+
+import os
+
+os.environ.setdefault("LLAMA_CLOUD_API_KEY", "fake-llamacloud-key")
+
+from pathlib import Path
+from typing import Callable, List, Optional
+import argparse
+import json
+import logging
+import statistics
+import time
+
+from llama_index.core.schema import NodeWithScore, TextNode
+from llama_index.core.utils import get_tokenizer
+
+from pipeline.pipeline import RERANK_TOP_N, RETRIEVAL_MODE, RAGService
+from tools.fake_llamacloud import FakeConfig, FakeLlamaCloudServer
+
+logger = logging.getLogger(__name__)
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+GOLDEN_QUESTIONS_PATH = REPO_ROOT / "assets" / "golden_questions.json"
+SWEEP_DIR = Path(os.getenv("PROOF_CACHE_DIR", ".proof_cache")) / "retrieval_sweeps"
+RECALL_KS = (1, 3, 5)
+# Same setting as MIN_SOURCE_SCORE in ui/sources.py, read here so the sweep doesn't import the UI
+MIN_SOURCE_SCORE = float(os.getenv("PROOF_MIN_SOURCE_SCORE", "0.08"))
+DEFAULT_CUTOFFS = (0.0, 0.05, 0.08, 0.15, 0.3)
+
+
+def load_golden_questions(path: Optional[Path] = None) -> List[dict]:
+    with open(path or GOLDEN_QUESTIONS_PATH, "r") as f:
+        return json.load(f)["questions"]
+
+
+def _file_name(node_with_score) -> str:
+    # LlamaCloud reports file names with or without the data source folder path
+    return Path(node_with_score.node.metadata.get("file_name") or "").name
+
+
+def ranked_files(nodes_with_scores) -> List[str]:
+    """Distinct source files in rank order"""
+    files = []
+    for node_with_score in nodes_with_scores:
+        name = _file_name(node_with_score)
+        if name and name not in files:
+            files.append(name)
+    return files
+
+
+def score_question(nodes_with_scores, expected_files: List[str], cutoff: float, count_tokens: Callable) -> dict:
+    """Recall@k and reciprocal rank over the distinct files that survive the reference score cutoff"""
+    kept = [node for node in nodes_with_scores if (node.score or 0) >= cutoff]
+    files = ranked_files(kept)
+    expected = set(expected_files)
+    rank = next((index + 1 for index, name in enumerate(files) if name in expected), None)
+    return {
+        **{f"recall@{k}": len(expected & set(files[:k])) / len(expected) for k in RECALL_KS},
+        "reciprocal_rank": 1 / rank if rank else 0.0,
+        "nodes": len(kept),
+        "context_tokens": sum(count_tokens(node.node.get_content()) for node in kept),
+    }
+
+
+class LlamaCloudConfig:
+    """One composite retrieval setting, queried through direct retrieval so no cache or retriever state is involved"""
+    def __init__(self, rag: RAGService, mode: str, rerank_top_n: int, top_k: int):
+        self.rag = rag
+        self.params = {"retriever": "llamacloud", "mode": mode, "rerank_top_n": rerank_top_n, "top_k": top_k}
+        self.pipeline_ids = list(rag.indices.values())
+
+    def retrieve(self, question: str):
+        result = self.rag.direct_retrieve(pipeline_ids=self.pipeline_ids, query=question,
+                                          mode=self.params["mode"], rerank_top_n=self.params["rerank_top_n"],
+                                          top_k_per_pipeline=self.params["top_k"], project_id=self.rag.project_id,
+                                          raw_response=True)
+        return [NodeWithScore(node=TextNode(id_=item.node.id, text=item.node.text, metadata=item.node.metadata or {}),
+                              score=item.score)
+                for item in result.nodes or []]
+
+
+class SummaryConfig:
+    """The local summary index that SummaryFirstRetriever answers overview questions from"""
+    def __init__(self, rag: RAGService, top_k: int):
+        self.rag = rag
+        self.params = {"retriever": "summary", "mode": "local", "rerank_top_n": None, "top_k": top_k}
+
+    def retrieve(self, question: str):
+        return self.rag.summary_retrieval(question, top_k=self.params["top_k"])
+
+
+def evaluate(config, questions: List[dict], cutoffs, count_tokens: Callable) -> List[dict]:
+    """Runs every question once and scores the results at each cutoff; latency is shared across cutoffs"""
+    latencies, results = [], []
+    for question in questions:
+        start = time.perf_counter()
+        try:
+            nodes = config.retrieve(question["question"]) or []
+        except Exception as e:
+            logger.warning(f"RETRIEVAL_SWEEP: {config.params} failed on '{question['question']}': {e}")
+            nodes = []
+        latencies.append(1000 * (time.perf_counter() - start))
+        results.append(nodes)
+
+    rows = []
+    for cutoff in cutoffs:
+        scores = [score_question(nodes, question["expected_files"], cutoff, count_tokens)
+                  for nodes, question in zip(results, questions)]
+        row = {**config.params, "cutoff": cutoff,
+               "mrr": round(statistics.fmean(score["reciprocal_rank"] for score in scores), 4),
+               "context_tokens": round(statistics.fmean(score["context_tokens"] for score in scores), 1),
+               "nodes": round(statistics.fmean(score["nodes"] for score in scores), 2),
+               "latency_p50_ms": round(statistics.median(latencies), 1),
+               "latency_p95_ms": round(sorted(latencies)[min(len(latencies) - 1, int(0.95 * len(latencies)))], 1)}
+        for k in RECALL_KS:
+            row[f"recall@{k}"] = round(statistics.fmean(score[f"recall@{k}"] for score in scores), 4)
+        rows.append(row)
+    return rows
+
+
+def pareto_front(rows: List[dict]) -> List[dict]:
+    """Settings no other setting beats on MRR without costing more tokens or latency"""
+    def dominates(a, b):
+        no_worse = (a["mrr"] >= b["mrr"] and a["context_tokens"] <= b["context_tokens"]
+                    and a["latency_p50_ms"] <= b["latency_p50_ms"])
+        better = (a["mrr"] > b["mrr"] or a["context_tokens"] < b["context_tokens"]
+                  or a["latency_p50_ms"] < b["latency_p50_ms"])
+        return no_worse and better
+    return [row for row in rows if not any(dominates(other, row) for other in rows)]
+
+
+def _label(row: dict) -> str:
+    if row["retriever"] == "summary":
+        return f"summary k={row['top_k']} cut={row['cutoff']}"
+    return f"{row['mode']} rerank={row['rerank_top_n']} k={row['top_k']} cut={row['cutoff']}"
+
+
+def render_svg(rows: List[dict], front: List[dict], width: int = 900, height: int = 560) -> str:
+    """MRR against context tokens; marker size is p50 latency and the Pareto front is labelled"""
+    margin = 70
+    max_tokens = max(row["context_tokens"] for row in rows) or 1
+    max_latency = max(row["latency_p50_ms"] for row in rows) or 1
+    front_ids = {id(row) for row in front}
+
+    def x(tokens):
+        return margin + (width - 2 * margin) * tokens / max_tokens
+
+    def y(mrr):
+        return height - margin - (height - 2 * margin) * mrr
+
+    parts = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" font-family="sans-serif" font-size="11">',
+             f'<rect width="{width}" height="{height}" fill="white"/>',
+             f'<line x1="{margin}" y1="{height - margin}" x2="{width - margin}" y2="{height - margin}" stroke="black"/>',
+             f'<line x1="{margin}" y1="{margin}" x2="{margin}" y2="{height - margin}" stroke="black"/>',
+             f'<text x="{width / 2}" y="{height - 25}" text-anchor="middle">Mean context tokens per question (max {max_tokens:.0f})</text>',
+             f'<text x="20" y="{height / 2}" transform="rotate(-90 20 {height / 2})" text-anchor="middle">MRR</text>']
+    for tick in (0.0, 0.25, 0.5, 0.75, 1.0):
+        parts.append(f'<text x="{margin - 8}" y="{y(tick) + 4}" text-anchor="end">{tick:.2f}</text>')
+    for row in rows:
+        color = {"full": "#1f77b4", "routing": "#ff7f0e"}.get(row["mode"], "#2ca02c")
+        radius = 3 + 9 * row["latency_p50_ms"] / max_latency
+        on_front = id(row) in front_ids
+        parts.append(f'<circle cx="{x(row["context_tokens"]):.1f}" cy="{y(row["mrr"]):.1f}" r="{radius:.1f}" '
+                     f'fill="{color}" fill-opacity="{0.9 if on_front else 0.25}"><title>{_label(row)} '
+                     f'recall@5={row["recall@5"]} p50={row["latency_p50_ms"]}ms</title></circle>')
+        if on_front:
+            parts.append(f'<text x="{x(row["context_tokens"]) + radius + 3:.1f}" y="{y(row["mrr"]) + 4:.1f}">{_label(row)}</text>')
+    parts.append(f'<text x="{width - margin}" y="{margin - 20}" text-anchor="end">blue full, orange routing, green local; '
+                 f'size is p50 latency; labelled points are the Pareto front</text>')
+    parts.append("</svg>")
+    return "\n".join(parts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep retrieval settings over the golden questions")
+    parser.add_argument("--modes", default="full,routing")
+    parser.add_argument("--rerank-top-n", default="3,5,10")
+    parser.add_argument("--top-k", default="3,5,10", help="Candidates per index before the global rerank")
+    parser.add_argument("--cutoffs", default=",".join(str(cutoff) for cutoff in DEFAULT_CUTOFFS),
+                        help="Reference score cutoffs, as applied by render_sources")
+    parser.add_argument("--questions", default=None, help="Golden question file")
+    parser.add_argument("--no-summary", action="store_true", help="Skip the local summary index")
+    parser.add_argument("--llamacloud-url", default=None, help="Use this backend instead of the fake server")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Fake LlamaCloud latency per request")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    questions = load_golden_questions(Path(args.questions) if args.questions else None)
+    cutoffs = [float(value) for value in args.cutoffs.split(",")]
+    count_tokens = lambda text: len(get_tokenizer()(text))
+
+    server = None
+    if args.llamacloud_url:
+        base_url = args.llamacloud_url
+    else:
+        server = FakeLlamaCloudServer(config=FakeConfig(latency_ms=args.latency_ms))
+        base_url = server.start()
+
+    rows = []
+    try:
+        rag = RAGService(llama_cloud_api_key=os.environ["LLAMA_CLOUD_API_KEY"], base_url=base_url)
+        configs = [LlamaCloudConfig(rag, mode, int(rerank_top_n), int(top_k))
+                   for mode in args.modes.split(",")
+                   for rerank_top_n in args.rerank_top_n.split(",")
+                   for top_k in args.top_k.split(",")]
+        if not args.no_summary and len(rag.summary_store):
+            configs.extend(SummaryConfig(rag, int(top_k)) for top_k in args.top_k.split(","))
+        for config in configs:
+            config_rows = evaluate(config, questions, cutoffs, count_tokens)
+            rows.extend(config_rows)
+            best = max(config_rows, key=lambda row: row["mrr"])
+            print(f"{_label(best):<48} mrr {best['mrr']:.3f}  recall@5 {best['recall@5']:.3f}  "
+                  f"tokens {best['context_tokens']:>7.0f}  p50 {best['latency_p50_ms']:>7.1f} ms")
+    finally:
+        if server is not None:
+            server.stop()
+
+    front = sorted(pareto_front(rows), key=lambda row: row["context_tokens"])
+    print(f"\nPareto front ({len(front)} of {len(rows)} settings):")
+    for row in front:
+        print(f"  {_label(row):<48} mrr {row['mrr']:.3f}  recall@5 {row['recall@5']:.3f}  "
+              f"tokens {row['context_tokens']:>7.0f}  p50 {row['latency_p50_ms']:>7.1f} ms")
+    current = [row for row in rows if row["retriever"] == "llamacloud" and row["mode"] == RETRIEVAL_MODE
+               and row["rerank_top_n"] == RERANK_TOP_N and row["cutoff"] == MIN_SOURCE_SCORE]
+    for row in current:
+        print(f"Current setting: {_label(row)} mrr {row['mrr']:.3f} tokens {row['context_tokens']:.0f}")
+
+    output = Path(args.output) if args.output else SWEEP_DIR / f"sweep-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({"created_at": time.time(), "backend": base_url, "questions": len(questions),
+                                  "rows": rows, "pareto_front": front}, indent=2))
+    output.with_suffix(".svg").write_text(render_svg(rows, front))
+    print(f"Results written to {output} and {output.with_suffix('.svg')}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+#AppTest sessions signed in as a given user, for the load test and app tests
+#Auth stays in Streamlit: the test runner hands each script run the st.user a real login would
+
+from streamlit.testing.v1 import AppTest
+from streamlit.testing.v1 import app_test
+from streamlit.testing.v1.local_script_runner import LocalScriptRunner
+import threading
+import uuid
+
+# Session state key the runner reads the simulated login from
+IDENTITY_KEY = "_signed_in_app_identity"
+
+_install_lock = threading.Lock()
+
+
+class SignedInScriptRunner(LocalScriptRunner):
+    """
+    LocalScriptRunner with the user and session id stored on its AppTest
+    Stock AppTest runs every app as one "test session id" and a signed-out user
+    """
+    def __init__(self, script_path, session_state, *args, **kwargs):
+        super().__init__(script_path, session_state, *args, **kwargs)
+        if IDENTITY_KEY in session_state:
+            identity = session_state[IDENTITY_KEY]
+            self._session_id = identity["session_id"]
+            self._user_info = {"email": identity["email"], "is_logged_in": True}
+
+
+def signed_in_app_test(script_path: str, email: str, default_timeout: float = 60) -> AppTest:
+    with _install_lock:
+        # AppTest builds a fresh runner per run by this name; identity lives on each AppTest so threads don't mix
+        app_test.LocalScriptRunner = SignedInScriptRunner
+    app = AppTest.from_file(script_path, default_timeout=default_timeout)
+    app.session_state[IDENTITY_KEY] = {"email": email, "session_id": str(uuid.uuid4())}
+    return app
+
+
+def clear_unselected_button_groups(app: AppTest):
+    """
+    AppTest can't send back a single-select st.pills with nothing selected (its value is None, not a list)
+    Call before any run after the first
+    """
+    for group in app.button_group:
+        if group.value is None:
+            group.set_value([])
@@ -5,22 +5,30 @@ from ui.common_queries import common_queries
 from ui.indices import indices
 from ui.sources import sources
 from ui.header import header
+from ui.dashboard import dashboard, is_admin, record_session_metrics, session_idle_check
+from utils.profiler import profile_component, set_rerun_attribute
 
 
 def st_side_bar():
     with st.sidebar:
 
-        indices()
+        with profile_component("sidebar.indices"):
+            indices()
 
         st.divider()
 
-        common_queries()
-        #dashboard()
+        with profile_component("sidebar.common_queries"):
+            common_queries()
+
+        if is_admin():
+            st.divider()
+            st.toggle("Operations dashboard", key="show_dashboard")
 
 
 def app_body():
 
-    header()
+    with profile_component("header"):
+        header()
 
     st.logo(
         "assets/horizontal_NB.png",
@@ -32,6 +40,13 @@ def app_body():
 
     st_side_bar()
 
+    record_session_metrics()
+    session_idle_check()
+
+    if st.session_state.get('show_dashboard', False) and is_admin():
+        dashboard()
+        return
+
     c1, c2 = st.columns([2,1], vertical_alignment="top", gap="large")
     with c1:
         st.header("Board Chat")
@@ -44,8 +59,12 @@ def app_body():
             sources_placeholder = st.empty()
 
 
-        with chat_placeholder:
+        # Every rerun re-sends the whole chat history to the browser
+        messages = st.session_state.get('messages', [])
+        set_rerun_attribute("chat_messages", len(messages))
+        set_rerun_attribute("chat_history_bytes", sum(len(str(message.get("content", ""))) for message in messages))
+        with chat_placeholder, profile_component("chat_display"):
             chat_display()
-        with sources_placeholder:
+        with sources_placeholder, profile_component("sources"):
             sources()
         #file_manager()
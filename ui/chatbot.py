@@ -1,13 +1,35 @@
+from llama_index.core.llms import ChatMessage, MessageRole
 from utils.llama_chatbot import llama_chatbot
+from utils.precompute import get_precompute_job
+from pipeline.semantic_cache import get_semantic_cache
+from pipeline.budget import question_budget
+from pipeline.tracing import record_span, set_attribute, span
+import pipeline.slow_queries  # logs questions slower than PROOF_SLOW_QUERY_MS
+from utils.chat_store import get_chat_store, message_seq, new_conversation_id
+from utils.profiler import set_rerun_attribute
+from utils.session_memory import (current_session_id, load_spilled_references, mark_session_active,
+                                  restore_chat_history, spill_current_references)
+from utils.user import is_logged_in, user_email
 from .indices import *
 import logging
+import os
+import time
+import uuid
 
 #TODO: Include history as context
-#TODO: Save history
-#TODO: Limit history
 
 logger = logging.getLogger(__name__)
 
+# Turns rendered in full; older turns collapse to one-line summaries
+CHAT_WINDOW_TURNS = int(os.getenv("PROOF_CHAT_WINDOW_TURNS", "6"))
+# Collapsed turns revealed per "Show earlier turns" click
+CHAT_EARLIER_TURNS_PAGE = 10
+CHAT_SUMMARY_CHARS = 160
+# Saved messages kept in session state; older turns page back in from the chat store
+CHAT_SESSION_MESSAGES = int(os.getenv("PROOF_CHAT_SESSION_MESSAGES", "200"))
+# A served answer can't be checked against fresh retrieval, so only near-identical wording reuses one
+ANSWER_CACHE_THRESHOLD = float(os.getenv("PROOF_ANSWER_CACHE_THRESHOLD", "0.95"))
+
 
 def stream_and_clean_latex(stream_generator):
     """Required to prevent poor formatting when markdown thinks there is an equation"""
@@ -15,10 +37,222 @@ def stream_and_clean_latex(stream_generator):
         cleaned_chunk = chunk.replace('$', '\\$')
         yield cleaned_chunk
 
+def timed_stream(stream_generator, started_at):
+    """Records time to first token and to completion, measured from when the question was asked"""
+    first_token = True
+    characters = 0
+    for chunk in stream_generator:
+        if first_token:
+            record_span("answer.first_token", time.monotonic() - started_at)
+            first_token = False
+        characters += len(chunk)
+        yield chunk
+    record_span("answer.complete", time.monotonic() - started_at, characters=characters)
+
+def answer_cache_scope():
+    # The selected index only labels the question; retrieval always searches every index
+    return st.session_state.llama.answer_scope
+
+def get_cached_answer(prompt, is_preset_prompt):
+    """
+    Returns a precomputed or semantically cached answer unless the director asked for a live answer
+    Cached answers are only used on the first turn because later answers depend on chat history
+    """
+    if st.session_state.get('common_query_live', False):
+        return None
+
+    job = get_precompute_job()
+    if is_preset_prompt and job is not None:
+        precomputed = job.store.get(st.session_state.llama.index_version, prompt)
+        if precomputed is not None:
+            return precomputed
+
+    if st.session_state.chat_engine.chat_history:
+        return None
+
+    cache = get_semantic_cache("answers")
+    cached = cache.lookup(answer_cache_scope(), prompt, threshold=ANSWER_CACHE_THRESHOLD)
+    if cached is None:
+        return None
+    answer, cached_query, similarity = cached
+    if cache.should_sample(similarity):
+        # Answers can't be verified automatically; samples are kept for review
+        cache.record_sample(prompt, cached_query, similarity, is_false_hit=None)
+    return answer
+
+def history_for_trace(chat_history, max_messages=10, max_chars=2000):
+    """Recent turns kept with slow-query records so a replay condenses the same follow-up"""
+    return [{'role': message.role.value, 'content': str(message.content or "")[:max_chars]}
+            for message in chat_history[-max_messages:]]
+
+def show_degraded_notice(degraded):
+    st.caption(f"Faster answer: skipped {degraded} to stay within the response time budget. Ask again for a full answer.")
+
+def record_query_usage(prompt):
+    job = get_precompute_job()
+    if job is not None:
+        job.usage.record(prompt)
+
+def show_past_references(message):
+    """Reloads an earlier answer's references from the session's spill store into the references panel"""
+    references = load_spilled_references(current_session_id(), message.get("question_id"))
+    if references is None:
+        st.toast("The references for this answer are no longer available")
+        return
+    spill_current_references(st.session_state, current_session_id())
+    st.session_state.current_user_prompt = references['prompt']
+    st.session_state.current_question_id = message["question_id"]
+    st.session_state.current_references = None
+    st.rerun()
+
+def group_turns(messages):
+    """Splits the history into turns, each starting at a director's question"""
+    turns = []
+    for message in messages:
+        if message["role"] == "user" or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+def turn_summary(turn, max_chars=CHAT_SUMMARY_CHARS):
+    question = next((message["content"] for message in turn if message["role"] == "user"), "")
+    answer = next((message["content"] for message in turn if message["role"] == "assistant"), "")
+    answer = " ".join(str(answer).split())
+    return f"**{question}** — {answer[:max_chars]}{'…' if len(answer) > max_chars else ''}"
+
+def render_message(message):
+    with st.chat_message(message["role"]):
+        st.markdown(message["content"])
+        if message.get("degraded"):
+            show_degraded_notice(message["degraded"])
+        if message.get("references_spilled"):
+            if st.button("Show references", key=f"references_{message['question_id']}", type="tertiary"):
+                show_past_references(message)
+
+def chat_store_user():
+    return user_email() if is_logged_in() else None
+
+def save_message(message):
+    """Queues the message for the chat store; never blocks the script thread"""
+    store, user = get_chat_store(), chat_store_user()
+    if store is None or user is None:
+        return
+    title = message["content"][:100] if message["role"] == "user" else None
+    store.append(user, st.session_state.conversation_id, message, title=title)
+
+def load_history_page(before_seq=None):
+    """A page of saved messages starting at a question, and whether older ones remain"""
+    store, user = get_chat_store(), chat_store_user()
+    if store is None or user is None:
+        return [], False
+    messages, has_more = store.load_page(user, st.session_state.conversation_id, before_seq=before_seq)
+    # An answer whose question is on the previous page is fetched with that page
+    while has_more and messages and messages[0]["role"] != "user":
+        messages.pop(0)
+    return messages, has_more
+
+def resume_conversation():
+    """Loads the latest page of the director's most recent conversation so a refresh doesn't lose the chat"""
+    st.session_state.messages = []
+    st.session_state.conversation_id = new_conversation_id()
+    st.session_state.history_has_more = False
+    store, user = get_chat_store(), chat_store_user()
+    if store is None or user is None:
+        return
+    try:
+        conversation_id = store.latest_conversation(user)
+        if conversation_id is None:
+            return
+        st.session_state.conversation_id = conversation_id
+        messages, has_more = load_history_page()
+    except Exception as e:
+        logger.warning(f"CHAT_STORE: Failed to resume conversation: {e}")
+        return
+    st.session_state.messages = messages
+    st.session_state.history_has_more = has_more
+    if messages:
+        st.session_state.chat_started = True
+        # Follow-ups keep their context, the same way an evicted session's memory comes back
+        st.session_state.evicted_chat_history = [ChatMessage(role=MessageRole(message["role"]), content=message["content"])
+                                                 for message in messages]
+        if st.session_state.get('chat_engine', None) is not None:
+            restore_chat_history(st.session_state.chat_engine)
+        logger.info(f"CHAT_STORE: Resumed conversation {conversation_id} with {len(messages)} messages")
+
+def trim_session_history():
+    """Keeps at most CHAT_SESSION_MESSAGES saved messages in session state, dropping whole turns from the start"""
+    if get_chat_store() is None or chat_store_user() is None:
+        return
+    turns = group_turns(st.session_state.messages)
+    if sum(len(turn) for turn in turns) <= CHAT_SESSION_MESSAGES:
+        return
+    while len(turns) > 1 and sum(len(turn) for turn in turns) > CHAT_SESSION_MESSAGES:
+        turns.pop(0)
+    st.session_state.messages = [message for turn in turns for message in turn]
+    st.session_state.history_has_more = True
+    st.session_state.earlier_turns_shown = 0
+    st.session_state.expanded_turns = set()
+
+def load_earlier_messages():
+    messages = st.session_state.messages
+    try:
+        page, has_more = load_history_page(before_seq=messages[0].get("seq") if messages else None)
+    except Exception as e:
+        logger.warning(f"CHAT_STORE: Failed to load earlier messages: {e}")
+        return
+    new_turns = len(group_turns(page))
+    st.session_state.messages = page + messages
+    st.session_state.history_has_more = has_more
+    # The loaded turns show as summaries; expanded turns keep pointing at the same messages
+    st.session_state.earlier_turns_shown = st.session_state.get('earlier_turns_shown', 0) + new_turns
+    st.session_state.expanded_turns = {index + new_turns for index in st.session_state.get('expanded_turns', set())}
+
+def show_earlier_turns():
+    st.session_state.earlier_turns_shown = st.session_state.get('earlier_turns_shown', 0) + CHAT_EARLIER_TURNS_PAGE
+
+def toggle_turn(index):
+    expanded = st.session_state.setdefault('expanded_turns', set())
+    expanded.symmetric_difference_update({index})
+
+def chat_history_window(messages):
+    """
+    Renders the latest CHAT_WINDOW_TURNS turns in full and older turns as one-line summaries, paged in on request
+    A turn's full text is only sent to the browser once the director expands it, so reruns stay flat as a meeting runs long
+    """
+    turns = group_turns(messages)
+    recent_start = max(len(turns) - CHAT_WINDOW_TURNS, 0)
+    shown = min(st.session_state.get('earlier_turns_shown', 0), recent_start)
+    expanded = st.session_state.get('expanded_turns', set())
+    rendered = 0
+
+    if recent_start > shown:
+        st.button(f"Show earlier turns ({recent_start - shown} hidden)", key="show_earlier_turns", type="tertiary",
+                  on_click=show_earlier_turns)
+    elif st.session_state.get('history_has_more', False):
+        st.button("Load earlier messages", key="load_earlier_messages", type="tertiary",
+                  on_click=load_earlier_messages)
+    for index in range(recent_start - shown, recent_start):
+        if index in expanded:
+            for message in turns[index]:
+                render_message(message)
+                rendered += 1
+            st.button("Collapse", key=f"collapse_turn_{index}", type="tertiary", on_click=toggle_turn, args=(index,))
+        else:
+            summary_column, button_column = st.columns([5, 1], vertical_alignment="center")
+            summary_column.caption(turn_summary(turns[index]))
+            button_column.button("Expand", key=f"expand_turn_{index}", type="tertiary", on_click=toggle_turn, args=(index,))
+
+    for turn in turns[recent_start:]:
+        for message in turn:
+            render_message(message)
+            rendered += 1
+    set_rerun_attribute("chat_rendered_messages", rendered)
+
 @st.fragment
 def chat_windows():
+    mark_session_active()
     if "messages" not in st.session_state:
-        st.session_state.messages = []
+        resume_conversation()
 
     if "chat_started" not in st.session_state:
         st.session_state.chat_started = False
@@ -34,9 +268,7 @@ def chat_windows():
             logger.info("Chat has started")
             # Display chat messages from history on app rerun
             chatbot_info_placeholder.empty()
-            for message in st.session_state.messages:
-                with st.chat_message(message["role"]):
-                    st.markdown(message["content"])
+            chat_history_window(st.session_state.messages)
 
         user_placeholder = st.empty()
 
@@ -52,36 +284,90 @@ def chat_windows():
     )
 
     effective_prompt = user_typed_prompt or common_prompt_from_state
+    is_preset_prompt = not user_typed_prompt and st.session_state.get('common_prompt_is_preset', False)
     # If effective_prompt is truthy and now prompt is set to that
     if prompt := effective_prompt:
+        question_started_at = time.monotonic()
         st.session_state.chatbot_info_placeholder.empty()
         st.session_state.chat_started = True
         st.session_state.common_prompt = None #Reinit common prompt
+        st.session_state.common_prompt_is_preset = False
         st.session_state.current_user_prompt = prompt
+        # Earlier answers' references wait on disk until reopened
+        spill_current_references(st.session_state, current_session_id())
+        st.session_state.current_references = None
+        st.session_state.current_question_id = question_id = uuid.uuid4().hex
+        record_query_usage(prompt)
 
         with user_placeholder:
             st.chat_message("user").markdown(prompt)
         # Add user message to chat history
-        st.session_state.messages.append({"role": "user", "content": prompt})
+        user_message = {"role": "user", "content": prompt, "seq": message_seq(), "question_id": question_id}
+        st.session_state.messages.append(user_message)
+        save_message(user_message)
 
         #===================
         #Separate retriever
         #===================
 
-        with ai_placeholder:
-            with st.chat_message("assistant"):
+        is_first_turn = not st.session_state.chat_engine.chat_history
+        cached_answer = get_cached_answer(prompt, is_preset_prompt)
+        degraded = None
+        node_ids = []
+
+        # One trace per question; condense, retrieval and streaming spans nest under it
+        with span("question", question_id=question_id,
+                  store=st.session_state.get('current_index_name', None),
+                  first_turn=is_first_turn, preset=is_preset_prompt,
+                  cached_answer=cached_answer is not None) as question_span:
+            if question_span is not None:
+                # Kept off the trace log; the slow-query log writes them only for slow questions
+                question_span.set_payload("prompt", prompt)
+                question_span.set_payload("history", history_for_trace(st.session_state.chat_engine.chat_history))
+            with ai_placeholder:
+                with st.chat_message("assistant"):
+                    if cached_answer is not None:
+                        logger.info(f"Serving cached answer for '{prompt}'")
+                        response = cached_answer['answer']
+                        st.markdown(response)
+                        # Keep follow-up questions aware of the cached turn
+                        st.session_state.chat_engine.memory.put(ChatMessage(role=MessageRole.USER, content=prompt))
+                        st.session_state.chat_engine.memory.put(ChatMessage(role=MessageRole.ASSISTANT, content=response))
+                        node_ids = [node['id'] for node in cached_answer.get('references') or []]
+                        if cached_answer.get('references') is not None:
+                            st.session_state.current_references = {'prompt': prompt, 'nodes': cached_answer['references'],
+                                                                   'question_id': question_id}
+                    else:
+                        # Condense and retrieval shed optional work as this question's budget runs out
+                        with question_budget(started_at=question_started_at) as budget:
+                            # Get the original, raw generator from the chat engine.
+                            streaming_response = st.session_state.chat_engine.stream_chat(prompt)
+                            raw_response_generator = streaming_response.response_gen
+                            raw_response_generator = timed_stream(raw_response_generator, question_started_at)
 
-                # Get the original, raw generator from the chat engine.
-                raw_response_generator = st.session_state.chat_engine.stream_chat(prompt).response_gen
+                            # Create an instance of your new cleaning generator.
+                            cleaned_response_generator = stream_and_clean_latex(raw_response_generator)
 
-                # Create an instance of your new cleaning generator.
-                cleaned_response_generator = stream_and_clean_latex(raw_response_generator)
+                            # Pass the CLEANED generator to st.write_stream.
+                            # The 'response' variable will now hold the full, already cleaned string after the stream is done.
+                            response = st.write_stream(cleaned_response_generator)
 
-                # Pass the CLEANED generator to st.write_stream.
-                # The 'response' variable will now hold the full, already cleaned string after the stream is done.
-                response = st.write_stream(cleaned_response_generator)
+                        node_ids = [node.node.node_id for node in streaming_response.source_nodes]
+                        set_attribute("degraded", budget.degraded)
+                        if budget.degraded:
+                            degraded = budget.describe()
+                            show_degraded_notice(degraded)
+                        elif is_first_turn:
+                            # Degraded answers are never cached in place of full ones
+                            get_semantic_cache("answers").put(answer_cache_scope(), prompt, {'answer': response})
 
-        st.session_state.messages.append({"role": "assistant", "content": response})
+        assistant_message = {"role": "assistant", "content": response, "degraded": degraded,
+                             "question_id": question_id, "seq": message_seq(), "node_ids": node_ids,
+                             "timings": {"total_ms": round(1000 * (time.monotonic() - question_started_at)),
+                                         "cached": cached_answer is not None}}
+        st.session_state.messages.append(assistant_message)
+        save_message(assistant_message)
+        trim_session_history()
         st.rerun()
 
 
@@ -95,6 +381,8 @@ def chat_display():
         if 'chat_engine' not in st.session_state:
             try:
                 st.session_state.chat_engine = llama_chatbot()
+                if st.session_state.chat_engine is not None:
+                    restore_chat_history(st.session_state.chat_engine)
             except Exception as e:
                 logging.exception(f"CHATBOT: {e}")
                 st.warning("There was a problem connecting to the chat engine. Please try again later.")
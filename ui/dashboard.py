@@ -1,4 +1,58 @@
 import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+import logging
+
+from pipeline.operations import WINDOWS, operations_snapshot
+from utils.precompute import get_precompute_job
+from utils.session_memory import (EVICTION_INTERVAL_SECONDS, drop_stale_spills, enforce_session_cap, evict_if_idle,
+                                  mark_session_active)
+from utils.session_metrics import get_session_metrics
+from utils.user import is_logged_in, user_email
+
+logger = logging.getLogger(__name__)
+
+
+def is_admin():
+    """Admins are listed in the ADMIN_EMAILS secret (list or comma separated)"""
+    try:
+        if not is_logged_in():
+            return False
+        admins = st.secrets.get("ADMIN_EMAILS", [])
+        if isinstance(admins, str):
+            admins = [email.strip() for email in admins.split(",")]
+        return user_email() in admins
+    except Exception as e:
+        logger.warning(f"DASHBOARD: Could not check admin status: {e}")
+        return False
+
+
+def record_session_metrics():
+    """Reports this session's size on every rerun and holds it under its memory cap"""
+    try:
+        ctx = get_script_run_ctx()
+        if ctx is None:
+            return
+        mark_session_active()
+        footprint = enforce_session_cap(st.session_state, ctx.session_id)
+        chat_engine = st.session_state.get('chat_engine', None)
+        memory_messages = chat_engine.memory.get_all() if chat_engine is not None else []
+        get_session_metrics().record(session_id=ctx.session_id,
+                                     user=user_email(),
+                                     messages=st.session_state.get('messages', []),
+                                     memory_messages=memory_messages,
+                                     footprint=footprint)
+    except Exception as e:
+        logger.warning(f"DASHBOARD: Failed to record session metrics: {e}")
+
+
+@st.fragment(run_every=f"{EVICTION_INTERVAL_SECONDS}s")
+def session_idle_check():
+    """Runs in this session's own script thread, so eviction never races the session's reruns"""
+    try:
+        evict_if_idle()
+        drop_stale_spills()
+    except Exception as e:
+        logger.warning(f"DASHBOARD: Idle check failed: {e}")
 
 
 def org_info():
@@ -11,7 +65,109 @@ def project_info():
     st.write(st.session_state.llama.project_id)
 
 
+def table(title, rows, empty_message="No data yet"):
+    st.markdown(f"**{title}**")
+    if rows:
+        st.dataframe(rows, use_container_width=True, hide_index=True)
+    else:
+        st.caption(empty_message)
+
+
+def latency_section(snapshot):
+    st.subheader("Latency")
+    table("Question stages", snapshot["stages"])
+    c1, c2 = st.columns(2)
+    with c1:
+        table("Retrieval by store", snapshot["retrieval"])
+    with c2:
+        table("Index search by pipeline", snapshot["search_index"])
+    table("Condense by path (fast skips the LLM call)", snapshot["condense"])
+    table("UI components per rerun", snapshot["components"], empty_message="Rerun profiling is off (PROOF_PROFILE_RERUNS=1)")
+
+
+def cache_section(snapshot):
+    st.subheader("Caches")
+    job = get_precompute_job()
+    c1, c2 = st.columns(2)
+    with c1:
+        table("Semantic caches", snapshot["caches"])
+        st.metric("Precomputed answers", len(job.store) if job is not None else 0)
+    with c2:
+        table("Coalesced requests", snapshot["single_flight"])
+
+
+def backend_section(snapshot):
+    st.subheader("Backends")
+    limiters = [{
+        "backend": stats["name"],
+        "in_flight": stats["in_flight"],
+        "queue_depth": stats["queue_depth"],
+        **{f"queued_{priority}": count for priority, count in stats["queued"].items()},
+        "throttled": stats["throttled"],
+        "interactive_wait_p95_ms": round(stats["wait"]["interactive"]["p95_ms"], 1),
+    } for stats in snapshot["limiters"]]
+    table("Calls in flight and queued", limiters)
+    circuits = [{"operation": operation, **stats} for operation, stats in snapshot["circuits"].items()]
+    table("Deadlines and circuit breakers", circuits)
+
+
+def usage_section(snapshot):
+    st.subheader("Sessions and LLM usage")
+    c1, c2 = st.columns(2)
+    with c1:
+        table("Live sessions in this process", get_session_metrics().active())
+    with c2:
+        for window, rows in snapshot["tokens"].items():
+            table(f"Tokens, last {window}", rows)
+
+
+def merge_service_snapshot(local, service):
+    """Tags rows with where they were measured: this app process or the shared retrieval service"""
+    merged = {}
+    for key, rows in local.items():
+        if isinstance(rows, list):
+            merged[key] = ([{"source": "app", **row} for row in rows]
+                           + [{"source": "service", **row} for row in service.get(key, [])])
+    merged["circuits"] = {**local["circuits"],
+                          **{f"service:{operation}": stats for operation, stats in service["circuits"].items()}}
+    merged["tokens"] = local["tokens"]
+    return merged
+
+
+@st.fragment(run_every="10s")
+def operations_metrics():
+    window = st.segmented_control("Window", options=list(WINDOWS) + ["all"], default="1h", key="dashboard_window")
+    window_seconds = WINDOWS.get(window, None)
+
+    # Reads in-process stats only; a remote retrieval service reports its own backend stats
+    snapshot = operations_snapshot(window_seconds)
+    rag = st.session_state.get('llama', None)
+    if hasattr(rag, "operations_snapshot"):
+        try:
+            snapshot = merge_service_snapshot(snapshot, rag.operations_snapshot(window_seconds))
+        except Exception as e:
+            st.warning(f"Retrieval service metrics unavailable: {e}")
+
+    latency_section(snapshot)
+    st.divider()
+    cache_section(snapshot)
+    st.divider()
+    backend_section(snapshot)
+    st.divider()
+    usage_section(snapshot)
+
+
 def dashboard():
-    org_info()
+    if not is_admin():
+        st.warning("The operations dashboard is only available to administrators.")
+        return
+
+    st.header("Operations")
+    if st.session_state.get('llama', None):
+        c1, c2 = st.columns(2)
+        with c1:
+            org_info()
+        with c2:
+            project_info()
 
-    project_info()
+    operations_metrics()
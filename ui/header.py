@@ -1,13 +1,23 @@
 import streamlit as st
 import logging
 
+from utils.chat_store import new_conversation_id
+from utils.precompute import get_precompute_job
+from pipeline.rate_limit import Priority, request_priority
+from utils.user import is_logged_in
+
 logger = logging.getLogger(__name__)
 
 def sync_documents():
     logger.info("Syncing documents")
     rag = st.session_state.get('llama', None)
     if rag:
-        rag.run_retriever_sync()
+        with request_priority(Priority.BACKGROUND):
+            rag.run_retriever_sync()
+        # Summaries take an LLM call per changed file; the background job builds them before precomputing answers
+        job = get_precompute_job()
+        if job is not None:
+            job.trigger(build_summaries=True)
 
 def handle_auth():
     if st.user.is_logged_in:
@@ -43,11 +53,18 @@ def handle_settings_pills():
     try:
         if selection == "Reset Chat":
             logger.info("Resetting chat settings")
-            if st.session_state.chat_engine:
+            if st.session_state.get('chat_engine', None):
                 st.session_state.chat_engine.reset()
+            st.session_state.evicted_chat_history = None
+            st.session_state.earlier_turns_shown = 0
+            st.session_state.expanded_turns = set()
             st.session_state.chat_started = False
             st.session_state.messages = []
+            # The old conversation stays saved; the next question starts a new one
+            st.session_state.conversation_id = new_conversation_id()
+            st.session_state.history_has_more = False
             st.session_state.query_nodes = None
+            st.session_state.current_references = None
 
             logger.info("Resetting chat")
     except Exception as e:
@@ -83,7 +100,7 @@ def header():
         st.image("https://i.postimg.cc/vTQrtbS0/horizontal-name-only.jpg", output_format="auto", width=200)
 
 
-    if st.user.is_logged_in:
+    if is_logged_in():
         st.session_state.login_button_label = "Logout"
     else:
         st.session_state.login_button_label = "Login"
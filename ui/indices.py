@@ -4,6 +4,7 @@ import time
 import streamlit as st
 
 from errors import LlamaOperationFailedError
+from utils.user import is_logged_in
 
 
 def indices_list_view():
@@ -100,7 +101,7 @@ def indices():
         if "current_index_name" not in st.session_state:
             st.session_state['current_index_name'] = None
 
-        if not st.user.is_logged_in:
+        if not is_logged_in():
             st.info("Please log in to get started.")
         elif st.session_state.get('llama', None) is None:
             st.info("Please wait for chatbot to initialize")
@@ -1,22 +1,30 @@
 import logging
+import os
 import urllib.parse
 
 import streamlit as st
 
 from utils.node_processor import process_retrieved_nodes
 from errors.errors import LlamaOperationFailedError
+from pipeline.rate_limit import Priority, request_priority
+from pipeline.budget import REFERENCES_BUDGET_SECONDS, question_budget
+from pipeline.tracing import span
+from utils.session_memory import current_session_id, load_spilled_references, mark_session_active
 
 import logging
 
 logger = logging.getLogger(__name__)
 
+# References scoring below this are hidden; tune it with tools/retrieval_sweep.py
+MIN_SOURCE_SCORE = float(os.getenv("PROOF_MIN_SOURCE_SCORE", "0.08"))
+
 def render_sources(nodes_list, source_type, title, render_content_func):
     """Generic source renderer that handles common logic."""
     st.subheader(title)
     try:
         node_count = 0
         for node in nodes_list:
-            if node['type'] == source_type and node.get('score', 0) >= 0.08:
+            if node['type'] == source_type and node.get('score', 0) >= MIN_SOURCE_SCORE:
                 node_count += 1
                 with st.container(border=True, key=f"shadow_node_{source_type}_{node_count}"):
                     # Call the specific rendering function, passing the whole node
@@ -67,11 +75,14 @@ def text_preview_expander(node):
         value=node['content'],
         height=200,  # Adjust height as needed, or it will auto-size
         disabled=False,  # Makes it read-only
-        label_visibility="collapsed"  # Hides the "Content" label above the text area
+        label_visibility="collapsed",  # Hides the "Content" label above the text area
+        # Two references can carry the same text, which would collide on the auto-generated id
+        key=f"{node['id']}_content"
     )
 
 @st.fragment
 def render_text_content(node):
+    mark_session_active()
 
     text_preview_expander(node)
 
@@ -80,6 +91,7 @@ def render_text_content(node):
 
 @st.fragment
 def render_image_content(node):
+    mark_session_active()
     file_name = "Image"
     if isinstance(node.get('metadata'), dict):
         file_name = node['metadata'].get('file_name', 'Image')
@@ -96,7 +108,8 @@ def run_retrieval(current_user_prompt):
     try:
         with st.spinner("Retrieving references..."):
             query_nodes_from_state = st.session_state.llama.multi_modal_composite_retrieval(
-                query_text=current_user_prompt)
+                query_text=current_user_prompt,
+                store=st.session_state.get('current_index_name', None))
 
         return query_nodes_from_state
     except Exception as e:
@@ -112,9 +125,32 @@ def source_viewer_display():
 
         prompt = st.session_state.current_user_prompt #Gets from chatbot
 
-        query_nodes_from_state = run_retrieval(prompt)
-
-        processed_nodes_list = process_retrieved_nodes(query_nodes_from_state)
+        # References are computed once per question (or precomputed) rather than on every rerun
+        current_references = st.session_state.get("current_references", None)
+        if current_references is None:
+            # An earlier answer's references, or this one's spilled to keep the session under its memory cap
+            current_references = load_spilled_references(current_session_id(),
+                                                         st.session_state.get('current_question_id', None))
+        if current_references is not None and current_references['prompt'] == prompt:
+            processed_nodes_list = current_references['nodes']
+        else:
+            # Reference rendering yields to chat answers when the backends are busy
+            with request_priority(Priority.REFERENCES), question_budget(REFERENCES_BUDGET_SECONDS) as budget, \
+                    span("references", question_id=st.session_state.get('current_question_id', None),
+                         store=st.session_state.get('current_index_name', None)) as references_span:
+                if references_span is not None:
+                    references_span.set_payload("prompt", prompt)
+                query_nodes_from_state = run_retrieval(prompt)
+
+                processed_nodes_list = process_retrieved_nodes(query_nodes_from_state)
+            st.session_state.current_references = {'prompt': prompt, 'nodes': processed_nodes_list,
+                                                   'degraded': budget.describe() if budget.degraded else None,
+                                                   'question_id': st.session_state.get('current_question_id', None)}
+
+            current_references = st.session_state.current_references
+
+        if current_references.get('degraded'):
+            st.caption(f"Showing a reduced set of references: skipped {current_references['degraded']}.")
 
         # Call the generic renderer directly
 
@@ -143,6 +179,7 @@ def source_waiting():
 
 @st.fragment
 def sources():
+    mark_session_active()
 
     if not st.session_state.get('chat_started', False):
         source_waiting()
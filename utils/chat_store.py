@@ -0,0 +1,185 @@
+#Append-only chat history in SQLite (WAL mode) keyed by user and conversation
+#Writes are queued to one background writer so the Streamlit script thread never waits on disk; reads are paged
+#Configure with PROOF_CHAT_STORE_PATH, or disable with PROOF_CHAT_STORE=0
+
+from pathlib import Path
+from typing import List, Optional
+import atexit
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+CHAT_STORE_PATH = Path(os.getenv("PROOF_CHAT_STORE_PATH",
+                                 Path(os.getenv("PROOF_CACHE_DIR", ".proof_cache")) / "chat_history.sqlite3"))
+CHAT_STORE_ENABLED = os.getenv("PROOF_CHAT_STORE", "1") == "1"
+# Messages fetched when a conversation is resumed or the director asks for earlier turns
+CHAT_PAGE_MESSAGES = int(os.getenv("PROOF_CHAT_PAGE_MESSAGES", "20"))
+# The writer commits at most this many queued messages per transaction
+WRITE_BATCH_SIZE = 200
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    id TEXT PRIMARY KEY,
+    user TEXT NOT NULL,
+    title TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS conversations_by_user ON conversations (user, updated_at);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    conversation_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    question_id TEXT,
+    node_ids TEXT,
+    timings TEXT,
+    degraded TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_by_conversation ON messages (conversation_id, seq);
+"""
+
+
+def new_conversation_id() -> str:
+    return uuid.uuid4().hex
+
+
+def message_seq() -> int:
+    """Orders messages within a conversation and pages them; assigned when the message is created, not written"""
+    return time.time_ns()
+
+
+class ChatStore:
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path) if path else CHAT_STORE_PATH
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self.written = 0
+        self.failed = 0
+        with self._connect() as connection:
+            connection.executescript(SCHEMA)
+        self._writer = threading.Thread(target=self._write_loop, name="chat-store-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        # Readers in other sessions never block on the writer, or it on them
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def _reader(self) -> sqlite3.Connection:
+        if getattr(self._local, "connection", None) is None:
+            self._local.connection = self._connect()
+        return self._local.connection
+
+    def append(self, user: str, conversation_id: str, message: dict, title: Optional[str] = None):
+        """Queues a message for the writer; returns immediately"""
+        self._queue.put((user, conversation_id, title, message, time.time()))
+
+    def _write_loop(self):
+        connection = self._connect()
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < WRITE_BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write(connection, batch)
+                with self._lock:
+                    self.written += len(batch)
+            except Exception as e:
+                with self._lock:
+                    self.failed += len(batch)
+                logger.error(f"CHAT_STORE: Failed to write {len(batch)} messages: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    @staticmethod
+    def _write(connection: sqlite3.Connection, batch: list):
+        with connection:
+            for user, conversation_id, title, message, created_at in batch:
+                connection.execute(
+                    "INSERT INTO conversations (id, user, title, created_at, updated_at) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT (id) DO UPDATE SET updated_at = excluded.updated_at, "
+                    "title = COALESCE(conversations.title, excluded.title)",
+                    (conversation_id, user, title, created_at, created_at))
+                connection.execute(
+                    "INSERT INTO messages (conversation_id, seq, role, content, question_id, node_ids, timings, "
+                    "degraded, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (conversation_id, message.get("seq") or message_seq(), message["role"], str(message["content"]),
+                     message.get("question_id"), json.dumps(message.get("node_ids") or []),
+                     json.dumps(message.get("timings") or {}), message.get("degraded"), created_at))
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Waits until queued messages are written; for shutdown and tools"""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return not self._queue.unfinished_tasks
+
+    def latest_conversation(self, user: str) -> Optional[str]:
+        row = self._reader().execute(
+            "SELECT id FROM conversations WHERE user = ? ORDER BY updated_at DESC LIMIT 1", (user,)).fetchone()
+        return row["id"] if row else None
+
+    def conversations(self, user: str, limit: int = 20) -> List[dict]:
+        rows = self._reader().execute(
+            "SELECT id, title, created_at, updated_at FROM conversations WHERE user = ? "
+            "ORDER BY updated_at DESC LIMIT ?", (user, limit)).fetchall()
+        return [dict(row) for row in rows]
+
+    def load_page(self, user: str, conversation_id: str, before_seq: Optional[int] = None,
+                  limit: int = CHAT_PAGE_MESSAGES) -> tuple:
+        """The latest messages before before_seq in chronological order, and whether older ones remain"""
+        rows = self._reader().execute(
+            "SELECT m.seq, m.role, m.content, m.question_id, m.node_ids, m.timings, m.degraded FROM messages m "
+            "JOIN conversations c ON c.id = m.conversation_id "
+            "WHERE m.conversation_id = ? AND c.user = ? AND m.seq < ? ORDER BY m.seq DESC LIMIT ?",
+            (conversation_id, user, before_seq if before_seq is not None else 2 ** 63 - 1, limit + 1)).fetchall()
+        has_more = len(rows) > limit
+        messages = [{"role": row["role"], "content": row["content"], "seq": row["seq"],
+                     "question_id": row["question_id"], "node_ids": json.loads(row["node_ids"] or "[]"),
+                     "timings": json.loads(row["timings"] or "{}"), "degraded": row["degraded"]}
+                    for row in reversed(rows[:limit])]
+        return messages, has_more
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"path": str(self.path), "queued": self._queue.qsize(), "written": self.written,
+                    "failed": self.failed}
+
+
+_chat_store = None
+_chat_store_lock = threading.Lock()
+
+
+def get_chat_store() -> Optional[ChatStore]:
+    """Process-wide store, or None when PROOF_CHAT_STORE=0 or the database can't be opened"""
+    global _chat_store
+    if not CHAT_STORE_ENABLED:
+        return None
+    with _chat_store_lock:
+        if _chat_store is None:
+            try:
+                _chat_store = ChatStore()
+                atexit.register(_chat_store.flush)
+            except Exception as e:
+                logger.error(f"CHAT_STORE: Failed to open {CHAT_STORE_PATH}, history won't be saved: {e}")
+                return None
+        return _chat_store
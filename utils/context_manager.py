@@ -3,16 +3,22 @@ from dataclasses import dataclass
 from typing import Optional, AsyncIterator
 from mcp.server.fastmcp import FastMCP
 
-from pipeline import RAGService
+from pipeline import RAGService, AsyncRAGService
 from utils.settings import AzureSettings
+import asyncio
 import logging
+import os
+
+MAX_CONCURRENT_TOOL_CALLS = int(os.getenv("PROOF_MCP_MAX_CONCURRENCY", "8"))
 
 
 # Encapsulates state objects for passing via context
 @dataclass
 class AppContext:
-    settings: AzureSettings
+    settings: Optional[AzureSettings]
     llama: RAGService
+    allama: AsyncRAGService
+    tool_slots: asyncio.Semaphore
 
 # FastMCP decorated tools accept contexts for managing lifecycle automatically when called by bot
 @asynccontextmanager
@@ -23,16 +29,25 @@ async def app_lifespan(server: Optional[FastMCP]) -> AsyncIterator[AppContext]:
     # If not previously authenticated, graph will hold None and a wrapper will trigger auth before tools are run
     try:
         logging.info("Starting app lifespan")
-        settings = AzureSettings()
+        try:
+            settings = AzureSettings()
+        except ValueError as e:
+            # Retrieval tools don't need Graph; only Graph-backed tools require Azure settings
+            logging.warning(f"Azure settings unavailable, Graph tools disabled: {str(e)}")
+            settings = None
 
-        rag_service = RAGService()
+        # One warm service shared by every tool call; the sync init runs off the event loop
+        rag_service = await asyncio.to_thread(RAGService, llama_cloud_api_key=os.environ["LLAMA_CLOUD_API_KEY"])
+        async_rag_service = AsyncRAGService.from_sync(rag_service)
         logging.info("Settings initialized: in app_lifespan")
     except Exception as e:
         logging.error(f"Error in app_lifespan: {str(e)}")
         raise e
 
     try:
-        yield AppContext(settings=settings, llama=rag_service)
+        yield AppContext(settings=settings,
+                         llama=rag_service,
+                         allama=async_rag_service,
+                         tool_slots=asyncio.Semaphore(MAX_CONCURRENT_TOOL_CALLS))
     finally:
-        #Add any cleanup if needed
-        pass
+        await async_rag_service.aclose()
@@ -1,42 +1,132 @@
 import streamlit as st
 from llama_index.core.chat_engine import CondensePlusContextChatEngine
-from llama_index.core.memory import ChatMemoryBuffer
-from llama_index.llms.openai import OpenAI
+from llama_index.core.llms.mock import MockLLM
+from pipeline.budget import budget_allows
+from pipeline.condense import CONDENSE_FAST_PATH, fast_path_reason
+from pipeline.context_packer import CONTEXT_TOKEN_BUDGET, TokenBudgetPacker
+from pipeline.memory import RollingSummaryMemory
+from pipeline.rate_limit import RateLimitedOpenAI
+from pipeline.tracing import get_metrics_registry, span
+from pipeline.retrievers import CarryOverRetriever, ServiceRetriever, SummaryFirstRetriever
+from utils.user import is_logged_in
 import logging
+import os
 
 logger = logging.getLogger(__name__)
 
+LLM_MODEL = "o4-mini-2025-04-16"
+
+CONTEXT_PROMPT = (
+    "You are a chatbot in the role of expert on the documents stored by the company for Board of Directors."
+    "Your only focus is on understanding those documents at a factual level."
+    "The content for those documents is here:\n"
+    "{context_str}"
+    "\nInstruction: Use the previous chat history, or the context above, to interact and answer Director questions about the documents."
+    "You can make inferences directly related to the content of the documents: noting trends or gaps or material observations."
+    "IMPORTANT: Ensure all your responses use standard textual formatting with appropriate spacing between words and numbers. Do not use special text styles or italics unless explicitly requested or for standard emphasis. Avoid equation formats in markdown that can render text in odd ways."
+    "IMPORTANT: You do not return technical details like file_ids or pipeline names as you only deal in content, inference, and filenames."
+    "IMPORTANT: You do NOT bring other knowledge or inferences to responses beyond the document and chat context."
+    "IMPORTANT: You do NOT respond with general answers on theory or concepts or guesses outside of these documents."
+    "If a question asks you to speculate beyond the scope discussed above, simply say 'Answers to that question are outside the scope of my function'."
+)
+
+class BudgetAwareChatEngine(CondensePlusContextChatEngine):
+    """
+    Retrieves with the question as asked, skipping the condense LLM call, for first questions and preset
+    common queries (and heuristically standalone follow-ups when enabled), or when the latency budget runs low
+    """
+    standalone_questions = ()
+
+    @property
+    def memory(self):
+        # The base engine keeps its memory private; session accounting, eviction and cached answers use it
+        return self._memory
+
+    def _condense_path(self, chat_history, latest_message):
+        """(path, reason): fast or budget answers as asked, llm condenses with the earlier turns"""
+        reason = fast_path_reason(bool(chat_history), latest_message, self.standalone_questions)
+        # The base engine never condenses without history, so first turns are fast either way
+        if reason is not None and (CONDENSE_FAST_PATH or reason == "first_turn"):
+            return "fast", reason
+        if not budget_allows("condense"):
+            return "budget", "budget"
+        return "llm", "follow_up"
+
+    def _condense_question(self, chat_history, latest_message):
+        path, reason = self._condense_path(chat_history, latest_message)
+        get_metrics_registry().increment("proof_condense_total", path=path, reason=reason)
+        with span("condense", labels={"path": path}, history_messages=len(chat_history),
+                  reason=reason) as condense_span:
+            condensed = super()._condense_question(chat_history, latest_message) if path == "llm" else latest_message
+            if condense_span is not None:
+                condense_span.set_attribute("condensed_query", condensed)
+            return condensed
+
+    async def _acondense_question(self, chat_history, latest_message):
+        path, reason = self._condense_path(chat_history, latest_message)
+        get_metrics_registry().increment("proof_condense_total", path=path, reason=reason)
+        with span("condense", labels={"path": path}, history_messages=len(chat_history),
+                  reason=reason) as condense_span:
+            condensed = (await super()._acondense_question(chat_history, latest_message)
+                         if path == "llm" else latest_message)
+            if condense_span is not None:
+                condense_span.set_attribute("condensed_query", condensed)
+            return condensed
+
+def build_llm(api_key=None):
+    if os.getenv("PROOF_FAKE_LLM", "0") == "1":
+        # Offline load tests: placeholder answers with no OpenAI latency or cost
+        return MockLLM(max_tokens=256)
+    if api_key is None:
+        api_key = st.secrets["OPENAI_API_KEY"]
+    return RateLimitedOpenAI(model=LLM_MODEL, api_key=api_key)
+
+def build_chat_engine(rag_service, llm, memory=None, store_fn=None, standalone_questions=()):
+    """Builds a chat engine without touching session state so it can also run in background jobs"""
+    if memory is None:
+        # Older turns are folded into a summary off the critical path so prompts stay flat in long conversations
+        memory = RollingSummaryMemory(summarizer_llm=llm)
+
+    # Follow-ups rerank the previous turns' nodes locally before paying for a fresh composite retrieval
+    retriever = SummaryFirstRetriever(
+        rag_service=rag_service,
+        base_retriever=CarryOverRetriever(
+            base_retriever=ServiceRetriever(rag_service=rag_service, store_fn=store_fn),
+            history_fn=memory.get_all,
+        ),
+    )
+
+    # Retrieved chunks are deduplicated and trimmed to a token budget before they reach the answer prompt
+    node_postprocessors = [TokenBudgetPacker(token_budget=CONTEXT_TOKEN_BUDGET)] if CONTEXT_TOKEN_BUDGET > 0 else []
+
+    chat_engine = BudgetAwareChatEngine.from_defaults(
+        retriever=retriever,
+        chat_mode="condense_plus_context",
+        memory=memory,
+        llm=llm,
+        context_prompt=CONTEXT_PROMPT,
+        node_postprocessors=node_postprocessors,
+        verbose=False,
+    )
+    # Preset questions are written to stand alone, so they never need condensing
+    chat_engine.standalone_questions = tuple(standalone_questions)
+    return chat_engine
+
 def llama_chatbot():
     try:
-        if st.user.is_logged_in:
+        if is_logged_in():
             api_key = st.secrets["OPENAI_API_KEY"]
         else:
             return None
 
-        llm = OpenAI(model="o4-mini-2025-04-16", api_key=api_key)
-
-        memory = ChatMemoryBuffer.from_defaults(token_limit=3900)
-
-        chat_engine = CondensePlusContextChatEngine.from_defaults(
-            retriever=st.session_state.llama.composite_retriever,
-            chat_mode="condense_plus_context",
-            memory=memory,
-            llm=llm,
-            context_prompt=(
-                "You are a chatbot in the role of expert on the documents stored by the company for Board of Directors."
-                "Your only focus is on understanding those documents at a factual level."
-                "The content for those documents is here:\n"
-                "{context_str}"
-                "\nInstruction: Use the previous chat history, or the context above, to interact and answer Director questions about the documents."
-                "You can make inferences directly related to the content of the documents: noting trends or gaps or material observations."
-                "IMPORTANT: Ensure all your responses use standard textual formatting with appropriate spacing between words and numbers. Do not use special text styles or italics unless explicitly requested or for standard emphasis. Avoid equation formats in markdown that can render text in odd ways."
-                "IMPORTANT: You do not return technical details like file_ids or pipeline names as you only deal in content, inference, and filenames."
-                "IMPORTANT: You do NOT bring other knowledge or inferences to responses beyond the document and chat context."
-                "IMPORTANT: You do NOT respond with general answers on theory or concepts or guesses outside of these documents."
-                "If a question asks you to speculate beyond the scope discussed above, simply say 'Answers to that question are outside the scope of my function'."
-            ),
-            verbose=False,
-        )
+        llm = build_llm(api_key)
+
+        # Imported here: utils.precompute builds its engines with this module
+        from utils.precompute import load_common_queries_config
+        chat_engine = build_chat_engine(rag_service=st.session_state.llama,
+                                        llm=llm,
+                                        store_fn=lambda: st.session_state.get('current_index_name', None),
+                                        standalone_questions=load_common_queries_config()["queries"])
 
         return chat_engine
     except Exception as e:
@@ -5,46 +5,66 @@ from PIL import Image
 import os
 import json
 import streamlit as st
+from pipeline.budget import budget_allows
+from pipeline.tracing import span
 
 import logging
 
 logger = logging.getLogger(__name__)
 
-#@st.cache_data(show_spinner="Formatting response...")
-def process_retrieved_nodes(_nodes_with_scores):
-    try:
-        with st.spinner("Formatting response..."):
-            if _nodes_with_scores is None:
-                raise ValueError("LLAMA_RETRIEVAL: _nodes_with_scores cannot be None")
-            nodes = []
-            for node_with_score in _nodes_with_scores:
-                node = node_with_score.node
-                score = node_with_score.score
-                if isinstance(node, ImageNode):
+def process_nodes(_nodes_with_scores, rag_service):
+    """Resolves content and file urls for retrieved nodes; safe to call outside a Streamlit session"""
+    if _nodes_with_scores is None:
+        raise ValueError("LLAMA_RETRIEVAL: _nodes_with_scores cannot be None")
+    nodes = []
+    with span("references.process", node_count=len(_nodes_with_scores)):
+        for node_with_score in _nodes_with_scores:
+            node = node_with_score.node
+            score = node_with_score.score
+            if isinstance(node, ImageNode):
+                if not budget_allows("images"):
+                    continue
+                with span("image.resolve") as image_span:
                     image_source = node.resolve_image()
+                    if image_span is not None:
+                        image_span.set_attribute("bytes", image_source.getbuffer().nbytes)
                     content = Image.open(image_source)
-                    node_type = "image"
-                else:
-                    content = node.get_text()
-                    node_type = "text"
-                metadata = node.metadata
+                node_type = "image"
+            else:
+                content = node.get_text()
+                node_type = "text"
+            metadata = node.metadata
+
+            file_id = node.metadata.get('file_id', None)
+            logger.info(f"PROCESS_RETRIEVED_NODES: original file_id {file_id}")
 
-                file_id = node.metadata.get('file_id', None)
-                logger.info(f"PROCESS_RETRIEVED_NODES: original file_id {file_id}")
+            if file_id is None:
+                file_name = node.metadata.get('file_name', None)
+                file_id = rag_service.file_id_name_dict.get(file_name, None)
+                logger.info(f"PROCESS_RETRIEVED_NODES: alternate approach yields file_id {file_id}")
+            if file_id is None:
+                # Meeting and committee summaries span several files, so there is no single file to reference
+                logger.info(f"PROCESS_RETRIEVED_NODES: skipping node {node.node_id} without a file")
+                continue
+            # Without a presigned url the reference still renders, just without the file link
+            file_url = None
+            if budget_allows("file_urls"):
+                with span("file_url.presign"):
+                    file_url = rag_service.get_file_content_url(file_id=file_id)
+            node_dict = {'metadata': metadata,
+                         'type': node_type,
+                         'content': content,
+                         'url': file_url,
+                         'score': score,
+                         'id': node.node_id
+                        }
+            nodes.append(node_dict)
+    return nodes
 
-                if file_id is None:
-                    file_name = node.metadata.get('file_name', None)
-                    file_id = st.session_state.llama.file_id_name_dict[file_name]
-                    logger.info(f"PROCESS_RETRIEVED_NODES: alternate approach yields file_id {file_id}")
-                file_url = st.session_state.llama.get_file_content_url(file_id=file_id)
-                node_dict = {'metadata': metadata,
-                             'type': node_type,
-                             'content': content,
-                             'url': file_url,
-                             'score': score,
-                             'id': node.node_id
-                            }
-                nodes.append(node_dict)
-            return nodes
+#@st.cache_data(show_spinner="Formatting response...")
+def process_retrieved_nodes(_nodes_with_scores):
+    try:
+        with st.spinner("Formatting response..."):
+            return process_nodes(_nodes_with_scores, st.session_state.llama)
     except Exception as e:
         raise Exception(f"LLAMA_RETRIEVAL error processing retrieval nodes: {e}")
@@ -0,0 +1,247 @@
+from pathlib import Path
+from typing import Callable, List, Optional
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+
+from pipeline.rate_limit import Priority, request_priority
+from utils.llama_chatbot import build_chat_engine
+from utils.node_processor import process_nodes
+
+logger = logging.getLogger(__name__)
+
+COMMON_QUERIES_PATH = Path(__file__).parent.parent / "common_queries.json"
+QUERY_USAGE_PATH = Path(os.getenv("PROOF_CACHE_DIR", ".proof_cache")) / "query_usage.json"
+# Usage counts are written to disk in the background at most this often
+USAGE_FLUSH_SECONDS = 30
+# Lifetime of the presigned file urls in precomputed references (get_file_content_url's default)
+REFERENCE_URL_SECONDS = 3600
+# Answers are recomputed this long before their links expire, and never served with less than SERVE_MARGIN left
+REFRESH_AHEAD_SECONDS = 600
+SERVE_MARGIN_SECONDS = 120
+MIN_RUN_INTERVAL_SECONDS = 60
+
+DEFAULT_COMMON_QUERIES_CONFIG = {
+    "precompute_interval_seconds": 3600,
+    "precompute_top_used": 3,
+    "min_uses_to_precompute": 3,
+    "queries": [],
+}
+
+
+def load_common_queries_config(path: Optional[Path] = None) -> dict:
+    config = dict(DEFAULT_COMMON_QUERIES_CONFIG)
+    try:
+        with open(path or COMMON_QUERIES_PATH, "r") as f:
+            config.update(json.load(f))
+    except Exception as e:
+        logger.error(f"COMMON_QUERIES: Failed to load config, no common queries available: {e}")
+    return config
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+class QueryUsageTracker:
+    """Counts how often each question is asked so precomputation follows actual board usage"""
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path) if path else QUERY_USAGE_PATH
+        self._lock = threading.Lock()
+        self.counts = {}
+        self._dirty = False
+        self._writer = None
+        try:
+            if self.path.exists():
+                with open(self.path, "r") as f:
+                    self.counts = json.load(f)
+        except Exception as e:
+            logger.warning(f"QUERY_USAGE: Failed to load {self.path}: {e}")
+
+    def record(self, query: str):
+        """Counts in memory; a background writer saves the counts so the asking session never waits on disk"""
+        with self._lock:
+            entry = self.counts.setdefault(normalize_query(query), {"query": query, "count": 0})
+            entry["count"] += 1
+            self._dirty = True
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="query-usage-writer", daemon=True)
+                self._writer.start()
+                atexit.register(self.flush)
+
+    def _write_loop(self):
+        while True:
+            time.sleep(USAGE_FLUSH_SECONDS)
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            snapshot = json.dumps(self.counts)
+            self._dirty = False
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(".tmp")
+            with open(tmp_path, "w") as f:
+                f.write(snapshot)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.warning(f"QUERY_USAGE: Failed to save usage counts: {e}")
+
+    def count(self, query: str) -> int:
+        return self.counts.get(normalize_query(query), {}).get("count", 0)
+
+    def most_used(self, n: int, min_count: int = 1) -> List[str]:
+        with self._lock:
+            entries = sorted(self.counts.values(), key=lambda entry: entry["count"], reverse=True)
+        return [entry["query"] for entry in entries if entry["count"] >= min_count][:n]
+
+
+class PrecomputedAnswerStore:
+    """
+    Answers and processed references keyed by index version so a document sync invalidates them
+    Entries expire with their references' presigned urls
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._answers = {}
+
+    def get(self, index_version: str, query: str, min_remaining: float = SERVE_MARGIN_SECONDS) -> Optional[dict]:
+        """The stored answer if its links stay valid for at least min_remaining seconds"""
+        with self._lock:
+            entry = self._answers.get((index_version, normalize_query(query)))
+        if entry is None or entry["expires_at"] - time.time() < min_remaining:
+            return None
+        return entry
+
+    def put(self, index_version: str, query: str, answer: str, references: list):
+        with self._lock:
+            # Answers for older index versions can never be served again
+            for key in [key for key in self._answers if key[0] != index_version]:
+                del self._answers[key]
+            computed_at = time.time()
+            self._answers[(index_version, normalize_query(query))] = {
+                "query": query,
+                "answer": answer,
+                "references": references,
+                "index_version": index_version,
+                "computed_at": computed_at,
+                "expires_at": computed_at + REFERENCE_URL_SECONDS,
+            }
+
+    def seconds_until_refresh(self) -> Optional[float]:
+        """Time until the soonest entry is due for recomputation, or None when the store is empty"""
+        with self._lock:
+            if not self._answers:
+                return None
+            soonest = min(entry["expires_at"] for entry in self._answers.values())
+        return max(soonest - REFRESH_AHEAD_SECONDS - time.time(), 0.0)
+
+    def __len__(self):
+        return len(self._answers)
+
+
+class PrecomputeJob:
+    """Background thread that computes common-query answers after each sync and on a schedule"""
+    def __init__(self, llm_factory: Callable, interval_seconds: Optional[float] = None):
+        self.llm_factory = llm_factory
+        self.rag_service = None
+        self.store = PrecomputedAnswerStore()
+        self.usage = QueryUsageTracker()
+        self.interval_seconds = interval_seconds
+        self._trigger = threading.Event()
+        self._summaries_due = False
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def precompute_queries(self) -> List[str]:
+        config = load_common_queries_config()
+        queries = sorted(config["queries"], key=self.usage.count, reverse=True)
+        seen = {normalize_query(query) for query in queries}
+        for query in self.usage.most_used(config["precompute_top_used"], config["min_uses_to_precompute"]):
+            if normalize_query(query) not in seen:
+                queries.append(query)
+                seen.add(normalize_query(query))
+        return queries
+
+    def start(self, rag_service):
+        with self._lock:
+            self.rag_service = rag_service
+            if self.interval_seconds is None:
+                self.interval_seconds = load_common_queries_config()["precompute_interval_seconds"]
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="precompute-common-queries", daemon=True)
+                self._thread.start()
+                logger.info("PRECOMPUTE: Started background job")
+
+    def trigger(self, build_summaries: bool = False):
+        if build_summaries:
+            with self._lock:
+                self._summaries_due = True
+        self._trigger.set()
+
+    def _run(self):
+        while True:
+            try:
+                with request_priority(Priority.BACKGROUND):
+                    self.run_once()
+            except Exception as e:
+                logger.exception(f"PRECOMPUTE: Run failed: {e}")
+            # Wake early enough to replace answers before their reference links expire
+            refresh_in = self.store.seconds_until_refresh()
+            wait = self.interval_seconds if refresh_in is None else min(self.interval_seconds, refresh_in)
+            # A recompute that keeps failing mustn't spin
+            self._trigger.wait(timeout=max(wait, MIN_RUN_INTERVAL_SECONDS))
+            self._trigger.clear()
+
+    def run_once(self):
+        rag_service = self.rag_service
+        if rag_service is None:
+            return
+        llm = self.llm_factory()
+        with self._lock:
+            build_summaries, self._summaries_due = self._summaries_due, False
+        if build_summaries:
+            # Before the answers, so precomputed overview answers use the new summaries
+            self.build_summaries(rag_service, llm)
+        index_version = rag_service.index_version
+        for query in self.precompute_queries():
+            if self.store.get(index_version, query, min_remaining=REFRESH_AHEAD_SECONDS) is not None:
+                continue
+            try:
+                self.store.put(index_version, query, *self.compute(rag_service, llm, query))
+                logger.info(f"PRECOMPUTE: Stored answer for '{query}' at index version {index_version}")
+            except Exception as e:
+                logger.error(f"PRECOMPUTE: Failed to compute '{query}': {e}")
+
+    def build_summaries(self, rag_service, llm):
+        try:
+            stats = rag_service.build_document_summaries(llm)
+            logger.info(f"PRECOMPUTE: Built document summaries: {stats}")
+        except Exception as e:
+            # Summaries are an optimization; a failed build leaves the previous summaries in place
+            logger.error(f"PRECOMPUTE: Failed to build document summaries: {e}")
+
+    def compute(self, rag_service, llm, query: str):
+        # A fresh engine per query so answers never depend on another question's history
+        chat_engine = build_chat_engine(rag_service=rag_service, llm=llm)
+        answer = chat_engine.chat(query).response.replace('$', '\\$')
+        references = process_nodes(rag_service.multi_modal_composite_retrieval(query_text=query), rag_service)
+        return answer, references
+
+
+_precompute_job = None
+_precompute_job_lock = threading.Lock()
+
+
+def get_precompute_job(llm_factory: Optional[Callable] = None) -> Optional[PrecomputeJob]:
+    """Process-wide job shared by every session"""
+    global _precompute_job
+    with _precompute_job_lock:
+        if _precompute_job is None and llm_factory is not None:
+            _precompute_job = PrecomputeJob(llm_factory=llm_factory)
+        return _precompute_job
@@ -0,0 +1,236 @@
+#Opt-in per-rerun profiler for the Streamlit app
+#Enable with PROOF_PROFILE_RERUNS=1 (or ?profile=1 in the url), then summarize with: python -m utils.profiler
+
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+import argparse
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import threading
+import time
+
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from pipeline.tracing import get_metrics_registry
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = Path(os.getenv("PROOF_CACHE_DIR", ".proof_cache")) / "rerun_profiles"
+PROFILE_LOG_PATH = PROFILE_DIR / "reruns.jsonl"
+SLOW_RERUN_SECONDS = float(os.getenv("PROOF_PROFILE_SLOW_MS", "500")) / 1000
+# Share of reruns run under cProfile; only the slow ones keep their profile
+PROFILE_SAMPLE_RATE = float(os.getenv("PROOF_PROFILE_SAMPLE_RATE", "0.2"))
+
+_write_lock = threading.Lock()
+# cProfile can only be active in one thread at a time, so concurrent sessions take turns
+_cprofile_lock = threading.Lock()
+
+
+def profiling_enabled() -> bool:
+    if os.getenv("PROOF_PROFILE_RERUNS", "0") == "1":
+        return True
+    try:
+        return st.query_params.get("profile", None) == "1"
+    except Exception:
+        return False
+
+
+class RerunProfile:
+    """Component timings for one execution of app.py::main"""
+    def __init__(self, session: str, interaction: int, rerun_in_interaction: int, sampled: bool):
+        self.session = session
+        self.interaction = interaction
+        self.rerun_in_interaction = rerun_in_interaction
+        self.components = defaultdict(float)
+        self.attributes = {}
+        self.profiler = cProfile.Profile() if sampled else None
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+
+    def to_dict(self, duration: float, ended_by: str) -> dict:
+        return {
+            "started_at": self.started_at,
+            "session": self.session,
+            "interaction": self.interaction,
+            "rerun_in_interaction": self.rerun_in_interaction,
+            "duration_ms": round(1000 * duration, 2),
+            "components_ms": {name: round(1000 * seconds, 2) for name, seconds in self.components.items()},
+            "attributes": self.attributes,
+            "ended_by": ended_by,
+        }
+
+
+def _current_profile() -> Optional[RerunProfile]:
+    try:
+        return st.session_state.get('_rerun_profile', None)
+    except Exception:
+        return None
+
+
+@contextmanager
+def profile_rerun():
+    """Wraps a whole rerun; reruns requested with st.rerun() count toward the same interaction"""
+    if not profiling_enabled():
+        yield
+        return
+
+    chained = st.session_state.pop('_rerun_chained', False)
+    if chained:
+        st.session_state['_rerun_count'] = st.session_state.get('_rerun_count', 0) + 1
+    else:
+        st.session_state['_interaction_count'] = st.session_state.get('_interaction_count', 0) + 1
+        st.session_state['_rerun_count'] = 1
+
+    ctx = get_script_run_ctx()
+    sampled = random.random() < PROFILE_SAMPLE_RATE and _cprofile_lock.acquire(blocking=False)
+    profile = RerunProfile(session=ctx.session_id[:8] if ctx is not None else "unknown",
+                           interaction=st.session_state['_interaction_count'],
+                           rerun_in_interaction=st.session_state['_rerun_count'],
+                           sampled=sampled)
+    st.session_state['_rerun_profile'] = profile
+    ended_by = "completed"
+    if profile.profiler is not None:
+        try:
+            profile.profiler.enable()
+        except ValueError as e:
+            # Another profiler (e.g. a debugger) is already active
+            logger.warning(f"PROFILER: Could not start cProfile: {e}")
+            profile.profiler = None
+            _cprofile_lock.release()
+            sampled = False
+    try:
+        yield
+    except BaseException as e:
+        # st.rerun() and st.stop() end a rerun by raising
+        ended_by = type(e).__name__
+        if ended_by == "RerunException":
+            st.session_state['_rerun_chained'] = True
+        raise
+    finally:
+        if profile.profiler is not None:
+            profile.profiler.disable()
+        if sampled:
+            _cprofile_lock.release()
+        duration = time.perf_counter() - profile.start
+        st.session_state['_rerun_profile'] = None
+        _finish(profile, duration, ended_by)
+
+
+@contextmanager
+def profile_component(name: str):
+    """Times one UI component within the current rerun; a no-op unless profiling is on"""
+    profile = _current_profile()
+    if profile is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.components[name] += time.perf_counter() - start
+
+
+def set_rerun_attribute(key: str, value):
+    profile = _current_profile()
+    if profile is not None:
+        profile.attributes[key] = value
+
+
+def _finish(profile: RerunProfile, duration: float, ended_by: str):
+    record = profile.to_dict(duration, ended_by)
+    registry = get_metrics_registry()
+    registry.observe("proof_rerun_seconds", duration)
+    for name, seconds in profile.components.items():
+        registry.observe("proof_component_seconds", seconds, component=name)
+
+    if profile.profiler is not None and duration >= SLOW_RERUN_SECONDS:
+        record["profile"] = _save_profile(profile.profiler, profile.started_at)
+    try:
+        with _write_lock:
+            PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+            with open(PROFILE_LOG_PATH, "a") as f:
+                f.write(json.dumps(record) + "\n")
+    except Exception as e:
+        logger.warning(f"PROFILER: Failed to write rerun profile: {e}")
+
+
+def _save_profile(profiler: cProfile.Profile, started_at: float) -> Optional[str]:
+    """Keeps the raw .prof (for snakeviz etc.) and a text summary of the top functions"""
+    try:
+        PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+        path = PROFILE_DIR / f"rerun-{time.strftime('%Y%m%d-%H%M%S', time.localtime(started_at))}-{random.randint(0, 9999):04d}.prof"
+        profiler.dump_stats(path)
+        summary = io.StringIO()
+        pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(30)
+        path.with_suffix(".txt").write_text(summary.getvalue())
+        return str(path)
+    except Exception as e:
+        logger.warning(f"PROFILER: Failed to save cProfile output: {e}")
+        return None
+
+
+def _percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+def build_report(path: Path = PROFILE_LOG_PATH) -> str:
+    """Markdown summary: slowest components, reruns per interaction and the slow reruns with profiles"""
+    records = [json.loads(line) for line in open(path) if line.strip()]
+    if not records:
+        return "No reruns recorded\n"
+
+    components = defaultdict(list)
+    for record in records:
+        for name, ms in record["components_ms"].items():
+            components[name].append(ms)
+    durations = [record["duration_ms"] for record in records]
+    interactions = defaultdict(int)
+    for record in records:
+        key = (record["session"], record["interaction"])
+        interactions[key] = max(interactions[key], record["rerun_in_interaction"])
+
+    lines = [
+        "# Rerun profile",
+        "",
+        f"{len(records)} reruns across {len(interactions)} interactions; "
+        f"rerun p50 {_percentile(durations, 50):.0f} ms, p95 {_percentile(durations, 95):.0f} ms",
+        f"Reruns per interaction: mean {sum(interactions.values()) / len(interactions):.2f}, "
+        f"max {max(interactions.values())}",
+        "",
+        "| component | reruns | total ms | p50 ms | p95 ms | max ms |",
+        "|---|---|---|---|---|---|",
+    ]
+    for name, values in sorted(components.items(), key=lambda item: sum(item[1]), reverse=True):
+        lines.append(f"| {name} | {len(values)} | {sum(values):.0f} | {_percentile(values, 50):.1f} | "
+                     f"{_percentile(values, 95):.1f} | {max(values):.1f} |")
+
+    profiled = [record for record in records if record.get("profile")]
+    if profiled:
+        lines += ["", "## Slow reruns with cProfile output", ""]
+        for record in sorted(profiled, key=lambda record: record["duration_ms"], reverse=True)[:20]:
+            lines.append(f"- {record['duration_ms']:.0f} ms ({record['ended_by']}): {record['profile']}")
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize Streamlit rerun profiles")
+    parser.add_argument("--log", default=str(PROFILE_LOG_PATH))
+    parser.add_argument("--output", default=str(PROFILE_DIR / "report.md"))
+    args = parser.parse_args()
+
+    report = build_report(Path(args.log))
+    Path(args.output).write_text(report)
+    print(report)
+
+
+if __name__ == "__main__":
+    main()
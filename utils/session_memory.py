@@ -0,0 +1,302 @@
+#Per-session memory accounting with a cap: past turns' references spill to disk and idle sessions drop their heavy objects
+#Each session evicts only itself, from its own script thread, so nothing touches another session's state
+#Configure with PROOF_SESSION_MEMORY_MB, PROOF_SESSION_IDLE_SECONDS and PROOF_SESSION_SPILL_DIR
+
+from pathlib import Path
+from typing import Optional
+import base64
+import io
+import json
+import logging
+import os
+import queue
+import re
+import shutil
+import threading
+import time
+
+from PIL import Image
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from pipeline.retrievers import CarryOverRetriever
+from utils.session_metrics import get_session_metrics
+
+logger = logging.getLogger(__name__)
+
+SESSION_MEMORY_CAP_BYTES = float(os.getenv("PROOF_SESSION_MEMORY_MB", "64")) * 1024 * 1024
+SESSION_IDLE_SECONDS = float(os.getenv("PROOF_SESSION_IDLE_SECONDS", "900"))
+SESSION_SPILL_DIR = Path(os.getenv("PROOF_SESSION_SPILL_DIR",
+                                   Path(os.getenv("PROOF_CACHE_DIR", ".proof_cache")) / "session_spill"))
+# Spilled references outlive the session's dashboard entry so a returning director can still reopen them
+SPILL_RETENTION_SECONDS = float(os.getenv("PROOF_SESSION_SPILL_HOURS", "24")) * 3600
+# How often an open session checks its own idle time, and stale spill folders are cleaned up
+EVICTION_INTERVAL_SECONDS = 60
+# Objects an idle session can rebuild on its next rerun
+HEAVY_SESSION_KEYS = ("chat_engine", "llama")
+
+
+def _state_get(state, key, default=None):
+    # Works for st.session_state and for plain dicts in tools
+    return state[key] if key in state else default
+
+
+def _node_bytes(node: dict) -> int:
+    content = node.get('content')
+    if isinstance(content, Image.Image):
+        # Decoded pixels, which is what the session actually holds
+        return content.width * content.height * len(content.getbands())
+    return len(str(content or ""))
+
+
+def _carry_over(chat_engine) -> Optional[CarryOverRetriever]:
+    retriever = getattr(chat_engine, "_retriever", None)
+    while retriever is not None and not isinstance(retriever, CarryOverRetriever):
+        retriever = getattr(retriever, "_base_retriever", None)
+    return retriever
+
+
+def session_footprint(state) -> dict:
+    """Approximate bytes held by the parts of a session that grow with use; characters are counted, not encoded"""
+    messages = _state_get(state, 'messages', []) or []
+    chat_engine = _state_get(state, 'chat_engine')
+    references = _state_get(state, 'current_references') or {}
+    carry_over = _carry_over(chat_engine)
+    footprint = {
+        "messages": sum(len(str(message.get("content", ""))) for message in messages),
+        "memory": sum(len(str(message.content or "")) for message in chat_engine.memory.get_all())
+        if chat_engine is not None else 0,
+        "references": sum(_node_bytes(node) for node in references.get('nodes') or []),
+        "carry_over": sum(len(node.node.get_content()) for node in carry_over._pool)
+        if carry_over is not None else 0,
+    }
+    footprint["total"] = sum(footprint.values())
+    return footprint
+
+
+def current_session_id() -> str:
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else "default"
+
+
+class ReferenceSpillStore:
+    """
+    Processed references of past turns on local disk, one JSON file per question; images are stored encoded
+    Encoding and writing happen on a background writer so a new question never waits on them
+    """
+    def __init__(self, root: Optional[Path] = None):
+        self.root = Path(root) if root else SESSION_SPILL_DIR
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        # path -> references queued but not yet on disk, so a reopen in the meantime still finds them
+        self._pending = {}
+        self.spilled = 0
+        self.loaded = 0
+        self.failed = 0
+        self._writer = threading.Thread(target=self._write_loop, name="reference-spill-writer", daemon=True)
+        self._writer.start()
+
+    def _path(self, session_id: str, question_id: str) -> Path:
+        return self.root / re.sub(r"[^A-Za-z0-9_-]", "_", session_id) / f"{re.sub(r'[^A-Za-z0-9_-]', '_', question_id)}.json"
+
+    @staticmethod
+    def _encode_node(node: dict) -> dict:
+        content = node.get('content')
+        if not isinstance(content, Image.Image):
+            return node
+        buffer = io.BytesIO()
+        content.save(buffer, format=content.format or "PNG")
+        return {**node, 'content': base64.b64encode(buffer.getvalue()).decode("ascii"), 'encoded_image': True}
+
+    @staticmethod
+    def _decode_node(node: dict) -> dict:
+        if not node.pop('encoded_image', False):
+            return node
+        return {**node, 'content': Image.open(io.BytesIO(base64.b64decode(node['content'])))}
+
+    def put(self, session_id: str, question_id: str, references: dict) -> bool:
+        """Queues the references for the writer; returns immediately"""
+        path = self._path(session_id, question_id)
+        with self._lock:
+            if path in self._pending or path.exists():
+                return True
+            self._pending[path] = references
+        self._queue.put(path)
+        return True
+
+    def _write_loop(self):
+        while True:
+            path = self._queue.get()
+            with self._lock:
+                references = self._pending.get(path)
+            try:
+                record = {key: value for key, value in references.items() if key != 'nodes'}
+                record['nodes'] = [self._encode_node(node) for node in references.get('nodes') or []]
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = path.with_suffix(".tmp")
+                with open(tmp_path, "w") as f:
+                    json.dump(record, f, default=str)
+                os.replace(tmp_path, path)
+                with self._lock:
+                    self.spilled += 1
+            except Exception as e:
+                with self._lock:
+                    self.failed += 1
+                logger.warning(f"SESSION_MEMORY: Failed to spill references to {path}: {e}")
+            finally:
+                with self._lock:
+                    self._pending.pop(path, None)
+                self._queue.task_done()
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Waits until queued references are written; for shutdown and tools"""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return not self._queue.unfinished_tasks
+
+    def get(self, session_id: str, question_id: str) -> Optional[dict]:
+        path = self._path(session_id, question_id)
+        with self._lock:
+            pending = self._pending.get(path)
+        if pending is not None:
+            return pending
+        try:
+            with open(path, "r") as f:
+                record = json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"SESSION_MEMORY: Failed to load spilled references from {path}: {e}")
+            return None
+        record['nodes'] = [self._decode_node(node) for node in record['nodes']]
+        with self._lock:
+            self.loaded += 1
+        return record
+
+    def drop_stale(self, max_age_seconds: float) -> int:
+        """Removes spill folders of sessions that haven't written for max_age_seconds"""
+        if not self.root.exists():
+            return 0
+        cutoff = time.time() - max_age_seconds
+        dropped = 0
+        for session_dir in self.root.iterdir():
+            if session_dir.is_dir() and session_dir.stat().st_mtime < cutoff:
+                shutil.rmtree(session_dir, ignore_errors=True)
+                dropped += 1
+        return dropped
+
+
+_spill_store = ReferenceSpillStore()
+
+
+def get_reference_spill_store() -> ReferenceSpillStore:
+    return _spill_store
+
+
+def spill_current_references(state, session_id: str) -> Optional[str]:
+    """Moves the displayed references to disk and returns their question id, or None if nothing was spilled"""
+    references = _state_get(state, 'current_references')
+    if not references or not references.get('nodes') or not references.get('question_id'):
+        return None
+    if not get_reference_spill_store().put(session_id, references['question_id'], references):
+        return None
+    state['current_references'] = None
+    # The answer's message offers to reopen them
+    for message in reversed(_state_get(state, 'messages', []) or []):
+        if message.get('question_id') == references['question_id']:
+            message['references_spilled'] = True
+            break
+    return references['question_id']
+
+
+def load_spilled_references(session_id: str, question_id: Optional[str]) -> Optional[dict]:
+    if not question_id:
+        return None
+    return get_reference_spill_store().get(session_id, question_id)
+
+
+def enforce_session_cap(state, session_id: str, cap_bytes: float = SESSION_MEMORY_CAP_BYTES) -> dict:
+    """Frees the cheapest-to-rebuild state first until the session fits under its cap"""
+    footprint = session_footprint(state)
+    if footprint["total"] <= cap_bytes:
+        return footprint
+
+    actions = []
+    chat_engine = _state_get(state, 'chat_engine')
+    if chat_engine is not None:
+        # The buffer keeps every turn although only the summary and recent window reach the LLM
+        chat_engine.memory.set(chat_engine.memory.get())
+        carry_over = _carry_over(chat_engine)
+        if carry_over is not None:
+            carry_over.reset()
+        actions.append("trimmed chat memory")
+    footprint = session_footprint(state)
+
+    if footprint["total"] > cap_bytes and spill_current_references(state, session_id):
+        # The sources panel reloads them from disk when it next renders
+        actions.append("spilled references")
+        footprint = session_footprint(state)
+
+    logger.warning(f"SESSION_MEMORY: Session {session_id[:8]} over its {cap_bytes / 1024 / 1024:.0f} MB cap, "
+                   f"{', '.join(actions) or 'nothing to free'}; now {footprint['total'] / 1024 / 1024:.1f} MB")
+    return footprint
+
+
+def evict_heavy_objects(state, session_id: str):
+    """Drops what an idle session can rebuild; its chat history is kept as plain messages and restored on return"""
+    spill_current_references(state, session_id)
+    chat_engine = _state_get(state, 'chat_engine')
+    if chat_engine is not None:
+        state['evicted_chat_history'] = chat_engine.memory.get_all()
+    for key in HEAVY_SESSION_KEYS:
+        if key in state:
+            del state[key]
+    # The next rerun re-initializes the RAG service as on first load
+    state['refresh_state'] = True
+
+
+def restore_chat_history(chat_engine):
+    """Puts back the chat memory of a session whose engine was evicted while idle"""
+    history = st.session_state.get('evicted_chat_history', None)
+    if history:
+        chat_engine.memory.set(history)
+    st.session_state.evicted_chat_history = None
+
+
+def mark_session_active():
+    """Called by every rerun and fragment run the director triggers; an evicted session rebuilds with a full rerun"""
+    st.session_state.session_last_active = time.time()
+    ctx = get_script_run_ctx()
+    # A full run re-initializes in app.py after the body, so only a fragment run has to widen to a full rerun
+    if st.session_state.get('refresh_state', False) and ctx is not None and ctx.fragment_ids_this_run:
+        st.rerun()
+
+
+def evict_if_idle(idle_seconds: float = SESSION_IDLE_SECONDS) -> bool:
+    """Evicts this session's own heavy objects once it has been idle for idle_seconds"""
+    last_active = st.session_state.get('session_last_active', None)
+    if last_active is None or time.time() - last_active < idle_seconds:
+        return False
+    if not any(key in st.session_state for key in HEAVY_SESSION_KEYS):
+        return False
+    session_id = current_session_id()
+    evict_heavy_objects(st.session_state, session_id)
+    get_session_metrics().mark_evicted(session_id)
+    logger.info(f"SESSION_MEMORY: Session {session_id[:8]} idle for {time.time() - last_active:.0f}s, "
+                f"released its chat engine and RAG service")
+    return True
+
+
+_last_cleanup = 0.0
+_cleanup_lock = threading.Lock()
+
+
+def drop_stale_spills():
+    """Removes expired spill folders; throttled so every session's idle check can call it"""
+    global _last_cleanup
+    with _cleanup_lock:
+        if time.time() - _last_cleanup < EVICTION_INTERVAL_SECONDS:
+            return
+        _last_cleanup = time.time()
+    get_reference_spill_store().drop_stale(SPILL_RETENTION_SECONDS)
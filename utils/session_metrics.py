@@ -0,0 +1,69 @@
+from llama_index.core.utils import get_tokenizer
+from typing import Optional
+import threading
+import time
+
+# Sessions not seen for this long are dropped from the dashboard
+SESSION_STALE_SECONDS = 1800
+
+
+class SessionMetrics:
+    """Last reported size of each live Streamlit session in this process"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessions = {}
+        # session_id -> (messages counted, last counted message, tokens) so each rerun only tokenizes new messages
+        self._memory_counts = {}
+
+    def _memory_tokens(self, session_id: str, memory_messages: list) -> int:
+        with self._lock:
+            counted, last_message, tokens = self._memory_counts.get(session_id, (0, None, 0))
+        # Memory only grows between turns; a reset, trim or restore invalidates the count
+        if not (0 < counted <= len(memory_messages) and memory_messages[counted - 1] is last_message):
+            counted, tokens = 0, 0
+        tokens += sum(len(get_tokenizer()(str(message.content or ""))) for message in memory_messages[counted:])
+        with self._lock:
+            self._memory_counts[session_id] = (len(memory_messages),
+                                               memory_messages[-1] if memory_messages else None, tokens)
+        return tokens
+
+    def record(self, session_id: str, user: Optional[str], messages: list, memory_messages: list,
+               footprint: Optional[dict] = None):
+        text_bytes = sum(len(str(message.get("content", ""))) for message in messages)
+        memory_tokens = self._memory_tokens(session_id, memory_messages)
+        footprint = footprint or {}
+        with self._lock:
+            self._sessions[session_id] = {
+                "session": session_id[:8],
+                "user": user,
+                "messages": len(messages),
+                "history_kb": round(text_bytes / 1024, 1),
+                "memory_tokens": memory_tokens,
+                "references_kb": round(footprint.get("references", 0) / 1024, 1),
+                "total_kb": round(footprint.get("total", text_bytes) / 1024, 1),
+                "evicted": False,
+                "last_seen": time.time(),
+            }
+
+    def _drop_stale(self):
+        cutoff = time.time() - SESSION_STALE_SECONDS
+        for session_id in [key for key, value in self._sessions.items() if value["last_seen"] < cutoff]:
+            del self._sessions[session_id]
+            self._memory_counts.pop(session_id, None)
+
+    def active(self) -> list:
+        with self._lock:
+            self._drop_stale()
+            return sorted(self._sessions.values(), key=lambda value: value["total_kb"], reverse=True)
+
+    def mark_evicted(self, session_id: str):
+        with self._lock:
+            if session_id in self._sessions:
+                self._sessions[session_id]["evicted"] = True
+
+
+_session_metrics = SessionMetrics()
+
+
+def get_session_metrics() -> SessionMetrics:
+    return _session_metrics
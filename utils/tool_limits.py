@@ -0,0 +1,33 @@
+import asyncio
+import functools
+import logging
+import os
+from typing import Callable
+
+TOOL_TIMEOUT_SECONDS = float(os.getenv("PROOF_MCP_TOOL_TIMEOUT", "30"))
+MAX_RESPONSE_CHARS = int(os.getenv("PROOF_MCP_MAX_RESPONSE_CHARS", "20000"))
+
+
+def cap_response(text: str, max_chars: int = MAX_RESPONSE_CHARS) -> str:
+    if not isinstance(text, str) or len(text) <= max_chars:
+        return text
+    return text[:max_chars] + f"\n\n[Truncated {len(text) - max_chars} characters]"
+
+
+def bounded_tool(timeout: float = TOOL_TIMEOUT_SECONDS, max_chars: int = MAX_RESPONSE_CHARS):
+    """Decorator that bounds a FastMCP tool by the shared concurrency slots, a timeout and a response-size cap"""
+    def decorator(func: Callable) -> Callable:
+
+        @functools.wraps(func)
+        async def wrapper(ctx, *args, **kwargs):
+            tool_slots = ctx.request_context.lifespan_context.tool_slots
+            async with tool_slots:
+                try:
+                    result = await asyncio.wait_for(func(ctx, *args, **kwargs), timeout=timeout)
+                except asyncio.TimeoutError:
+                    logging.warning(f"{func.__name__} timed out after {timeout}s")
+                    return f"{func.__name__} timed out after {timeout} seconds. Please try again."
+            return cap_response(result, max_chars)
+
+        return wrapper
+    return decorator
@@ -0,0 +1,11 @@
+from typing import Optional
+
+import streamlit as st
+
+
+def is_logged_in() -> bool:
+    return st.user.is_logged_in
+
+
+def user_email() -> Optional[str]:
+    return st.user.get("email", None) if st.user.is_logged_in else None